@@ -0,0 +1,263 @@
+"""
+Traffic statistics over a directory of flight recorder logs.
+
+Every log is streamed through the ingest filter, read_response and ReportList like a replay, without rendering, and
+the danger estimation is checked every SCREEN_UPDATE_TIME seconds as on the device. Per log, and over all logs:
+    contacts/min  distinct contacts seen per minute of recording
+    alerts        alert onsets, the nearest contact turning dangerous
+    to alert      seconds from the first frame of a contact to its alert, p50 and max
+    lag           Stratux Age of the traffic frames when they were stored, p50 and p99 in ms
+Logs are analysed in a pool of worker processes, one log per task, and the results are merged afterwards. Histograms
+have fixed buckets, so merging adds the bucket counts.
+
+    python host/analyze_logs.py logs/
+    python host/analyze_logs.py logs/ --pattern "2020-*.rec" --workers 8 --output summary.json
+"""
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import time
+
+import harness
+
+harness.install()
+
+from flight_log import read_records
+from flight_recorder import RECORD_SITUATION, RECORD_STATUS, RECORD_TRAFFIC, RECORD_TRAFFIC_BINARY
+from histogram import Histogram
+from report import ReportList, read_response, update_situation
+from traffic_codec import decode_frame
+
+SCREEN_UPDATE_TIME = 4
+INITIAL_ALT = 700
+# Seconds from first sight of a contact to its alert
+ALERT_BOUNDS = (5, 10, 20, 30, 60, 120, 300, 600)
+# Milliseconds between the Stratux receiving a contact and the frame being stored
+LAG_BOUNDS_MS = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000)
+
+
+def histogram_to_dict(histogram: Histogram) -> dict:
+    return {"bounds": list(histogram.bounds), "buckets": list(histogram.buckets), "count": histogram.count,
+            "total": histogram.total, "maximum": histogram.maximum}
+
+
+def histogram_from_dict(data: dict) -> Histogram:
+    histogram = Histogram(tuple(data["bounds"]))
+    merge_histogram(histogram, data)
+    return histogram
+
+
+def merge_histogram(histogram: Histogram, data: dict):
+    """
+    Add the samples of a histogram with the same bounds, as returned by histogram_to_dict
+    """
+    if tuple(data["bounds"]) != tuple(histogram.bounds):
+        raise ValueError("Histogram bounds differ")
+    for index, count in enumerate(data["buckets"]):
+        histogram.buckets[index] += count
+    histogram.count += data["count"]
+    histogram.total += data["total"]
+    histogram.maximum = max(histogram.maximum, data["maximum"])
+
+
+class LogAnalysis:
+    def __init__(self, screen_update_time: float = SCREEN_UPDATE_TIME):
+        self.screen_update_time = screen_update_time
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.status_dictionary = {}
+        self.situation_dictionary = {"OwnAltitude": INITIAL_ALT, "OwnVerticalVelocity": 0,
+                                     "GPSHorizontalAccuracy": 99999}
+        self.reports_list = ReportList(self.status_dictionary, self.situation_dictionary)
+        self.alert_times = Histogram(ALERT_BOUNDS)
+        self.lag = Histogram(LAG_BOUNDS_MS)
+        # Contact key to the time it was first seen, dropped again when the contact expires
+        self.first_seen = {}
+        self.minute_contacts = set()
+        self.contact_minutes = 0
+        self.minute = None
+        self.in_alert = False
+        self.alerts = 0
+        self.frames = 0
+        self.errors = 0
+        self.start_time = None
+        self.next_update = None
+
+    def run_periodic(self, until: float):
+        while self.next_update <= until:
+            self.clock.set(self.next_update)
+            self.reports_list.flush_old_reports()
+            for key in [key for key in self.first_seen if key not in self.reports_list.reports]:
+                del self.first_seen[key]
+            self.check_alert()
+            self.next_update += self.screen_update_time
+
+    def check_alert(self):
+        danger = self.reports_list.is_danger()
+        if danger and not self.in_alert:
+            self.alerts += 1
+            nearest = self.reports_list.get_nearest()
+            self.alert_times.record(int(self.clock.now() - self.first_seen.get(nearest.key, self.clock.now())))
+        self.in_alert = danger
+
+    def count_minute(self, record_time: float):
+        minute = int((record_time - self.start_time) // 60)
+        if minute != self.minute:
+            self.contact_minutes += len(self.minute_contacts)
+            self.minute_contacts.clear()
+            self.minute = minute
+
+    def store(self, message):
+        report = self.reports_list.store_report(message)
+        self.frames += 1
+        if report is None:
+            return
+        self.first_seen.setdefault(report.key, self.clock.now())
+        self.minute_contacts.add(report.key)
+        self.lag.record(int(message.Age * 1000))
+
+    def handle(self, record):
+        if record.type == RECORD_TRAFFIC:
+            if not self.reports_list.accepts(record.payload):
+                return
+            try:
+                self.store(read_response(record.payload))
+            except Exception:
+                self.errors += 1
+        elif record.type == RECORD_TRAFFIC_BINARY:
+            try:
+                contacts = decode_frame(record.payload)
+            except ValueError:
+                self.errors += 1
+                return
+            for contact in contacts:
+                self.store(contact)
+        elif record.type == RECORD_SITUATION:
+            update_situation(self.situation_dictionary, json.loads(record.payload), INITIAL_ALT)
+        elif record.type == RECORD_STATUS:
+            self.status_dictionary.update(json.loads(record.payload))
+
+    def run(self, records) -> dict:
+        for record in records:
+            if self.start_time is None:
+                self.start_time = record.time
+                self.next_update = record.time
+            self.run_periodic(record.time)
+            self.clock.set(record.time)
+            self.count_minute(record.time)
+            self.handle(record)
+        if self.next_update is not None:
+            self.run_periodic(self.next_update)
+        self.contact_minutes += len(self.minute_contacts)
+        return {
+            "duration": round(self.clock.now() - self.start_time, 3) if self.start_time is not None else 0,
+            "frames": self.frames,
+            "errors": self.errors,
+            "contacts": self.reports_list.ship_count,
+            "contact_minutes": self.contact_minutes,
+            "alerts": self.alerts,
+            "alert_time": histogram_to_dict(self.alert_times),
+            "lag_ms": histogram_to_dict(self.lag),
+        }
+
+
+def analyze_log(path: str) -> dict:
+    """
+    Worker task, module level so that the pool can pickle it
+
+    :return: The statistics of one log, the error instead if it could not be read
+    """
+    try:
+        result = LogAnalysis().run(read_records(path))
+    except (OSError, ValueError) as e:
+        return {"log": path, "error": str(e)}
+    result["log"] = path
+    return result
+
+
+def find_logs(directory: str, pattern: str) -> list:
+    logs = []
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        logs.extend(os.path.join(root, name) for name in sorted(files) if fnmatch.fnmatch(name, pattern))
+    return logs
+
+
+def merge_results(results: list) -> dict:
+    """
+    :return: Totals over the results of analyze_log, logs that failed are counted but not added
+    """
+    total = {"logs": len(results), "failed": 0, "duration": 0, "frames": 0, "errors": 0, "contacts": 0,
+             "contact_minutes": 0, "alerts": 0}
+    alert_time = Histogram(ALERT_BOUNDS)
+    lag = Histogram(LAG_BOUNDS_MS)
+    for result in results:
+        if "error" in result:
+            total["failed"] += 1
+            continue
+        for key in ("duration", "frames", "errors", "contacts", "contact_minutes", "alerts"):
+            total[key] += result[key]
+        merge_histogram(alert_time, result["alert_time"])
+        merge_histogram(lag, result["lag_ms"])
+    total["duration"] = round(total["duration"], 3)
+    total["alert_time"] = histogram_to_dict(alert_time)
+    total["lag_ms"] = histogram_to_dict(lag)
+    return total
+
+
+def analyze_logs(paths: list, workers: int = 0) -> list:
+    """
+    :param workers: Worker processes, 0 for one per core, 1 analyses in this process
+    :return: The result of every log, in the order of paths
+    """
+    if workers == 1 or len(paths) <= 1:
+        return [analyze_log(path) for path in paths]
+    with multiprocessing.Pool(workers or None) as pool:
+        # Logs differ a lot in length, small chunks keep all workers busy until the end
+        results = {result["log"]: result for result in pool.imap_unordered(analyze_log, paths, chunksize=1)}
+    return [results[path] for path in paths]
+
+
+def format_row(name: str, result: dict) -> str:
+    if "error" in result:
+        return "{:<24} {}".format(name, result["error"])
+    minutes = result["duration"] / 60
+    alert_time = histogram_from_dict(result["alert_time"])
+    lag = histogram_from_dict(result["lag_ms"])
+    return "{:<24}{:>10.1f}{:>10}{:>10.1f}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+        name[-24:], minutes, result["frames"], result["contact_minutes"] / minutes if minutes else 0,
+        result["alerts"], alert_time.percentile(0.5), alert_time.maximum, lag.percentile(0.5), lag.percentile(0.99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory searched for logs, including subdirectories")
+    parser.add_argument("--pattern", default="*.rec", help="File name pattern of the logs")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes, 0 for one per core")
+    parser.add_argument("--output", help="Write the per log results and the totals as JSON")
+    parser.add_argument("--quiet", action="store_true", help="Print the totals only")
+    arguments = parser.parse_args()
+    paths = find_logs(arguments.directory, arguments.pattern)
+    if not paths:
+        parser.error("No logs matching {} in {}".format(arguments.pattern, arguments.directory))
+    start = time.monotonic()
+    results = analyze_logs(paths, arguments.workers)
+    total = merge_results(results)
+    elapsed = time.monotonic() - start
+    print("{:<24}{:>10}{:>10}{:>10}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+        "log", "minutes", "frames", "cont/min", "alerts", "alert p50", "alert max", "lag p50", "lag p99"))
+    if not arguments.quiet:
+        for result in results:
+            print(format_row(os.path.relpath(result["log"], arguments.directory), result))
+    print(format_row("total", total))
+    print("{} logs, {} failed, {:.1f} hours analysed in {:.1f}s".format(total["logs"], total["failed"],
+                                                                     total["duration"] / 3600, elapsed))
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump({"logs": results, "total": total}, output, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Threat selection through the altitude band index against a full sort of every contact.
+
+Synthetic traffic is spread over a wide altitude range, then is_danger() is timed both ways with the caches
+defeated, so every call does the full work. Times are in microseconds per call on this machine.
+
+    python host/bench_bands.py --contacts 500 --spread 15000
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import harness
+
+harness.install()
+
+from report import ReportList, read_response, update_situation
+from synthetic import TrafficSimulator
+
+WARM_UP = 30  # seconds of traffic before measuring
+
+
+def measure(reports: ReportList, function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # A new revision and score epoch invalidate the cached nearest contact and scores
+        reports.revision += 1
+        reports.score_epoch += 1
+        function()
+    return (time.perf_counter() - start) / repeat * 1000000
+
+
+def run(contacts: int, spread: float, repeat: int) -> dict:
+    clock = harness.VirtualClock()
+    harness.set_clock(clock)
+    # High enough that no contact is pushed to the ground, which would make its altitude unknown
+    simulator = TrafficSimulator(contacts, own_altitude=spread + 2000)
+    for contact in simulator.contacts:
+        contact.altitude = simulator.own_altitude + simulator.random.uniform(-spread, spread)
+    situation = {}
+    update_situation(situation, simulator.get_situation(), 700)
+    reports = ReportList({}, situation, capacity=contacts)
+    end = simulator.now + WARM_UP
+    while simulator.now < end:
+        for message in simulator.step(0.1):
+            clock.set(simulator.now)
+            reports.store_report(read_response(json.dumps(message)))
+    return {
+        "contacts": len(reports.reports),
+        "candidates": len(reports.get_threat_candidates()),
+        "sorted": measure(reports, lambda: reports.get_list_sorted_score()[0].is_dangerous(), repeat),
+        "bands": measure(reports, reports.is_danger, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--spread", type=float, default=15000, help="Contacts within this many ft of our altitude")
+    parser.add_argument("--repeat", type=int, default=200)
+    arguments = parser.parse_args()
+    columns = ("contacts", "candidates", "sorted", "bands")
+    print("".join("{:>12}".format(column) for column in columns))
+    for contacts in arguments.contacts:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(contacts, arguments.spread, arguments.repeat)
+        print("".join("{:>12.0f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
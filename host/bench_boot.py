@@ -0,0 +1,83 @@
+"""
+Boot cost of the display: time to the first frame showing traffic, heap and widgets after boot.
+
+Boots the report list and the display manager the way main.py does, selects the contact list, stores the first
+traffic frame and renders until that frame is on screen. "eager" builds every page at boot like before pages were
+built on first activation, "lazy" builds only the pages that are shown. Heap is the memory CPython allocated during
+boot, a stand-in for the MicroPython heap, widgets are M5TextBox objects.
+
+    python host/bench_boot.py --repeat 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+
+import harness
+
+harness.install()
+
+from display_manager import DisplayManager
+from m5ui import M5TextBox
+from report import ReportList, read_response, update_situation
+from synthetic import TrafficSimulator
+
+EAGER_DISPLAYS = DisplayManager.DISPLAY_TYPES + (DisplayManager.ALERT_PAGE,)
+
+
+def boot(eager: bool, frame: str, situation_message: dict) -> dict:
+    widgets = M5TextBox.instances
+    tracemalloc.start()
+    start = time.perf_counter()
+    situation = {}
+    update_situation(situation, situation_message, 700)
+    reports = ReportList({}, situation)
+    manager = DisplayManager(reports, {}, situation)
+    # The heap of the harness is make-believe, keep the eager pages
+    manager.release_free_bytes = 0
+    if eager:
+        for display_type in EAGER_DISPLAYS:
+            manager.get_display(display_type)
+    manager.select_display(DisplayManager.AIRCRAFT_LIST)
+    manager.actually_change_display()
+    reports.store_report(read_response(frame))
+    manager.update_display()
+    while manager.rendering:
+        manager.render()
+    elapsed = time.perf_counter() - start
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"first_traffic": elapsed * 1000000, "heap": heap, "widgets": M5TextBox.instances - widgets,
+            "pages": len(manager.display_list)}
+
+
+def run(repeat: int) -> dict:
+    harness.set_clock(harness.VirtualClock())
+    simulator = TrafficSimulator(1)
+    frame = json.dumps(simulator.step(1)[0])
+    results = {}
+    for name, eager in (("eager", True), ("lazy", False)):
+        samples = [boot(eager, frame, simulator.get_situation()) for _ in range(repeat)]
+        result = samples[-1]
+        for column in ("first_traffic", "heap"):
+            result[column] = min(sample[column] for sample in samples)
+        results[name] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    arguments = parser.parse_args()
+    columns = ("first_traffic", "heap", "widgets", "pages")
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run(arguments.repeat)
+    print("{:>8}".format("boot") + "".join("{:>15}".format(column) for column in columns))
+    for name, result in results.items():
+        print("{:>8}".format(name) + "".join("{:>15.0f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Binary traffic records against Stratux JSON on the same synthetic traffic.
+
+Decodes every message as a JSON frame with read_response() and as binary records with traffic_codec, once on its own
+and once storing into a report list. Rates are contacts per second on this machine, bytes are per contact. Binary
+frames carry --batch records each, as a relay sends the contacts of one tick.
+
+    python host/bench_codec.py --contacts 200 --batch 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import harness
+
+harness.install()
+
+from report import ReportList, read_response
+from synthetic import TrafficSimulator
+from traffic_codec import decode_frame, encode_frame, store_frame
+
+DURATION = 30  # seconds of simulated traffic
+
+
+def rate(function, count: int) -> float:
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def run(contacts: int, batch: int) -> dict:
+    harness.set_clock(harness.VirtualClock())
+    simulator = TrafficSimulator(contacts)
+    messages = []
+    for _ in range(int(DURATION / 0.1)):
+        messages.extend(simulator.step(0.1))
+    json_frames = [json.dumps(message, separators=(",", ":")) for message in messages]
+    binary_frames = [encode_frame(messages[start:start + batch]) for start in range(0, len(messages), batch)]
+    situation = {"OwnAltitude": simulator.own_altitude, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+    count = len(messages)
+
+    def store_json():
+        reports = ReportList({}, situation, capacity=contacts)
+        for frame in json_frames:
+            reports.store_report(read_response(frame))
+
+    def store_binary():
+        reports = ReportList({}, situation, capacity=contacts)
+        for frame in binary_frames:
+            store_frame(reports, frame)
+
+    return {
+        "contacts": count,
+        "json_bytes": sum(len(frame) for frame in json_frames) / count,
+        "binary_bytes": sum(len(frame) for frame in binary_frames) / count,
+        "json_decode": rate(lambda: [read_response(frame) for frame in json_frames], count),
+        "binary_decode": rate(lambda: [decode_frame(frame) for frame in binary_frames], count),
+        "json_store": rate(store_json, count),
+        "binary_store": rate(store_binary, count),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=20, help="Records per binary frame")
+    arguments = parser.parse_args()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run(arguments.contacts, arguments.batch)
+    print("{} contacts, {} per binary frame".format(result["contacts"], arguments.batch))
+    print("{:>10}{:>10}{:>12}{:>12}".format("", "bytes", "decode/s", "store/s"))
+    for name in ("json", "binary"):
+        print("{:>10}{:>10.1f}{:>12.0f}{:>12.0f}".format(name, result[name + "_bytes"], result[name + "_decode"],
+                                                         result[name + "_store"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Ingest throughput and latency with receive and parsing on the UI loop against on a worker thread.
+
+A fake websocket delivers synthetic frames at a fixed rate. The UI loop renders a frame every interval, modelled as
+CPU work that holds the interpreter (formatting, clipping) followed by a wait for the SPI transfer. Parsing costs
+extra CPU per frame to model JSON decoding on the ESP32, which is far slower than on the host. In single mode the
+loop receives with the same 0.1 s timeout as main.py, in split mode an IngestWorker receives and parses and the loop
+drains its queue. Latency runs from the arrival of a frame at the socket until it is stored.
+
+    python host/bench_ingest_split.py --rate 350 --seconds 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import harness
+
+harness.install()
+
+import ingest_worker
+from ingest_worker import IngestWorker, RingQueue
+from report import ReportList, read_response, update_situation
+from synthetic import TrafficSimulator
+
+SOCKET_TIMEOUT = 0.1
+
+
+class TimedWebsocket:
+    """
+    Frames arrive at a fixed rate, recv() waits like a socket with a timeout
+    """
+
+    def __init__(self, frames, rate: float):
+        self.frames = frames
+        self.rate = rate
+        self.index = 0
+        self.start = time.monotonic()
+        self.timeout = SOCKET_TIMEOUT
+        self.last_arrival = 0
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def recv(self):
+        if self.index >= len(self.frames):
+            time.sleep(self.timeout)
+            raise OSError("timed out")
+        arrival = self.start + self.index / self.rate
+        wait = arrival - time.monotonic()
+        if wait > self.timeout:
+            time.sleep(self.timeout)
+            raise OSError("timed out")
+        if wait > 0:
+            time.sleep(wait)
+        self.last_arrival = arrival
+        self.index += 1
+        return self.frames[self.index - 1]
+
+    def close(self):
+        pass
+
+
+class ArrivalQueue(RingQueue):
+    """
+    Stamps every message with the socket arrival time instead of the receive time, the worker parses each frame
+    straight after receiving it
+    """
+
+    def __init__(self, capacity: int, websocket: TimedWebsocket):
+        super().__init__(capacity)
+        self.websocket = websocket
+
+    def put(self, item, stamp=None) -> bool:
+        return super().put(item, self.websocket.last_arrival)
+
+
+def busy(milliseconds: float):
+    end = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def render(cpu_ms: float, spi_ms: float):
+    busy(cpu_ms)
+    time.sleep(spi_ms / 1000)
+
+
+def make_frames(count: int) -> list:
+    simulator = TrafficSimulator(100)
+    frames = []
+    while len(frames) < count:
+        frames.extend(json.dumps(message) for message in simulator.step(0.1))
+    return frames[:count]
+
+
+def run(mode: str, frames: list, rate: float, render_interval: float, cpu_ms: float, spi_ms: float,
+        parse_ms: float) -> dict:
+    harness.set_clock(harness.RealClock())
+
+    def parse(frame):
+        busy(parse_ms)
+        return read_response(frame)
+
+    ingest_worker.read_response = parse
+    situation = {}
+    update_situation(situation, {"GPSAltitudeMSL": 3000, "GPSVerticalSpeed": 0, "GPSHorizontalAccuracy": 5}, 700)
+    reports = ReportList({}, situation, capacity=128)
+    websocket = TimedWebsocket(frames, rate)
+    latencies = []
+    stored = 0
+    worker = None
+    if mode == "split":
+        worker = IngestWorker(lambda: websocket, ArrivalQueue(64, websocket), error_timeout=30)
+        worker.start()
+    start = time.monotonic()
+    end = start + len(frames) / rate
+    next_render = start
+    while time.monotonic() < end + 0.5 and stored < len(frames):
+        if worker:
+            while True:
+                message = worker.queue.get()
+                if message is None:
+                    break
+                reports.store_report(message)
+                latencies.append(time.monotonic() - worker.queue.stamp)
+                stored += 1
+            if not stored or worker.queue.head == worker.queue.tail:
+                time.sleep(0.001)
+        else:
+            try:
+                frame = websocket.recv()
+                reports.store_report(parse(frame))
+                latencies.append(time.monotonic() - websocket.last_arrival)
+                stored += 1
+            except OSError:
+                pass
+        if time.monotonic() >= next_render:
+            next_render += render_interval
+            render(cpu_ms, spi_ms)
+    elapsed = time.monotonic() - start
+    if worker:
+        worker.stop()
+    ingest_worker.read_response = read_response
+    latencies.sort()
+    return {"frames/s": stored / elapsed, "stored": stored,
+            "dropped": worker.queue.dropped if worker else 0,
+            "p50 ms": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+            "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=350, help="Frames per second from the fake Stratux")
+    parser.add_argument("--parse-ms", type=float, default=2.5, help="Extra CPU per parsed frame")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--render-interval", type=float, default=0.25)
+    parser.add_argument("--render-cpu-ms", type=float, default=5)
+    parser.add_argument("--render-spi-ms", type=float, default=40)
+    arguments = parser.parse_args()
+    frames = make_frames(int(arguments.rate * arguments.seconds))
+    for mode in ("single", "split"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(mode, frames, arguments.rate, arguments.render_interval, arguments.render_cpu_ms,
+                         arguments.render_spi_ms, arguments.parse_ms)
+        print("{:<7}{}".format(mode, ", ".join("{} {:.1f}".format(key, value) for key, value in result.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+UI loop stall while the Stratux goes away and comes back.
+
+Runs the main loop steps of the device (connection manager, receive, store, render) against the local stand-in
+Stratux, then stops it so connects are refused, then leaves a listener on its port that accepts the TCP connection
+but never answers the handshake, and finally serves traffic again. For every phase it prints the longest and mean
+loop pass and the longest connection step in ms, the oldest contact age on screen and the number of connects.
+Before the connection manager, the reconnect in the hung phase blocked the loop until the Stratux answered.
+
+    python host/bench_outage.py --contacts 50 --phase 5
+"""
+import argparse
+import contextlib
+import io
+import socket
+import time
+
+import harness
+
+harness.install()
+
+from connection_manager import Backoff, ConnectionManager
+from display_manager import DisplayManager
+from fake_stratux import FakeStratux, StratuxThread
+from report import ReportList, read_response
+from synthetic import TrafficSimulator
+from wifiCfg import wlan_sta
+
+RECEIVE_TIMEOUT = 0.01
+ERROR_TIMEOUT_MS = 2000
+
+
+def serve(contacts: int, port: int = 0) -> (StratuxThread, int):
+    stratux = StratuxThread(FakeStratux(TrafficSimulator(contacts), speed=1))
+    return stratux, stratux.start(port=port)
+
+
+def run_phase(manager: ConnectionManager, reports: ReportList, display: DisplayManager, seconds: float) -> dict:
+    longest = 0
+    longest_step = 0
+    passes = 0
+    total = 0
+    connects = manager.connects
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        websocket = manager.step()
+        longest_step = max(longest_step, time.perf_counter() - start)
+        if websocket:
+            try:
+                frame = websocket.recv()
+                if frame:
+                    manager.received()
+                    reports.store_report(read_response(frame))
+            except OSError:
+                pass
+            if not websocket.open:
+                manager.lost()
+        if display.scheduler.frame_due():
+            display.update_display()
+        display.render()
+        elapsed = time.perf_counter() - start
+        longest = max(longest, elapsed)
+        total += elapsed
+        passes += 1
+        if not websocket:
+            # The device sleeps nowhere, this only keeps the host from spinning
+            time.sleep(0.001)
+    reports.flush_old_reports()
+    return {"longest": longest * 1000, "mean": total / passes * 1000, "step": longest_step * 1000,
+            "oldest": max([report.get_age() for report in reports.reports.values()] or [0]),
+            "connects": manager.connects - connects}
+
+
+def run(contacts: int, phase: float) -> list:
+    harness.set_clock(harness.RealClock())
+    stratux, port = serve(contacts)
+    # Far above the traffic, the alert blink would stall the loop on its own
+    situation = {"OwnAltitude": 40000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 99999}
+    reports = ReportList({}, situation, capacity=contacts)
+    display = DisplayManager(reports, {}, situation)
+    display.select_display(DisplayManager.AIRCRAFT_LIST)
+    display.actually_change_display()
+    manager = ConnectionManager(wlan_sta, "stratux", "", "ws://127.0.0.1:{}/traffic".format(port), ERROR_TIMEOUT_MS,
+                                RECEIVE_TIMEOUT)
+    # Shorter than on the device, so the Stratux is found again within a phase
+    manager.backoff = Backoff(500, 2000)
+    results = [("live", run_phase(manager, reports, display, phase))]
+    stratux.stop()
+    results.append(("refused", run_phase(manager, reports, display, phase)))
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", port))
+    listener.listen(8)
+    results.append(("hung", run_phase(manager, reports, display, phase * 2)))
+    listener.close()
+    stratux, port = serve(contacts, port)
+    results.append(("back", run_phase(manager, reports, display, phase * 2)))
+    stratux.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=50)
+    parser.add_argument("--phase", type=float, default=5, help="Seconds per phase, the hung phase runs twice as long")
+    arguments = parser.parse_args()
+    columns = ("longest", "mean", "step", "oldest", "connects")
+    print("{:>10}".format("phase") + "".join("{:>10}".format(column) for column in columns))
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run(arguments.contacts, arguments.phase)
+    for name, result in results:
+        print("{:>10}".format(name) + "".join("{:>10.1f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
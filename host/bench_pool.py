@@ -0,0 +1,60 @@
+"""
+Contact record allocations under churn, with the record pool against allocating a record per new contact.
+
+Runs synthetic traffic where a fraction of the contacts is replaced every minute and counts, per minute of traffic,
+records taken for new contacts (each one a LatestReport allocation before the pool existed), allocations by the pool, evictions and
+dropped contacts.
+
+    python host/bench_pool.py --contacts 100 --capacity 64 --churn 0.5
+"""
+import argparse
+import contextlib
+import io
+import json
+
+import harness
+
+harness.install()
+
+from report import ReportList, ReportPool, read_response, update_situation
+from synthetic import TrafficSimulator
+
+
+def run(contacts: int, capacity: int, churn: float, minutes: float, policy: int) -> dict:
+    clock = harness.VirtualClock()
+    harness.set_clock(clock)
+    simulator = TrafficSimulator(contacts, churn=churn)
+    situation = {}
+    update_situation(situation, simulator.get_situation(), 700)
+    reports = ReportList({}, situation, capacity=capacity, overflow_policy=policy)
+    end = simulator.now + minutes * 60
+    next_flush = simulator.now
+    while simulator.now < end:
+        for message in simulator.step(0.1):
+            clock.set(simulator.now)
+            reports.store_report(read_response(json.dumps(message)))
+        if simulator.now >= next_flush:
+            next_flush += 4
+            reports.flush_old_reports()
+    metrics = reports.pool.get_metrics()
+    return {"records needed/min": (metrics["acquired"] + metrics["evicted"]) / minutes,
+            "pool allocations/min": (metrics["allocations"] - capacity - 1) / minutes,
+            "evicted/min": metrics["evicted"] / minutes, "dropped/min": metrics["dropped"] / minutes,
+            "tracked": len(reports.reports)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=64)
+    parser.add_argument("--churn", type=float, default=0.5)
+    parser.add_argument("--minutes", type=float, default=10)
+    arguments = parser.parse_args()
+    for name, policy in (("evict lowest threat", ReportPool.EVICT_LOWEST_THREAT), ("drop new", ReportPool.DROP_NEW)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(arguments.contacts, arguments.capacity, arguments.churn, arguments.minutes, policy)
+        print("{}: {}".format(name, ", ".join("{} {:.1f}".format(key, value) for key, value in result.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Ingest cost with and without the flight recorder.
+
+Runs the ingest path of the main loop (record, parse, store) over the same traffic frames, with the page writes done
+in the idle slot as on the device, and prints the cost per frame.
+"""
+import os
+import tempfile
+import time
+
+import harness
+
+harness.install()
+
+from flight_recorder import FlightRecorder, RECORD_TRAFFIC
+from harness.traffic import make_traffic_json
+from report import ReportList, read_response
+
+FRAMES = 20000
+
+
+def run(frames, recorder) -> float:
+    situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+    reports = ReportList({}, situation)
+    ingest = 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        if recorder:
+            recorder.record(RECORD_TRAFFIC, frame)
+        reports.store_report(read_response(frame))
+        ingest += time.perf_counter() - start
+        if recorder:
+            recorder.service()
+    return ingest / len(frames)
+
+
+def main():
+    frames = [make_traffic_json(Icao_addr=index % 50 + 1, Alt=1000 + index % 700, DistanceEstimated=10000)
+              for index in range(FRAMES)]
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = FlightRecorder(os.path.join(directory, "flight.rec"))
+        run(frames[:1000], None)
+        baseline = run(frames, None)
+        recorded = run(frames, recorder)
+        recorder.close()
+    print("ingest without recorder {:8.2f} us/frame".format(baseline * 1e6))
+    print("ingest with recorder    {:8.2f} us/frame ({:+.1f}%)".format(recorded * 1e6,
+                                                                      100 * (recorded - baseline) / baseline))
+    print("pages written {}, records dropped {}".format(recorder.pages_written, recorder.dropped))
+
+
+if __name__ == "__main__":
+    main()
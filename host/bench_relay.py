@@ -0,0 +1,120 @@
+"""
+Relay CPU time against the number of connected displays.
+
+The local stand-in Stratux feeds the relay, which runs on its own thread and event loop so its CPU time can be
+told apart from the clients'. For every client count the relay serves that many websocket clients for a while.
+Columns are relay CPU in percent of one core, Stratux frames per second into the relay, which a display connected
+to the Stratux directly would have to parse, and frames per second each display receives from the relay.
+
+    python host/bench_relay.py --contacts 200 --clients 1 4 16 64
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+
+import harness
+
+harness.install()
+
+import ws
+from fake_stratux import FakeStratux
+from relay import Relay
+from synthetic import TrafficSimulator
+
+
+class RelayThread:
+    def __init__(self, relay: Relay):
+        self.relay = relay
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def get_cpu_time(self) -> float:
+        return time.thread_time()
+
+    async def get_frames(self) -> tuple:
+        return self.relay.frames_in, self.relay.frames_out
+
+    def start(self) -> int:
+        self.thread.start()
+        return self.call(self.relay.start())
+
+    def stop(self):
+        self.call(self.relay.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def read_frames(connection: ws.Connection, counts: list, index: int):
+    try:
+        while True:
+            await connection.recv()
+            counts[index] += 1
+    except (ws.ConnectionClosed, asyncio.CancelledError):
+        pass
+
+
+async def measure(relay: RelayThread, port: int, clients: int, duration: float) -> dict:
+    connections = [await ws.connect("127.0.0.1", port, "/traffic") for _ in range(clients)]
+    counts = [0] * clients
+    readers = [asyncio.ensure_future(read_frames(connection, counts, index))
+               for index, connection in enumerate(connections)]
+    loop = asyncio.get_running_loop()
+    # Settle before measuring
+    await asyncio.sleep(1)
+    start_counts = list(counts)
+    start_frames = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(relay.get_frames(), relay.loop))
+    start_cpu = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(relay.get_cpu_time(), relay.loop))
+    start = loop.time()
+    await asyncio.sleep(duration)
+    cpu = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(relay.get_cpu_time(), relay.loop))
+    frames = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(relay.get_frames(), relay.loop))
+    elapsed = loop.time() - start
+    for reader in readers:
+        reader.cancel()
+    for connection in connections:
+        connection.close()
+    await asyncio.gather(*readers, return_exceptions=True)
+    received = sum(count - start_count for count, start_count in zip(counts, start_counts))
+    return {"clients": clients, "cpu": (cpu - start_cpu) / elapsed * 100,
+            "stratux": (frames[0] - start_frames[0]) / elapsed,
+            "display": received / clients / elapsed}
+
+
+async def run(contacts: int, client_counts: list, duration: float, altitude_band: float) -> list:
+    stratux = FakeStratux(TrafficSimulator(contacts))
+    stratux_port = await stratux.start()
+    relay = RelayThread(Relay("127.0.0.1", stratux_port, capacity=contacts, altitude_band=altitude_band))
+    port = relay.start()
+    results = []
+    for clients in client_counts:
+        results.append(await measure(relay, port, clients, duration))
+    relay.stop()
+    stratux.stop()
+    await asyncio.sleep(0.1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=200)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=5, help="Seconds measured per client count")
+    parser.add_argument("--altitude-band", type=float, default=3000, help="Relay filter, ft above and below us")
+    arguments = parser.parse_args()
+    harness.set_clock(harness.RealClock())
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(arguments.contacts, arguments.clients, arguments.duration, arguments.altitude_band))
+    columns = ("clients", "cpu", "stratux", "display")
+    print("".join("{:>10}".format(column) for column in columns))
+    for result in results:
+        print("".join("{:>10.1f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+How ranking, expiry and rendering scale with the number of contacts.
+
+Feeds synthetic traffic for each contact count through the report list, then times the per-frame work of the main
+loop. Times are in microseconds per call on this machine, compare the growth rather than the absolute numbers.
+
+    python host/bench_scale.py --contacts 50 100 250 500 1000
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import harness
+
+harness.install()
+
+from display_manager import DisplayManager
+from report import ReportList, read_response, update_situation
+from synthetic import TrafficSimulator
+
+WARM_UP = 30  # seconds of traffic before measuring
+
+
+def measure(reports: ReportList, function, repeat: int = 5) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # A new revision and score epoch invalidate the cached ranking, nearest contact and scores, as a changed
+        # contact or own state would every frame
+        reports.revision += 1
+        reports.score_epoch += 1
+        function()
+    return (time.perf_counter() - start) / repeat * 1000000
+
+
+def render(manager: DisplayManager, display_type: int):
+    manager.select_display(display_type)
+    manager.actually_change_display()
+    manager.update_display()
+    while manager.rendering:
+        manager.render()
+
+
+def run(contacts: int) -> dict:
+    clock = harness.VirtualClock()
+    harness.set_clock(clock)
+    simulator = TrafficSimulator(contacts)
+    situation = {}
+    update_situation(situation, simulator.get_situation(), 700)
+    reports = ReportList({}, situation, capacity=contacts)
+    manager = DisplayManager(reports, {}, situation)
+    frames = 0
+    store_time = 0.0
+    end = simulator.now + WARM_UP
+    while simulator.now < end:
+        for message in simulator.step(0.1):
+            frame = json.dumps(message)
+            clock.set(simulator.now)
+            start = time.perf_counter()
+            reports.store_report(read_response(frame))
+            store_time += time.perf_counter() - start
+            frames += 1
+    return {
+        "contacts": len(reports.reports),
+        "store": store_time / frames * 1000000,
+        "rank": measure(reports, reports.get_list_sorted_score),
+        "danger": measure(reports, reports.is_danger),
+        "expire": measure(reports, reports.flush_old_reports),
+        "list": measure(reports, lambda: render(manager, DisplayManager.AIRCRAFT_LIST)),
+        "nearest": measure(reports, lambda: render(manager, DisplayManager.NEAREST_PAGE)),
+        "profile": measure(reports, lambda: render(manager, DisplayManager.ALTITUDE_PROFILE_PAGE), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, nargs="+", default=[50, 100, 250, 500, 1000])
+    arguments = parser.parse_args()
+    columns = ("contacts", "store", "rank", "danger", "expire", "list", "nearest", "profile")
+    print("".join("{:>10}".format(column) for column in columns))
+    for contacts in arguments.contacts:
+        # The device code prints on the serial console, keep that out of the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(contacts)
+        print("".join("{:>10.0f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
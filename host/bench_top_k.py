@@ -0,0 +1,73 @@
+"""
+Ranking one page of the list, or the best contact, with partial selection against sorting every contact.
+
+The ranking caches are defeated before every call. The first columns also score every contact again, as after a
+change of our own altitude, the cached columns reuse the scores, as after contact updates. Times are in microseconds
+per call on this machine.
+
+    python host/bench_top_k.py --contacts 100 500 1000
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import harness
+
+harness.install()
+
+from report import ReportList, read_response, update_situation
+from synthetic import TrafficSimulator
+
+WARM_UP = 30  # seconds of traffic before measuring
+PAGE_SIZE = 4
+
+
+def measure(reports: ReportList, function, repeat: int, rescore: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # A new revision invalidates the cached rankings, a new score epoch the scores of every contact
+        reports.revision += 1
+        if rescore:
+            reports.score_epoch += 1
+        function()
+    return (time.perf_counter() - start) / repeat * 1000000
+
+
+def run(contacts: int, repeat: int) -> dict:
+    clock = harness.VirtualClock()
+    harness.set_clock(clock)
+    simulator = TrafficSimulator(contacts)
+    situation = {}
+    update_situation(situation, simulator.get_situation(), 700)
+    reports = ReportList({}, situation, capacity=contacts)
+    end = simulator.now + WARM_UP
+    while simulator.now < end:
+        for message in simulator.step(0.1):
+            clock.set(simulator.now)
+            reports.store_report(read_response(json.dumps(message)))
+    result = {"contacts": len(reports.reports)}
+    for rescore, prefix in ((True, ""), (False, "cached ")):
+        result[prefix + "sort"] = measure(reports, lambda: reports.get_list_sorted_score()[:PAGE_SIZE], repeat,
+                                          rescore)
+        result[prefix + "page 1"] = measure(reports, lambda: reports.get_ranked_page(0, PAGE_SIZE), repeat, rescore)
+        result[prefix + "best"] = measure(reports, lambda: reports.get_top(1), repeat, rescore)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=300)
+    arguments = parser.parse_args()
+    columns = ("contacts", "sort", "page 1", "best", "cached sort", "cached page 1", "cached best")
+    print("".join("{:>14}".format(column) for column in columns))
+    for contacts in arguments.contacts:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(contacts, arguments.repeat)
+        print("".join("{:>14.0f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Copy the device code to an M5Stack running UIFlow, as sources or as precompiled bytecode.
+
+With --mpy every module except main.py is compiled with mpy-cross into a .mpy file, so the device loads bytecode
+instead of compiling the sources at boot, which is faster and does not need the compiler's heap. main.py stays a
+source file, UIFlow starts it by name. mpy-cross has to match the MicroPython version of the firmware, 1.12 for
+UIFlow 1.x:
+    pip install mpy-cross==1.12
+
+MicroPython imports a .py file before a .mpy file of the same name, so --mpy removes the sources from the device.
+Build without a device to check that everything compiles and to compare sizes:
+    python host/deploy.py --mpy
+    python host/deploy.py --mpy --port /dev/ttyUSB0
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(ROOT, "src")
+BUILD_PATH = os.path.join(ROOT, "build")
+# Started by name from the flash root
+ENTRY_POINT = "main.py"
+
+
+def find_sources(src_path: str = SRC_PATH) -> list:
+    """
+    :return: Paths of the device modules relative to src_path
+    """
+    sources = []
+    for directory, directories, files in os.walk(src_path):
+        directories[:] = sorted(name for name in directories if name != "__pycache__")
+        for name in sorted(files):
+            # Tests of the device modules stay on the host
+            if name.endswith(".py") and not name.startswith("test_"):
+                sources.append(os.path.relpath(os.path.join(directory, name), src_path))
+    return sources
+
+
+def get_mpy_cross() -> list:
+    """
+    :return: Command running mpy-cross, from the PATH or the mpy-cross Python package
+    """
+    executable = shutil.which("mpy-cross")
+    if executable:
+        return [executable]
+    try:
+        import mpy_cross
+    except ImportError:
+        sys.exit("mpy-cross not found, install it with 'pip install mpy-cross==1.12'")
+    return [mpy_cross.mpy_cross]
+
+
+def build(sources: list, mpy: bool, src_path: str = SRC_PATH, build_path: str = BUILD_PATH) -> list:
+    """
+    :return: (source, built file) pairs relative to their directories
+    """
+    if os.path.exists(build_path):
+        shutil.rmtree(build_path)
+    command = get_mpy_cross() if mpy else None
+    built = []
+    for source in sources:
+        target = source
+        if mpy and source != ENTRY_POINT:
+            target = source[:-3] + ".mpy"
+        os.makedirs(os.path.join(build_path, os.path.dirname(target)), exist_ok=True)
+        if target == source:
+            shutil.copyfile(os.path.join(src_path, source), os.path.join(build_path, target))
+        else:
+            subprocess.run(command + ["-s", source, "-o", os.path.join(build_path, target),
+                                      os.path.join(src_path, source)], check=True)
+        built.append((source, target))
+    return built
+
+
+def upload(built: list, port: str, mpy: bool, build_path: str = BUILD_PATH):
+    ampy = ["ampy", "-p", port]
+    directories = sorted({os.path.dirname(target) for source, target in built if os.path.dirname(target)})
+    for directory in directories:
+        # Fails when the directory exists already
+        subprocess.run(ampy + ["mkdir", directory], stderr=subprocess.DEVNULL)
+    for source, target in built:
+        if mpy and target != source:
+            subprocess.run(ampy + ["rm", source], stderr=subprocess.DEVNULL)
+        print("Uploading {}".format(target))
+        subprocess.run(ampy + ["put", os.path.join(build_path, target), target], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mpy", action="store_true", help="Ship precompiled .mpy files")
+    parser.add_argument("--port", help="Serial device of the M5Stack, only builds without it")
+    arguments = parser.parse_args()
+    built = build(find_sources(), arguments.mpy)
+    source_size = 0
+    built_size = 0
+    for source, target in built:
+        source_size += os.path.getsize(os.path.join(SRC_PATH, source))
+        built_size += os.path.getsize(os.path.join(BUILD_PATH, target))
+    print("{} files in {}, {} B of sources, {} B built".format(len(built), BUILD_PATH, source_size, built_size))
+    if arguments.port:
+        upload(built, arguments.port, arguments.mpy)
+
+
+if __name__ == "__main__":
+    main()
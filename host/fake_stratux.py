@@ -0,0 +1,199 @@
+"""
+Local stand-in for a Stratux receiver.
+
+Serves the endpoints the device uses, /traffic and /situation as websockets and /getSituation and /getStatus over
+HTTP, fed either by the synthetic traffic simulator or by a flight recorder log played back in real time.
+
+    python host/fake_stratux.py --contacts 500
+    python host/fake_stratux.py --log flight.rec --speed 4
+
+Point STRATUX_ADDRESS in main.py, or the host tools, at the machine running it.
+"""
+import argparse
+import asyncio
+import json
+import threading
+
+import ws
+from flight_log import read_records
+from flight_recorder import RECORD_SITUATION, RECORD_STATUS, RECORD_TRAFFIC
+from harness.traffic import SITUATION_TEMPLATE, STATUS_TEMPLATE
+from synthetic import TrafficSimulator
+
+TICK = 0.1
+
+
+class FakeStratux:
+    def __init__(self, simulator: TrafficSimulator = None, records=None, speed: float = 1,
+                 situation_stream: bool = True):
+        """
+        :param simulator: Live synthetic traffic
+        :param records: Or flight_log records to play back
+        :param situation_stream: Serve the /situation websocket, without it clients have to poll /getSituation
+        """
+        self.simulator = simulator
+        self.records = records
+        self.speed = speed
+        self.situation_stream = situation_stream
+        self.situation = dict(SITUATION_TEMPLATE)
+        self.status = dict(STATUS_TEMPLATE)
+        self.clients = {}
+        self.frames_sent = 0
+        self.running = True
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, headers = await ws.read_request(reader)
+        except (ws.ConnectionClosed, ValueError):
+            writer.close()
+            return
+        if headers.get("upgrade", "").lower() == "websocket" and (path != "/situation" or self.situation_stream):
+            connection = await ws.accept(reader, writer, path, headers)
+            await self.serve_websocket(connection)
+        elif path.startswith("/getSituation"):
+            ws.write_response(writer, json.dumps(self.situation).encode())
+            await writer.drain()
+            writer.close()
+        elif path.startswith("/getStatus"):
+            ws.write_response(writer, json.dumps(self.status).encode())
+            await writer.drain()
+            writer.close()
+        else:
+            ws.write_response(writer, b"Not found", "404 Not Found", "text/plain")
+            await writer.drain()
+            writer.close()
+
+    async def serve_websocket(self, connection: ws.Connection):
+        self.clients[connection] = connection.path
+        try:
+            # Nothing is expected from clients, reading answers their pings and notices when they go away
+            while True:
+                await connection.recv()
+        except ws.ConnectionClosed:
+            pass
+        finally:
+            self.clients.pop(connection, None)
+            connection.close()
+
+    def broadcast(self, path: str, payload: str):
+        for connection, client_path in list(self.clients.items()):
+            if client_path != path or not connection.open:
+                continue
+            try:
+                connection.write_frame(ws.OP_TEXT, payload.encode("utf-8"))
+                self.frames_sent += 1
+            except (ConnectionError, RuntimeError):
+                self.clients.pop(connection, None)
+
+    def publish_traffic(self, message: dict):
+        self.broadcast("/traffic", json.dumps(message, separators=(",", ":")))
+
+    def publish_situation(self, situation: dict):
+        self.situation = situation
+        self.broadcast("/situation", json.dumps(situation))
+
+    async def run_simulator(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self.running:
+            for message in self.simulator.step(TICK):
+                self.publish_traffic(message)
+            self.publish_situation(self.simulator.get_situation())
+            next_tick += TICK / self.speed
+            await asyncio.sleep(max(next_tick - loop.time(), 0))
+
+    async def run_records(self):
+        loop = asyncio.get_running_loop()
+        wall_start = loop.time()
+        start = None
+        for record in self.records:
+            if not self.running:
+                break
+            if start is None:
+                start = record.time
+            delay = wall_start + (record.time - start) / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if record.type == RECORD_TRAFFIC:
+                self.broadcast("/traffic", record.payload.decode("utf-8"))
+            elif record.type == RECORD_SITUATION:
+                self.publish_situation(json.loads(record.payload))
+            elif record.type == RECORD_STATUS:
+                self.status = json.loads(record.payload)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Start serving and feeding traffic
+
+        :return: The port, useful with port 0
+        """
+        self.server = await asyncio.start_server(self.handle, host, port)
+        asyncio.ensure_future(self.run_simulator() if self.simulator else self.run_records())
+        return self.server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        self.running = False
+        if self.server:
+            self.server.close()
+        for connection in list(self.clients):
+            connection.close()
+
+
+class StratuxThread:
+    """
+    Runs a FakeStratux on an event loop of its own, for driving the synchronous device code against it
+    """
+
+    def __init__(self, stratux: FakeStratux):
+        self.stratux = stratux
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self.stratux.start(host, port), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def shutdown(self):
+        self.stratux.stop()
+        # Lets the connection handlers see their clients close before the rest is cancelled
+        await asyncio.sleep(0.1)
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--contacts", type=int, default=50, help="Number of synthetic contacts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log", help="Play back a flight recorder log instead of synthetic traffic")
+    parser.add_argument("--speed", type=float, default=1)
+    parser.add_argument("--no-situation-stream", action="store_true", help="Only serve /getSituation")
+    arguments = parser.parse_args()
+    if arguments.log:
+        stratux = FakeStratux(records=read_records(arguments.log), speed=arguments.speed,
+                              situation_stream=not arguments.no_situation_stream)
+    else:
+        stratux = FakeStratux(TrafficSimulator(arguments.contacts, arguments.seed), speed=arguments.speed,
+                              situation_stream=not arguments.no_situation_stream)
+
+    async def serve():
+        port = await stratux.start(arguments.host, arguments.port)
+        print("Serving on {}:{}".format(arguments.host, port))
+        await stratux.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
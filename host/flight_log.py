@@ -0,0 +1,102 @@
+"""
+Reading and writing flight recorder logs on the host.
+
+The format is defined by src/flight_recorder.py. A log copied off the device is a ring of pages, the pages are read
+back in sequence order and records are streamed one page at a time, so large logs are never loaded whole.
+"""
+import struct
+from collections import namedtuple
+
+import harness
+
+harness.install()
+
+from flight_recorder import (FlightRecorder, PAGE_HEADER, PAGE_HEADER_SIZE, PAGE_MAGIC, PAGE_SIZE, RECORD_HEADER,
+                             RECORD_HEADER_SIZE, RECORD_SITUATION, RECORD_STATUS, RECORD_TRAFFIC,
+                             RECORD_TRAFFIC_BINARY)
+from traffic_codec import decode_frame
+
+RECORD_NAMES = {RECORD_TRAFFIC: "traffic", RECORD_SITUATION: "situation", RECORD_STATUS: "status",
+                RECORD_TRAFFIC_BINARY: "traffic_binary"}
+
+# time is in seconds, session start plus the millisecond offset of the record
+Record = namedtuple("Record", ("type", "time", "payload"))
+
+
+def read_page_headers(log_file) -> list:
+    """
+    :return: (sequence, offset) of every valid page, oldest first
+    """
+    headers = []
+    offset = 0
+    while True:
+        log_file.seek(offset)
+        header = log_file.read(PAGE_HEADER_SIZE)
+        if len(header) < PAGE_HEADER_SIZE:
+            break
+        magic, sequence, session, used = struct.unpack(PAGE_HEADER, header)
+        if magic == PAGE_MAGIC and PAGE_HEADER_SIZE <= used <= PAGE_SIZE:
+            headers.append((sequence, offset))
+        offset += PAGE_SIZE
+    headers.sort()
+    return headers
+
+
+def read_records(path: str):
+    """
+    Yield the records of a log in the order they were recorded
+    """
+    with open(path, "rb") as log_file:
+        for sequence, offset in read_page_headers(log_file):
+            log_file.seek(offset)
+            page = log_file.read(PAGE_SIZE)
+            magic, sequence, session, used = struct.unpack_from(PAGE_HEADER, page)
+            position = PAGE_HEADER_SIZE
+            while position + RECORD_HEADER_SIZE <= used:
+                record_type, length, timestamp = struct.unpack_from(RECORD_HEADER, page, position)
+                position += RECORD_HEADER_SIZE
+                yield Record(record_type, session + timestamp / 1000, bytes(page[position:position + length]))
+                position += length
+
+
+class LogWriter(FlightRecorder):
+    """
+    Writes a log on the host with the device format. Pages are appended instead of going round a ring, so the log
+    holds everything that was recorded. Timestamps come from the harness clock.
+    """
+
+    def __init__(self, file_name: str):
+        super().__init__(file_name, pages=1)
+
+    def open_ring(self):
+        return open(self.file_name, "wb")
+
+    def find_last_sequence(self) -> int:
+        return 0
+
+    def write_page(self, buffer, sequence: int):
+        self.file.seek((sequence - 1) * PAGE_SIZE)
+        self.file.write(buffer)
+        self.pages_written += 1
+
+    def record(self, record_type: int, payload):
+        super().record(record_type, payload)
+        self.service()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print the records of a flight recorder log")
+    parser.add_argument("log")
+    arguments = parser.parse_args()
+    for record in read_records(arguments.log):
+        if record.type == RECORD_TRAFFIC_BINARY:
+            payload = " ".join(str(contact) for contact in decode_frame(record.payload))
+        else:
+            payload = record.payload.decode("utf-8", "replace")
+        print("{:.3f} {} {}".format(record.time, RECORD_NAMES.get(record.type, record.type), payload))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Host harness for running the device modules in src/ under CPython.
+
+install() puts the MicroPython and M5Stack stand-ins from shims/ on the import path, aliases the u-prefixed
+standard modules to their CPython equivalents and makes src/ importable. The device code is imported unchanged.
+"""
+import builtins
+import gc
+import importlib
+import os
+import sys
+
+from .clock import RealClock, VirtualClock, get_clock, set_clock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Set M5STRATUX_SRC to run the device sources of another checkout, for comparing code versions
+SRC_PATH = os.environ.get("M5STRATUX_SRC", os.path.join(ROOT, "src"))
+SHIM_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shims")
+
+ALIASED_MODULES = ("binascii", "collections", "errno", "heapq", "io", "json", "random", "re",
+                   "struct", "ssl", "zlib")
+
+# Pretend heap size for the gc.mem_free() stand-in, the size of the MicroPython heap on an M5Stack Core
+HEAP_SIZE = 110000
+
+_installed = False
+
+
+def _mem_alloc():
+    # Allocated CPython blocks stand in for the bytes allocated on the MicroPython heap
+    return sys.getallocatedblocks() * 16
+
+
+def install(clock=None, src_path=SRC_PATH):
+    """
+    Make the device modules importable. Safe to call more than once, only the first src_path counts.
+
+    :param clock: Optional clock driving utime, a VirtualClock for deterministic runs
+    :param src_path: Device sources to run
+    """
+    global _installed
+    if clock is not None:
+        set_clock(clock)
+    if _installed:
+        return
+    _installed = True
+    for path in (src_path, SHIM_PATH):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    builtins.const = lambda value: value
+    for name in ALIASED_MODULES:
+        sys.modules.setdefault("u" + name, importlib.import_module(name))
+    if not hasattr(gc, "mem_free"):
+        gc.mem_alloc = _mem_alloc
+        gc.mem_free = lambda: max(HEAP_SIZE - _mem_alloc() % HEAP_SIZE, 0)
+        gc.threshold = lambda *args: -1
@@ -0,0 +1,58 @@
+"""
+Clocks behind the utime stand-in.
+
+The device code only sees utime. RealClock follows the host clock, VirtualClock only moves when it is advanced
+(or slept on), which makes replays and benchmarks deterministic.
+"""
+import time
+
+
+class RealClock:
+    def __init__(self):
+        self.origin = time.monotonic()
+
+    def now(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic() - self.origin
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    def __init__(self, start: float = 1600000000.0):
+        self.start = start
+        self.elapsed = 0.0
+
+    def now(self) -> float:
+        return self.start + self.elapsed
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            self.elapsed += seconds
+
+    def set(self, now: float):
+        """
+        Move the clock to an absolute time, never backwards
+        """
+        self.advance(now - self.now())
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
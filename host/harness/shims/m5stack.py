@@ -0,0 +1,58 @@
+"""
+M5Stack stand-in: a display that counts draw operations and buttons that can be pressed from a test
+"""
+
+
+class _Lcd:
+    FONT_Default = 0
+    FONT_DefaultSmall = 1
+    FONT_DejaVu18 = 2
+    FONT_DejaVu24 = 3
+    FONT_DejaVu40 = 4
+    BLACK = 0x000000
+    WHITE = 0xFFFFFF
+    RED = 0xFF0000
+    GREEN = 0x00FF00
+    YELLOW = 0xFFFF00
+    MAGENTA = 0xFF00FF
+    CENTER = -9003
+
+    def __init__(self):
+        self.operations = 0
+        self.text = []
+
+    def _draw(self, *args, **kwargs):
+        self.operations += 1
+
+    clear = rect = line = image = setColor = setCursor = fill = pixel = circle = _draw
+
+    def font(self, font, **kwargs):
+        pass
+
+    def print(self, text, x=0, y=0, color=None, **kwargs):
+        self.operations += 1
+        self.text.append(str(text))
+        del self.text[:-50]
+
+    def textWidth(self, text):
+        return 6 * len(text)
+
+
+class _Button:
+    def __init__(self):
+        self.callback = None
+
+    def wasPressed(self, callback=None):
+        if callback is not None:
+            self.callback = callback
+        return False
+
+    def press(self):
+        if self.callback:
+            self.callback()
+
+
+lcd = _Lcd()
+btnA = _Button()
+btnB = _Button()
+btnC = _Button()
@@ -0,0 +1,48 @@
+"""
+UIFlow widget stand-ins, every call counts as a draw operation on the fake lcd
+"""
+from m5stack import lcd
+
+
+class M5TextBox:
+    instances = 0
+
+    def __init__(self, x, y, text, font, color, rotate=0):
+        M5TextBox.instances += 1
+        self.x = x
+        self.y = y
+        self.text = text
+        self.font = font
+        self.color = color
+        self.visible = True
+        lcd.operations += 1
+
+    def setText(self, text):
+        self.text = text
+        lcd.operations += 1
+
+    def setColor(self, color):
+        self.color = color
+        lcd.operations += 1
+
+    def show(self):
+        self.visible = True
+        lcd.operations += 1
+
+    def hide(self):
+        self.visible = False
+        lcd.operations += 1
+
+
+class M5Rect:
+    def __init__(self, x, y, width, height, color, border_color):
+        self.visible = True
+        lcd.operations += 1
+
+    def show(self):
+        self.visible = True
+        lcd.operations += 1
+
+    def hide(self):
+        self.visible = False
+        lcd.operations += 1
@@ -0,0 +1,10 @@
+from harness.clock import get_clock
+
+
+def lightsleep(milliseconds=None):
+    if milliseconds:
+        get_clock().sleep(milliseconds / 1000)
+
+
+def freq(*args):
+    return 240000000
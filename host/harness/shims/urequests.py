@@ -0,0 +1,25 @@
+"""
+urequests stand-in on top of urllib
+"""
+import json
+import urllib.request
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+def get(url, timeout=2):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return Response(response.read())
@@ -0,0 +1,35 @@
+"""
+uselect stand-in. poll() waits on the harness clock: with a VirtualClock a wait that finds no socket ready moves the
+clock on by the timeout instead of blocking, so idle waits cost no real time in tests.
+"""
+import select as _select
+from select import POLLERR, POLLHUP, POLLIN, POLLOUT  # noqa: F401
+
+from harness.clock import VirtualClock, get_clock
+
+
+class _Poll:
+    def __init__(self):
+        self._poll = _select.poll()
+
+    def register(self, obj, eventmask=POLLIN | POLLOUT):
+        self._poll.register(obj, eventmask)
+
+    def modify(self, obj, eventmask):
+        self._poll.modify(obj, eventmask)
+
+    def unregister(self, obj):
+        self._poll.unregister(obj)
+
+    def poll(self, timeout=-1):
+        clock = get_clock()
+        if not isinstance(clock, VirtualClock):
+            return self._poll.poll(timeout)
+        events = self._poll.poll(0)
+        if not events and timeout > 0:
+            clock.advance(timeout / 1000)
+        return events
+
+
+def poll():
+    return _Poll()
@@ -0,0 +1,83 @@
+"""
+usocket stand-in. MicroPython sockets are streams with read(), readline() and write(), which CPython sockets do not
+have, so the device code gets a thin wrapper around a CPython socket.
+"""
+import socket as _socket
+from socket import (AF_INET, IPPROTO_TCP, SOCK_DGRAM, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR,  # noqa: F401
+                    getaddrinfo)
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0, _sock=None):
+        self._sock = _sock if _sock is not None else _socket.socket(af, type, proto)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def connect(self, address):
+        self._sock.connect(address)
+
+    def bind(self, address):
+        self._sock.bind(address)
+
+    def listen(self, backlog=1):
+        self._sock.listen(backlog)
+
+    def accept(self):
+        connection, address = self._sock.accept()
+        return socket(_sock=connection), address
+
+    def setsockopt(self, level, option, value):
+        self._sock.setsockopt(level, option, value)
+
+    def settimeout(self, timeout):
+        self._sock.settimeout(timeout)
+
+    def setblocking(self, flag):
+        self._sock.setblocking(flag)
+
+    def send(self, data):
+        return self._sock.send(data)
+
+    def sendall(self, data):
+        self._sock.sendall(data)
+
+    def recv(self, size):
+        return self._sock.recv(size)
+
+    def read(self, size=None):
+        """
+        Like MicroPython on a blocking socket, wait for size bytes unless the peer closes first
+        """
+        if size is None:
+            chunks = []
+            while True:
+                chunk = self._sock.recv(4096)
+                if not chunk:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+        data = b""
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def readline(self):
+        line = b""
+        while not line.endswith(b"\n"):
+            byte = self._sock.recv(1)
+            if not byte:
+                break
+            line += byte
+        return line
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self._sock.sendall(data)
+        return len(data)
+
+    def close(self):
+        self._sock.close()
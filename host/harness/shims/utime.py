@@ -0,0 +1,40 @@
+"""
+utime stand-in driven by the harness clock
+"""
+from harness.clock import get_clock
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+
+def time():
+    # MicroPython on the ESP32 returns whole seconds
+    return int(get_clock().now())
+
+
+def sleep(seconds):
+    get_clock().sleep(seconds)
+
+
+def sleep_ms(milliseconds):
+    get_clock().sleep(milliseconds / 1000)
+
+
+def sleep_us(microseconds):
+    get_clock().sleep(microseconds / 1000000)
+
+
+def ticks_ms():
+    return int(round(get_clock().monotonic() * 1000, 3)) % _TICKS_PERIOD
+
+
+def ticks_us():
+    return round(get_clock().monotonic() * 1000000) % _TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % _TICKS_PERIOD
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALF) % _TICKS_PERIOD) - _TICKS_HALF
@@ -0,0 +1,28 @@
+"""
+wifiCfg stand-in, the station is connected unless a test says otherwise
+"""
+
+
+class _Station:
+    def __init__(self):
+        self.connected = True
+        self.connect_calls = 0
+
+    def active(self, value=None):
+        return True
+
+    def connect(self, ssid, password):
+        self.connect_calls += 1
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self):
+        return self.connected
+
+
+wlan_sta = _Station()
+
+
+def doConnect(ssid, password):
+    wlan_sta.connect(ssid, password)
@@ -0,0 +1,33 @@
+"""
+Stratux shaped /traffic messages for tests and tools
+"""
+import json
+
+TRAFFIC_TEMPLATE = {
+    "Icao_addr": 0, "Reg": "", "Tail": "", "Emitter_category": 0, "OnGround": False, "Addr_type": 0,
+    "TargetType": 0, "SignalLevel": -20.0, "Squawk": 0, "Position_valid": False, "Lat": 0, "Lng": 0, "Alt": 0,
+    "GnssDiffFromBaroAlt": 0, "AltIsGNSS": False, "NIC": 0, "NACp": 0, "Track": 0, "Speed": 0,
+    "Speed_valid": False, "Vvel": 0, "Timestamp": "2020-09-13T12:00:00Z", "PriorityStatus": 0, "Age": 0,
+    "AgeLastAlt": 0, "Last_seen": "0001-01-01T00:00:00Z", "Last_alt": "0001-01-01T00:00:00Z",
+    "Last_GnssDiff": "0001-01-01T00:00:00Z", "Last_GnssDiffAlt": 0, "Last_speed": "0001-01-01T00:00:00Z",
+    "Last_source": 1, "ExtrapolatedPosition": False, "BearingDist_valid": False, "Bearing": 0, "Distance": 0,
+    "DistanceEstimated": 0, "DistanceEstimatedLastTs": "0001-01-01T00:00:00Z",
+}
+
+SITUATION_TEMPLATE = {
+    "GPSAltitudeMSL": 1000, "GPSVerticalSpeed": 0, "GPSHorizontalAccuracy": 5, "GPSFixQuality": 1,
+    "GPSSatellites": 9, "GPSLatitude": 59.9, "GPSLongitude": 10.7, "BaroPressureAltitude": 1000,
+}
+
+STATUS_TEMPLATE = {"GPS_connected": True, "GPS_satellites_locked": 9, "GPS_satellites_tracked": 12,
+                   "GPS_position_accuracy": 5}
+
+
+def make_traffic(**fields) -> dict:
+    message = dict(TRAFFIC_TEMPLATE)
+    message.update(fields)
+    return message
+
+
+def make_traffic_json(**fields) -> str:
+    return json.dumps(make_traffic(**fields), separators=(",", ":"))
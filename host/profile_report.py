@@ -0,0 +1,92 @@
+"""
+Turn a profiler dump from the device into a report or folded stacks.
+
+    python host/profile_report.py console.log
+    python host/profile_report.py profile.json --folded > profile.folded
+    flamegraph.pl profile.folded > profile.svg
+
+The input is either a file written by Profiler.dump(file_name) or a console capture, in which case the last line
+starting with "PROF " is used.
+"""
+import argparse
+import json
+import sys
+
+DUMP_PREFIX = "PROF "
+
+
+def load_table(text: str) -> dict:
+    text = text.strip()
+    if text.startswith("{"):
+        return json.loads(text)
+    table = None
+    for line in text.splitlines():
+        index = line.find(DUMP_PREFIX)
+        if index >= 0:
+            try:
+                table = json.loads(line[index + len(DUMP_PREFIX):])
+            except ValueError:
+                continue
+    if table is None:
+        raise ValueError("No profiler dump found")
+    return table
+
+
+def get_rows(table: dict) -> list:
+    """
+    :return: One dict per call stack with inclusive and self time, self time excludes profiled children
+    """
+    names = table["names"]
+    paths = table["paths"]
+    rows = []
+    for parent, function, calls, time_us, allocated in paths:
+        stack = [names[function]]
+        while parent >= 0:
+            stack.insert(0, names[paths[parent][1]])
+            parent = paths[parent][0]
+        rows.append({"stack": stack, "calls": calls, "time_us": time_us, "self_us": time_us,
+                     "allocated": allocated})
+    for (parent, _, _, time_us, _) in paths:
+        if parent >= 0:
+            rows[parent]["self_us"] -= time_us
+    return rows
+
+
+def format_report(rows: list) -> str:
+    functions = {}
+    for row in rows:
+        name = row["stack"][-1]
+        total = functions.setdefault(name, {"calls": 0, "time_us": 0, "self_us": 0, "allocated": 0})
+        for key in total:
+            total[key] += row[key]
+    lines = ["{:<36}{:>9}{:>12}{:>12}{:>10}{:>11}".format("function", "calls", "incl ms", "self ms", "us/call",
+                                                          "B/call")]
+    for name, total in sorted(functions.items(), key=lambda item: -item[1]["self_us"]):
+        calls = max(total["calls"], 1)
+        lines.append("{:<36}{:>9}{:>12.1f}{:>12.1f}{:>10.0f}{:>11.0f}".format(
+            name, total["calls"], total["time_us"] / 1000, total["self_us"] / 1000, total["time_us"] / calls,
+            total["allocated"] / calls))
+    return "\n".join(lines)
+
+
+def format_folded(rows: list) -> str:
+    return "\n".join("{} {}".format(";".join(row["stack"]), max(row["self_us"], 0)) for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dump", help="Profiler dump or console capture, - for stdin")
+    parser.add_argument("--folded", action="store_true", help="Print folded stacks for flame graph tools")
+    arguments = parser.parse_args()
+    source = sys.stdin if arguments.dump == "-" else open(arguments.dump, errors="replace")
+    with source:
+        table = load_table(source.read())
+    rows = get_rows(table)
+    print(format_folded(rows) if arguments.folded else format_report(rows))
+    if table.get("overflow"):
+        print("{} calls on untracked stacks, increase the profiler capacity".format(table["overflow"]),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Traffic relay between one Stratux and any number of M5Stratux displays.
+
+Subscribes to /traffic and /situation of the Stratux once and tracks the contacts with the device's own ReportList.
+Displays connect to the relay as if it were the Stratux. They receive only the frames that pass the traffic filter,
+and only when a contact changed or has not been sent for REFRESH_TIME seconds, so repeats of unchanged contacts are
+not parsed on every display. The frames of each tick are sent most threatening first, encoded once for all clients.
+Displays still score the contacts themselves, against their own copy of the situation.
+/situation, /getSituation and /getStatus are served from the relay's copy. With --binary the traffic goes out as
+compact binary records (src/traffic_codec.py), all contacts of a tick in one frame.
+
+    python host/relay.py --stratux 192.168.10.1 --port 8080
+    python host/fake_stratux.py --port 8000 & python host/relay.py --stratux 127.0.0.1:8000 --port 8080
+
+Point STRATUX_ADDRESS in main.py at the machine running the relay.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import harness
+
+harness.install()
+
+import ws
+from harness.traffic import SITUATION_TEMPLATE, STATUS_TEMPLATE
+from report import ReportList, read_response, update_situation
+from traffic_codec import MAX_RECORDS, encode_frame
+
+TICK = 0.1
+# Unchanged contacts are sent again this often. A display ages a contact from the last frame it got, so this is how
+# much older than on the Stratux a contact may look there.
+REFRESH_TIME = 1
+EXPIRE_TIME = 4
+STATUS_TIME = 4
+RECONNECT_DELAY = 2
+CAPACITY = 256
+INITIAL_ALT = 700
+# Clients with this much unsent data are too slow and are dropped
+MAX_CLIENT_BUFFER = 256 * 1024
+
+
+async def http_get(host: str, port: int, path: str) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write("GET {} HTTP/1.1\r\nHost: {}:{}\r\nConnection: close\r\n\r\n".format(path, host, port).encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return json.loads(response.partition(b"\r\n\r\n")[2])
+
+
+class Relay:
+    def __init__(self, stratux_host: str, stratux_port: int = 80, capacity: int = CAPACITY,
+                 reject_on_ground: bool = True, altitude_band: float = 10000, max_distance: float = 0,
+                 binary: bool = False):
+        """
+        Filter settings as FILTER_ON_GROUND, FILTER_ALTITUDE_BAND and FILTER_MAX_DISTANCE in main.py
+
+        :param binary: Send binary records instead of the Stratux JSON
+        """
+        self.stratux_host = stratux_host
+        self.stratux_port = stratux_port
+        self.binary = binary
+        self.situation = {"OwnAltitude": INITIAL_ALT, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 99999}
+        self.situation_message = dict(SITUATION_TEMPLATE)
+        self.status = dict(STATUS_TEMPLATE)
+        self.reports = ReportList(self.status, self.situation, capacity)
+        self.ingest_filter = self.reports.ingest_filter
+        self.ingest_filter.reject_on_ground = reject_on_ground
+        self.ingest_filter.altitude_band = altitude_band
+        self.ingest_filter.max_distance = max_distance
+        self.clients = {}
+        # Latest frame of every contact waiting for the next tick, by contact key
+        self.pending = {}
+        self.sent_time = {}
+        self.running = True
+        self.server = None
+        self.tasks = []
+        self.frames_in = 0
+        self.frames_out = 0
+        self.frames_sent = 0
+        self.errors = 0
+        self.dropped_clients = 0
+
+    def ingest(self, frame: str):
+        self.frames_in += 1
+        if not self.reports.accepts(frame):
+            return
+        revision = self.reports.revision
+        try:
+            report = self.reports.store_report(read_response(frame))
+        except Exception as e:
+            # A malformed frame must not stop relaying for every display
+            self.errors += 1
+            print("Failed storing traffic: {}".format(e))
+            return
+        if report is None:
+            return
+        now = time.monotonic()
+        if self.reports.revision != revision or now - self.sent_time.get(report.key, 0) >= REFRESH_TIME:
+            self.pending[report.key] = frame
+
+    def take_pending(self) -> list:
+        """
+        :return: The frames of this tick, most threatening contact first
+        """
+        self.reports.get_state_key()
+        now = time.monotonic()
+        frames = []
+        for key, frame in self.pending.items():
+            report = self.reports.reports.get(key)
+            if report is None:
+                # Expired or evicted since
+                continue
+            frames.append((report.get_distance_score(), frame))
+            self.sent_time[key] = now
+        self.pending.clear()
+        frames.sort(key=lambda item: item[0])
+        return [frame for score, frame in frames]
+
+    def encode_traffic(self, frames: list) -> list:
+        """
+        :return: Frame payloads to send for the JSON frames of a tick
+        """
+        if not self.binary:
+            return [frame.encode("utf-8") for frame in frames]
+        messages = [json.loads(frame) for frame in frames]
+        return [encode_frame(messages[start:start + MAX_RECORDS]) for start in range(0, len(messages), MAX_RECORDS)]
+
+    def broadcast(self, path: str, payloads: list, opcode: int = ws.OP_TEXT):
+        if not payloads:
+            return
+        encoded = b"".join(ws.encode_frame(opcode, payload) for payload in payloads)
+        for connection, client_path in list(self.clients.items()):
+            if client_path != path:
+                continue
+            if not connection.open or connection.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                self.dropped_clients += 1
+                self.clients.pop(connection, None)
+                connection.close()
+                continue
+            connection.write_encoded(encoded)
+            self.frames_sent += len(payloads)
+
+    async def run_traffic(self):
+        while self.running:
+            try:
+                connection = await ws.connect(self.stratux_host, self.stratux_port, "/traffic")
+                while self.running:
+                    self.ingest(await connection.recv())
+            except (OSError, ws.ConnectionClosed) as e:
+                print("Stratux traffic lost: {}".format(e))
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def run_situation(self):
+        while self.running:
+            try:
+                connection = await ws.connect(self.stratux_host, self.stratux_port, "/situation")
+                while self.running:
+                    self.publish_situation(json.loads(await connection.recv()))
+            except (OSError, ws.ConnectionClosed, ValueError) as e:
+                print("Stratux situation stream lost, polling: {}".format(e))
+            try:
+                self.publish_situation(await http_get(self.stratux_host, self.stratux_port, "/getSituation"))
+            except (OSError, ValueError):
+                pass
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def run_status(self):
+        while self.running:
+            try:
+                self.status.update(await http_get(self.stratux_host, self.stratux_port, "/getStatus"))
+            except (OSError, ValueError) as e:
+                print("Failed getting status: {}".format(e))
+            await asyncio.sleep(STATUS_TIME)
+
+    async def run_fanout(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        next_expiry = next_tick + EXPIRE_TIME
+        while self.running:
+            frames = self.take_pending()
+            self.frames_out += len(frames)
+            self.broadcast("/traffic", self.encode_traffic(frames), ws.OP_BYTES if self.binary else ws.OP_TEXT)
+            if loop.time() >= next_expiry:
+                next_expiry += EXPIRE_TIME
+                self.reports.flush_old_reports()
+                for key in [key for key in self.sent_time if key not in self.reports.reports]:
+                    del self.sent_time[key]
+            next_tick += TICK
+            await asyncio.sleep(max(next_tick - loop.time(), 0))
+
+    def publish_situation(self, message: dict):
+        self.situation_message = message
+        update_situation(self.situation, message, INITIAL_ALT)
+        self.broadcast("/situation", [json.dumps(message).encode("utf-8")])
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, headers = await ws.read_request(reader)
+        except (ws.ConnectionClosed, ValueError):
+            writer.close()
+            return
+        if headers.get("upgrade", "").lower() == "websocket" and path in ("/traffic", "/situation"):
+            connection = await ws.accept(reader, writer, path, headers)
+            self.clients[connection] = path
+            try:
+                # Reading answers pings and notices when the display goes away
+                while True:
+                    await connection.recv()
+            except ws.ConnectionClosed:
+                pass
+            finally:
+                self.clients.pop(connection, None)
+                connection.close()
+            return
+        if path.startswith("/getSituation"):
+            ws.write_response(writer, json.dumps(self.situation_message).encode())
+        elif path.startswith("/getStatus"):
+            ws.write_response(writer, json.dumps(self.status).encode())
+        else:
+            ws.write_response(writer, b"Not found", "404 Not Found", "text/plain")
+        await writer.drain()
+        writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Subscribe to the Stratux and start serving displays
+
+        :return: The port, useful with port 0
+        """
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.tasks = [asyncio.ensure_future(task) for task in
+                      (self.run_traffic(), self.run_situation(), self.run_status(), self.run_fanout())]
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.running = False
+        self.server.close()
+        for connection in list(self.clients):
+            connection.close()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def get_metrics(self) -> dict:
+        return {"clients": len(self.clients), "contacts": len(self.reports.reports), "frames_in": self.frames_in,
+                "frames_out": self.frames_out, "frames_sent": self.frames_sent, "errors": self.errors,
+                "dropped_clients": self.dropped_clients, "filter": self.ingest_filter.get_metrics()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stratux", default="192.168.10.1", help="Address of the Stratux, host or host:port")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--keep-ground", action="store_true", help="Relay ground targets as well")
+    parser.add_argument("--altitude-band", type=float, default=10000, help="ft above and below us, 0 relays all")
+    parser.add_argument("--max-distance", type=float, default=0, help="nm, 0 relays all")
+    parser.add_argument("--binary", action="store_true", help="Send binary traffic records instead of JSON")
+    arguments = parser.parse_args()
+    stratux_host, _, stratux_port = arguments.stratux.partition(":")
+    harness.set_clock(harness.RealClock())
+    relay = Relay(stratux_host, int(stratux_port or 80), reject_on_ground=not arguments.keep_ground,
+                  altitude_band=arguments.altitude_band, max_distance=arguments.max_distance,
+                  binary=arguments.binary)
+
+    async def serve():
+        port = await relay.start(arguments.host, arguments.port)
+        print("Relaying {} on {}:{}".format(arguments.stratux, arguments.host, port))
+        while True:
+            await asyncio.sleep(10)
+            print("Relay: {}".format(relay.get_metrics()))
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Deterministic replay of recorded sessions through the device code.
+
+Traffic frames go through the ingest filter, read_response and ReportList.store_report, situation and status
+samples update the own-ship state like the HTTP polls in main.py, and every SCREEN_UPDATE_TIME seconds old reports
+are flushed and a frame is rendered on the fake display. utime is driven by a virtual clock that follows the record
+timestamps, so a replay gives the same alerts every time and at any speed.
+
+    python host/replay.py flight.rec                      # as fast as possible
+    python host/replay.py flight.rec --speed 1            # real time
+    python host/replay.py flight.rec --speed 10 --output new.json
+    M5STRATUX_SRC=../old/src python host/replay.py flight.rec --output old.json
+    python host/replay.py flight.rec --baseline old.json  # compare alert timing and cost with another version
+"""
+import argparse
+import json
+import time
+
+import harness
+
+harness.install()
+
+from display_manager import DisplayManager
+from flight_log import read_records
+from flight_recorder import RECORD_SITUATION, RECORD_STATUS, RECORD_TRAFFIC, RECORD_TRAFFIC_BINARY
+from histogram import Histogram
+from report import ReportList, read_response, update_situation
+from traffic_codec import decode_frame
+
+SCREEN_UPDATE_TIME = 4
+INITIAL_ALT = 700
+
+
+class ReplayDisplayManager(DisplayManager):
+    """
+    Display manager that keeps a log of alert onsets
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.alerts = []
+        super().__init__(*args, **kwargs)
+
+    def start_alarm(self):
+        if self.alert_time == -1:
+            best = self.report_list.get_nearest()
+            self.alerts.append((harness.get_clock().now(), str(best.identifier) if best else ""))
+        super().start_alarm()
+
+
+class Replay:
+    def __init__(self, records, speed: float = 0, screen_update_time: float = SCREEN_UPDATE_TIME):
+        """
+        :param records: Iterable of flight_log.Record, from a log or a generator
+        :param speed: 1 for real time, N for N times real time, 0 for as fast as possible
+        """
+        self.records = records
+        self.speed = speed
+        self.screen_update_time = screen_update_time
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.status_dictionary = {}
+        self.situation_dictionary = {"OwnAltitude": INITIAL_ALT, "OwnVerticalVelocity": 0,
+                                     "GPSHorizontalAccuracy": 99999}
+        self.reports_list = ReportList(self.status_dictionary, self.situation_dictionary)
+        self.display_manager = ReplayDisplayManager(self.reports_list, self.status_dictionary,
+                                                    self.situation_dictionary)
+        self.display_manager.select_display(DisplayManager.AIRCRAFT_LIST)
+        self.display_manager.actually_change_display()
+        self.timers = {name: Histogram() for name in ("parse", "store", "expire", "render")}
+        self.frames = 0
+        self.errors = 0
+        self.contacts = set()
+        self.start_time = None
+        self.next_update = None
+
+    def measure(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.timers[name].record(int((time.perf_counter() - start) * 1000000))
+        return result
+
+    def render_frame(self):
+        self.display_manager.update_display()
+        while self.display_manager.rendering:
+            self.display_manager.render()
+
+    def run_periodic(self, until: float):
+        while self.next_update <= until:
+            self.clock.set(self.next_update)
+            self.measure("expire", self.reports_list.flush_old_reports)
+            if self.display_manager.trigger_select_display > -1:
+                self.display_manager.actually_change_display()
+            self.measure("render", self.render_frame)
+            self.next_update += self.screen_update_time
+
+    def wait_for(self, record_time: float, wall_start: float):
+        if self.speed <= 0:
+            return
+        delay = wall_start + (record_time - self.start_time) / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle(self, record):
+        if record.type == RECORD_TRAFFIC:
+            if not self.reports_list.accepts(record.payload):
+                return
+            try:
+                message = self.measure("parse", read_response, record.payload)
+                report = self.measure("store", self.reports_list.store_report, message)
+                if report is not None:
+                    self.contacts.add(report.key)
+                self.frames += 1
+            except Exception:
+                self.errors += 1
+        elif record.type == RECORD_TRAFFIC_BINARY:
+            try:
+                contacts = self.measure("parse", decode_frame, record.payload)
+            except ValueError:
+                self.errors += 1
+                return
+            for contact in contacts:
+                report = self.measure("store", self.reports_list.store_report, contact)
+                if report is not None:
+                    self.contacts.add(report.key)
+                self.frames += 1
+        elif record.type == RECORD_SITUATION:
+            update_situation(self.situation_dictionary, json.loads(record.payload), INITIAL_ALT)
+        elif record.type == RECORD_STATUS:
+            self.status_dictionary.update(json.loads(record.payload))
+
+    def run(self) -> dict:
+        wall_start = time.monotonic()
+        for record in self.records:
+            if self.start_time is None:
+                self.start_time = record.time
+                self.clock.set(record.time)
+                self.next_update = record.time
+            self.wait_for(record.time, wall_start)
+            self.run_periodic(record.time)
+            self.clock.set(record.time)
+            self.handle(record)
+        if self.next_update is not None:
+            self.run_periodic(self.next_update)
+        return self.get_result(time.monotonic() - wall_start)
+
+    def get_result(self, wall_time: float) -> dict:
+        start = self.start_time or 0
+        return {
+            "duration": round(self.clock.now() - start, 3),
+            "wall_time": round(wall_time, 3),
+            "frames": self.frames,
+            "errors": self.errors,
+            "contacts": len(self.contacts),
+            "filter": self.reports_list.ingest_filter.get_metrics(),
+            "alerts": [(round(alert_time - start, 3), identifier) for alert_time, identifier in
+                       self.display_manager.alerts],
+            "us": {name: histogram.summary() for name, histogram in self.timers.items()},
+        }
+
+
+def compare(result: dict, baseline: dict) -> str:
+    """
+    Pair alerts by contact in order of onset and report how much earlier or later they fire than in the baseline
+    """
+    lines = []
+    baseline_alerts = {}
+    for alert_time, identifier in baseline["alerts"]:
+        baseline_alerts.setdefault(identifier, []).append(alert_time)
+    for alert_time, identifier in result["alerts"]:
+        previous = baseline_alerts.get(identifier)
+        if previous:
+            lines.append("{:>10} alert at {:8.1f}s, {:+.1f}s".format(identifier, alert_time,
+                                                                     alert_time - previous.pop(0)))
+        else:
+            lines.append("{:>10} alert at {:8.1f}s, new".format(identifier, alert_time))
+    for identifier, times in baseline_alerts.items():
+        for alert_time in times:
+            lines.append("{:>10} alert at {:8.1f}s, missing".format(identifier, alert_time))
+    for name, summary in result["us"].items():
+        old = baseline["us"].get(name)
+        if old and old["p50"]:
+            lines.append("{:>10} p50 {}us vs {}us, p99 {}us vs {}us".format(name, summary["p50"], old["p50"],
+                                                                           summary["p99"], old["p99"]))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="Flight recorder log")
+    parser.add_argument("--speed", type=float, default=0, help="1 for real time, 0 for as fast as possible")
+    parser.add_argument("--output", help="Write the result as JSON")
+    parser.add_argument("--baseline", help="Result of an earlier replay to compare with")
+    arguments = parser.parse_args()
+    result = Replay(read_records(arguments.log), arguments.speed).run()
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump(result, output, indent=1)
+    print("{frames} frames, {contacts} contacts, {duration}s replayed in {wall_time}s, {errors} errors".format(
+        **result))
+    for alert_time, identifier in result["alerts"]:
+        print("alert {:8.1f}s {}".format(alert_time, identifier))
+    for name, summary in result["us"].items():
+        print("{:<8} n={n} p50={p50}us p99={p99}us max={max}us".format(name, **summary))
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline:
+            print(compare(result, json.load(baseline)))
+
+
+if __name__ == "__main__":
+    main()
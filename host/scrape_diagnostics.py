@@ -0,0 +1,58 @@
+"""
+Pull the instrumentation snapshots out of a serial console capture.
+
+    python host/scrape_diagnostics.py console.log
+    miniterm.py /dev/ttyUSB0 115200 | python host/scrape_diagnostics.py -
+
+Prints one table per snapshot, or the raw snapshots as JSON lines with --json.
+"""
+import argparse
+import json
+import sys
+
+DUMP_PREFIX = "DIAG "
+
+
+def read_snapshots(lines):
+    for line in lines:
+        index = line.find(DUMP_PREFIX)
+        if index < 0:
+            continue
+        try:
+            yield json.loads(line[index + len(DUMP_PREFIX):])
+        except ValueError:
+            # Lines get cut when the console is attached half way through a print
+            continue
+
+
+def format_snapshot(snapshot: dict) -> str:
+    lines = ["t={}s heap free={} alloc={}".format(snapshot["t"], snapshot["heap"]["free"],
+                                                   snapshot["heap"]["alloc"]),
+             "{:<16}{:>8}{:>10}{:>10}{:>10}{:>10}".format("timer", "/s", "n", "p50us", "p99us", "maxus")]
+    for name, (count, p50, p99, maximum) in sorted(snapshot["us"].items()):
+        lines.append("{:<16}{:>8}{:>10}{:>10}{:>10}{:>10}".format(name, snapshot["rates"].get(name, 0), count, p50,
+                                                                  p99, maximum))
+    for name, value in sorted(snapshot["counts"].items()):
+        lines.append("{:<16}{:>8}{:>10}".format(name, snapshot["rates"].get(name, 0), value))
+    for name, value in sorted(snapshot.get("gauges", {}).items()):
+        lines.append("{:<16}{}".format(name, value))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Console capture, - for stdin")
+    parser.add_argument("--json", action="store_true", help="Print the snapshots as JSON lines")
+    arguments = parser.parse_args()
+    source = sys.stdin if arguments.capture == "-" else open(arguments.capture, errors="replace")
+    with source:
+        for snapshot in read_snapshots(source):
+            if arguments.json:
+                print(json.dumps(snapshot))
+            else:
+                print(format_snapshot(snapshot))
+                print()
+
+
+if __name__ == "__main__":
+    main()
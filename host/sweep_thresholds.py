@@ -0,0 +1,302 @@
+"""
+Sweep the parameters of the danger estimation over recorded sessions.
+
+LatestReport.get_distance_score multiplies the distance in nm with the minutes until the contact crosses our altitude,
+substituting SUBSTITUTE minutes for crossing times below CUTOFF (already crossing, or diverging), and a contact is
+dangerous below THRESHOLD. This tool runs the logs through the ingest filter and the report list once, like
+analyze_logs.py, and samples every tracked contact at every screen update into NumPy columns. The score and
+calculate_crossing_time are then evaluated on the columns for every combination of the three parameters.
+
+Per setting it reports the alert onsets per hour, the lead time of the alerts (seconds from the onset until the
+alerting contact is closest) and the conflicts, contacts that came within --conflict-distance nm and
+--conflict-altitude ft, that were never the nearest dangerous contact before they got that close.
+
+    python host/sweep_thresholds.py logs/ --thresholds 1:10:0.5 --cutoffs 0:2:0.25 --substitutes 5,10,20
+    python host/sweep_thresholds.py logs/ --save samples.npz
+    python host/sweep_thresholds.py samples.npz --output sweep.json
+
+Ranges are start:stop:step with stop included, or comma separated values. Needs numpy.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import warnings
+
+import numpy
+
+import harness
+
+harness.install()
+
+from analyze_logs import LogAnalysis, SCREEN_UPDATE_TIME, find_logs
+from flight_log import read_records
+
+# The parameters in report.py
+THRESHOLD = 5
+CUTOFF = 0.5
+SUBSTITUTE = 10
+# The cap of calculate_crossing_time
+NO_CROSSING = 99
+
+SAMPLE_COLUMNS = ("sample", "contact", "own_altitude", "own_vertical", "altitude", "vertical", "distance")
+TIME_COLUMNS = ("time", "session_start")
+
+
+class SessionSampler(LogAnalysis):
+    """
+    Records the own-ship state and every tracked contact at each screen update
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = {name: [] for name in SAMPLE_COLUMNS}
+        self.times = []
+
+    def check_alert(self):
+        super().check_alert()
+        reports_list = self.reports_list
+        sample = len(self.times)
+        self.times.append(self.clock.now() - self.start_time)
+        # The band index prunes by the current setting, so every contact is scored for every setting
+        own_altitude = reports_list.situation_dictionary["OwnAltitude"]
+        own_vertical = reports_list.situation_dictionary["OwnVerticalVelocity"]
+        for key, report in reports_list.reports.items():
+            for name, value in zip(SAMPLE_COLUMNS, (sample, key, own_altitude, own_vertical,
+                                                     report.altitude, report.vertical_velocity,
+                                                     report.get_distance())):
+                self.rows[name].append(value)
+
+
+def sample_log(path: str) -> dict:
+    """
+    Worker task
+
+    :return: Column lists of one log and its alert count on the device code, or the error
+    """
+    sampler = SessionSampler()
+    try:
+        result = sampler.run(read_records(path))
+    except (OSError, ValueError) as e:
+        return {"log": path, "error": str(e)}
+    return {"log": path, "alerts": result["alerts"], "times": sampler.times, "rows": sampler.rows}
+
+
+class Samples:
+    """
+    The samples of all sessions as columns. Sample and contact numbers are unique over all sessions, rows are in
+    sample order.
+    """
+
+    def __init__(self, columns: dict):
+        for name in SAMPLE_COLUMNS + TIME_COLUMNS:
+            setattr(self, name, columns[name])
+        self.device_alerts = int(columns.get("device_alerts", 0))
+        self.contacts = int(self.contact.max()) + 1 if len(self.contact) else 0
+
+    @classmethod
+    def from_logs(cls, paths: list, workers: int = 0) -> "Samples":
+        if workers == 1 or len(paths) <= 1:
+            results = [sample_log(path) for path in paths]
+        else:
+            with multiprocessing.Pool(workers or None) as pool:
+                results = pool.map(sample_log, paths, chunksize=1)
+        columns = {name: [] for name in SAMPLE_COLUMNS + TIME_COLUMNS}
+        device_alerts = 0
+        for result in results:
+            if "error" in result:
+                print("{}: {}".format(result["log"], result["error"]))
+                continue
+            sample_offset = len(columns["time"])
+            contact_offset = max(columns["contact"], default=0) + 1
+            rows = result["rows"]
+            columns["sample"].extend(sample + sample_offset for sample in rows["sample"])
+            columns["contact"].extend(contact + contact_offset for contact in rows["contact"])
+            for name in SAMPLE_COLUMNS[2:]:
+                columns[name].extend(rows[name])
+            columns["time"].extend(result["times"])
+            columns["session_start"].extend(index == 0 for index in range(len(result["times"])))
+            device_alerts += result["alerts"]
+        arrays = {name: numpy.array(values, dtype=numpy.float64) for name, values in columns.items()}
+        for name in ("sample", "contact"):
+            arrays[name] = arrays[name].astype(numpy.int64)
+        # Dense contact numbers
+        arrays["contact"] = numpy.unique(arrays["contact"], return_inverse=True)[1]
+        arrays["session_start"] = arrays["session_start"].astype(bool)
+        arrays["device_alerts"] = device_alerts
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "Samples":
+        with numpy.load(path) as data:
+            return cls(dict(data))
+
+    def save(self, path: str):
+        numpy.savez_compressed(path, device_alerts=self.device_alerts,
+                               **{name: getattr(self, name) for name in SAMPLE_COLUMNS + TIME_COLUMNS})
+
+    def get_hours(self, screen_update_time: float = SCREEN_UPDATE_TIME) -> float:
+        return len(self.time) * screen_update_time / 3600
+
+
+def calculate_crossing_time(our_altitude, our_vertical, their_altitude, their_vertical):
+    """
+    report.calculate_crossing_time on arrays
+    """
+    closing = their_vertical - our_vertical
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        minutes = numpy.minimum((our_altitude - their_altitude) / closing, NO_CROSSING)
+    return numpy.where(closing == 0, NO_CROSSING, minutes)
+
+
+class Sweep:
+    def __init__(self, samples: Samples, conflict_distance: float = 1, conflict_altitude: float = 500):
+        """
+        :param conflict_distance: nm
+        :param conflict_altitude: ft
+        """
+        self.samples = samples
+        self.crossing_time = calculate_crossing_time(samples.own_altitude, samples.own_vertical, samples.altitude,
+                                                     samples.vertical)
+        number_of_samples = len(samples.time)
+        # Rows are in sample order, the row groups of the samples that have contacts start here
+        self.group_starts = numpy.flatnonzero(numpy.diff(samples.sample, prepend=-1) != 0)
+        self.group_samples = samples.sample[self.group_starts]
+        self.row_numbers = numpy.arange(len(samples.sample))
+        # The sample before each sample, a session start has none
+        self.previous = numpy.roll(numpy.arange(number_of_samples), 1)
+        self.has_previous = ~samples.session_start
+        # Time every contact was nearest, and when it first came into conflict
+        contact_time = samples.time[samples.sample]
+        order = numpy.lexsort((samples.distance, samples.contact))
+        first = numpy.flatnonzero(numpy.diff(samples.contact[order], prepend=-1) != 0)
+        self.closest_time = numpy.zeros(samples.contacts)
+        self.closest_time[samples.contact[order[first]]] = contact_time[order[first]]
+        in_conflict = (samples.distance < conflict_distance) & \
+            (numpy.abs(samples.altitude - samples.own_altitude) < conflict_altitude)
+        self.conflict_time = numpy.full(samples.contacts, numpy.inf)
+        numpy.minimum.at(self.conflict_time, samples.contact[in_conflict], contact_time[in_conflict])
+        self.conflicts = numpy.isfinite(self.conflict_time)
+
+    def get_nearest(self, cutoff: float, substitute: float):
+        """
+        :return: Lowest score and the contact that has it for every sample, inf and -1 without contacts
+        """
+        samples = self.samples
+        minutes = numpy.where(self.crossing_time < cutoff, substitute, self.crossing_time)
+        score = numpy.abs(minutes) * samples.distance
+        lowest = numpy.full(len(samples.time), numpy.inf)
+        nearest = numpy.full(len(samples.time), -1)
+        if len(score) == 0:
+            return lowest, nearest
+        group_lowest = numpy.minimum.reduceat(score, self.group_starts)
+        # First row of each group with the lowest score, ties go to the first contact as with min()
+        is_lowest = score == numpy.repeat(group_lowest, numpy.diff(self.group_starts, append=len(score)))
+        first_row = numpy.minimum.reduceat(numpy.where(is_lowest, self.row_numbers, len(score)), self.group_starts)
+        lowest[self.group_samples] = group_lowest
+        nearest[self.group_samples] = samples.contact[numpy.minimum(first_row, len(score) - 1)]
+        return lowest, nearest
+
+    def evaluate(self, thresholds, cutoff: float, substitute: float) -> dict:
+        """
+        Evaluate all thresholds for one cutoff and substitute
+
+        :return: Arrays over the thresholds
+        """
+        samples = self.samples
+        thresholds = numpy.asarray(thresholds, dtype=numpy.float64)
+        lowest, nearest = self.get_nearest(cutoff, substitute)
+        danger = lowest[numpy.newaxis, :] < thresholds[:, numpy.newaxis]
+        onsets = danger & ~(danger[:, self.previous] & self.has_previous[numpy.newaxis, :])
+        lead = numpy.where(nearest >= 0, self.closest_time[nearest] - samples.time, numpy.nan)
+        with warnings.catch_warnings():
+            # Settings without alerts have no lead time
+            warnings.simplefilter("ignore", RuntimeWarning)
+            lead_p50 = numpy.nanmedian(numpy.where(onsets, lead[numpy.newaxis, :], numpy.nan), axis=1)
+        # A conflict counts as alerted when it was the nearest dangerous contact before it came that close
+        in_time = (nearest >= 0) & (samples.time <= self.conflict_time[nearest]) & self.conflicts[nearest]
+        threshold_index, sample_index = numpy.nonzero(danger & in_time[numpy.newaxis, :])
+        alerted = numpy.zeros((len(thresholds), samples.contacts), dtype=bool)
+        alerted[threshold_index, nearest[sample_index]] = True
+        return {
+            "alerts": onsets.sum(axis=1),
+            "danger": danger.mean(axis=1) if len(samples.time) else numpy.zeros(len(thresholds)),
+            "lead_p50": lead_p50,
+            "missed": self.conflicts.sum() - alerted.sum(axis=1),
+        }
+
+    def run(self, thresholds, cutoffs, substitutes) -> list:
+        """
+        :return: One row per combination of the parameters
+        """
+        hours = self.samples.get_hours()
+        rows = []
+        for cutoff, substitute in itertools.product(cutoffs, substitutes):
+            result = self.evaluate(thresholds, cutoff, substitute)
+            for index, threshold in enumerate(thresholds):
+                lead = float(result["lead_p50"][index])
+                rows.append({"threshold": threshold, "cutoff": cutoff, "substitute": substitute,
+                             "alerts": int(result["alerts"][index]),
+                             "per_hour": float(result["alerts"][index]) / hours if hours else 0,
+                             "danger": float(result["danger"][index]),
+                             "lead_p50": None if numpy.isnan(lead) else lead,
+                             "missed": int(result["missed"][index])})
+        return rows
+
+
+def parse_values(text: str) -> list:
+    """
+    :param text: start:stop:step, stop included, or comma separated values
+    """
+    if ":" in text:
+        start, stop, step = (float(value) for value in text.split(":"))
+        return [round(value, 6) for value in numpy.arange(start, stop + step / 2, step)]
+    return [float(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory of logs, or samples saved with --save")
+    parser.add_argument("--pattern", default="*.rec", help="File name pattern of the logs")
+    parser.add_argument("--workers", type=int, default=0, help="Processes reading logs, 0 for one per core")
+    parser.add_argument("--save", help="Save the samples, sweep them again without reading the logs")
+    parser.add_argument("--thresholds", type=parse_values, default=[THRESHOLD])
+    parser.add_argument("--cutoffs", type=parse_values, default=[CUTOFF], help="Crossing time cut-off, minutes")
+    parser.add_argument("--substitutes", type=parse_values, default=[SUBSTITUTE],
+                        help="Crossing time used below the cut-off, minutes")
+    parser.add_argument("--conflict-distance", type=float, default=1, help="nm")
+    parser.add_argument("--conflict-altitude", type=float, default=500, help="ft")
+    parser.add_argument("--output", help="Write every setting as JSON")
+    parser.add_argument("--top", type=int, default=20, help="Print this many settings, fewest misses first")
+    arguments = parser.parse_args()
+    start = time.monotonic()
+    if os.path.isdir(arguments.source):
+        paths = find_logs(arguments.source, arguments.pattern)
+        if not paths:
+            parser.error("No logs matching {} in {}".format(arguments.pattern, arguments.source))
+        samples = Samples.from_logs(paths, arguments.workers)
+    else:
+        samples = Samples.load(arguments.source)
+    if arguments.save:
+        samples.save(arguments.save)
+    loaded = time.monotonic()
+    sweep = Sweep(samples, arguments.conflict_distance, arguments.conflict_altitude)
+    rows = sweep.run(arguments.thresholds, arguments.cutoffs, arguments.substitutes)
+    swept = time.monotonic()
+    print("{:.1f} hours, {} contacts, {} conflicts, {} alerts on the device code, loaded in {:.1f}s".format(
+        samples.get_hours(), samples.contacts, int(sweep.conflicts.sum()), samples.device_alerts, loaded - start))
+    print("{} settings swept in {:.2f}s".format(len(rows), swept - loaded))
+    print("{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}".format(
+        "threshold", "cutoff", "subst", "alerts", "per hour", "lead p50", "missed"))
+    for row in sorted(rows, key=lambda row: (row["missed"], row["per_hour"]))[:arguments.top]:
+        print("{threshold:>10}{cutoff:>10}{substitute:>10}{alerts:>10}{per_hour:>10.1f}{lead:>10}{missed:>10}".format(
+            lead="-" if row["lead_p50"] is None else "{:.0f}".format(row["lead_p50"]), **row))
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump(rows, output, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Synthetic Stratux traffic with consistent kinematics, for pushing the device code to hundreds of contacts.
+
+Every contact is one of
+    modec      Mode C, altitude only, no vertical rate and no position, signal based distance estimate
+    adsb       ADS-B without position, altitude and vertical rate, signal based distance estimate
+    adsb_pos   ADS-B with position, exact distance as well as the estimate
+and climbs, descends or flies level. Alt, Vvel, AgeLastAlt, Distance and DistanceEstimated follow from the same
+simulated state, so they stay consistent from one message to the next.
+
+    python host/synthetic.py --contacts 500 --duration 600 --log synthetic.rec   # log for host/replay.py
+    python host/synthetic.py --contacts 500 --duration 600 --replay               # straight into the replay engine
+    python host/synthetic.py --contacts 20 --json | head                          # Stratux JSON lines
+    python host/fake_stratux.py --contacts 500                                    # serve it like a Stratux
+"""
+import argparse
+import json
+import math
+import random
+
+from flight_log import Record
+from flight_recorder import RECORD_SITUATION, RECORD_STATUS, RECORD_TRAFFIC
+from harness.traffic import SITUATION_TEMPLATE, STATUS_TEMPLATE, make_traffic
+
+KINDS = ("modec", "adsb", "adsb_pos")
+PROFILES = ("climbing", "descending", "level")
+START_TIME = 1600000000.0
+
+
+def format_timestamp(now: float) -> str:
+    seconds = int(now)
+    return "2020-09-13T{:02}:{:02}:{:02}.{:03}Z".format(seconds // 3600 % 24, seconds // 60 % 60, seconds % 60,
+                                                         int(now * 1000) % 1000)
+
+
+class Contact:
+    def __init__(self, index: int, generator: random.Random, own_altitude: float):
+        self.index = index
+        self.random = generator
+        self.kind = generator.choice(KINDS)
+        self.profile = generator.choice(PROFILES)
+        self.icao = 0x400000 + index
+        self.squawk = 1000 + index % 6777
+        self.tail = "SYN{}".format(index) if self.kind != "modec" else ""
+        self.altitude = own_altitude + generator.uniform(-5000, 5000)
+        if self.profile == "climbing":
+            self.vertical_speed = generator.uniform(300, 1500)
+        elif self.profile == "descending":
+            self.vertical_speed = -generator.uniform(300, 1500)
+        else:
+            self.vertical_speed = generator.uniform(-50, 50)
+        self.distance = generator.uniform(1000, 40000)  # m
+        self.range_rate = generator.uniform(-60, 60)  # m/s, negative is closing
+        self.bearing = generator.uniform(0, 360)
+        self.speed = generator.uniform(60, 160)  # kt
+        self.track = generator.uniform(0, 360)
+        # Signal based distance estimates are off by a slowly varying factor
+        self.estimate_error = 1.0
+        self.interval = generator.uniform(0.5, 2.0)
+        self.next_message = generator.uniform(0, self.interval)
+        self.last_altitude_time = 0.0
+
+    def step(self, dt: float):
+        self.altitude += self.vertical_speed * dt / 60
+        if self.altitude < 0:
+            self.altitude = 0
+            self.vertical_speed = -self.vertical_speed
+        self.distance += self.range_rate * dt
+        if self.distance < 300 or self.distance > 60000:
+            self.range_rate = -self.range_rate
+            self.distance = min(max(self.distance, 300), 60000)
+        self.estimate_error += self.random.gauss(0, 0.02) * math.sqrt(dt) - (self.estimate_error - 1) * 0.05 * dt
+        self.estimate_error = min(max(self.estimate_error, 0.5), 2.0)
+
+    def to_message(self, now: float) -> dict:
+        # The altitude is only reported every other message for Mode C, so AgeLastAlt grows in between
+        if self.kind != "modec" or self.random.random() < 0.5 or self.last_altitude_time == 0:
+            self.last_altitude_time = now
+        has_position = self.kind == "adsb_pos"
+        return make_traffic(
+            Icao_addr=self.icao, Tail=self.tail, Reg=self.tail, Squawk=self.squawk,
+            Addr_type=0 if self.kind != "modec" else 1, TargetType=1 if self.kind != "modec" else 0,
+            Alt=int(round(self.altitude / 25) * 25), Vvel=int(self.vertical_speed) if self.kind != "modec" else 0,
+            Age=round(self.random.uniform(0, 0.5), 1), AgeLastAlt=round(now - self.last_altitude_time, 1),
+            Position_valid=has_position, BearingDist_valid=has_position,
+            Distance=self.distance if has_position else 0, Bearing=self.bearing if has_position else 0,
+            DistanceEstimated=self.distance * self.estimate_error, Speed=int(self.speed),
+            Speed_valid=self.kind != "modec", Track=int(self.track), SignalLevel=-10 - self.distance / 2000,
+            Timestamp=format_timestamp(now), Last_seen=format_timestamp(now), Last_alt=format_timestamp(now))
+
+
+class TrafficSimulator:
+    def __init__(self, contacts: int, seed: int = 1, own_altitude: float = 3000, own_vertical_speed: float = 0,
+                 start_time: float = START_TIME, churn: float = 0):
+        """
+        :param churn: Fraction of the contacts replaced by new ones per minute
+        """
+        self.random = random.Random(seed)
+        self.churn = churn
+        self.now = start_time
+        self.own_altitude = own_altitude
+        self.own_vertical_speed = own_vertical_speed
+        self.contacts = [Contact(index, self.random, own_altitude) for index in range(contacts)]
+        self.next_index = contacts
+
+    def step(self, dt: float) -> list:
+        """
+        Advance the simulation
+
+        :return: /traffic messages due in this step
+        """
+        self.now += dt
+        self.own_altitude += self.own_vertical_speed * dt / 60
+        messages = []
+        for index, contact in enumerate(self.contacts):
+            if self.churn and self.random.random() < self.churn * dt / 60:
+                contact = Contact(self.next_index, self.random, self.own_altitude)
+                self.contacts[index] = contact
+                self.next_index += 1
+            contact.step(dt)
+            contact.next_message -= dt
+            if contact.next_message <= 0:
+                contact.next_message += contact.interval
+                messages.append(contact.to_message(self.now))
+        return messages
+
+    def get_situation(self) -> dict:
+        situation = dict(SITUATION_TEMPLATE)
+        situation["GPSAltitudeMSL"] = round(self.own_altitude, 1)
+        situation["GPSVerticalSpeed"] = self.own_vertical_speed
+        return situation
+
+    def get_status(self) -> dict:
+        return dict(STATUS_TEMPLATE)
+
+    def records(self, duration: float, dt: float = 0.1, situation_interval: float = 4):
+        """
+        Yield flight_log.Record objects, the same stream a recording on the device gives
+        """
+        end = self.now + duration
+        next_situation = self.now
+        while self.now < end:
+            if self.now >= next_situation:
+                next_situation += situation_interval
+                yield Record(RECORD_STATUS, self.now, json.dumps(self.get_status()).encode())
+                yield Record(RECORD_SITUATION, self.now, json.dumps(self.get_situation()).encode())
+            for message in self.step(dt):
+                yield Record(RECORD_TRAFFIC, self.now, json.dumps(message, separators=(",", ":")).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=300, help="Seconds of traffic")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--own-vertical-speed", type=float, default=0, help="Own climb rate in fpm")
+    parser.add_argument("--churn", type=float, default=0, help="Fraction of contacts replaced per minute")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--log", help="Write a flight recorder log")
+    output.add_argument("--replay", action="store_true", help="Run the traffic through the replay engine")
+    output.add_argument("--json", action="store_true", help="Print /traffic messages as JSON lines")
+    arguments = parser.parse_args()
+    simulator = TrafficSimulator(arguments.contacts, arguments.seed,
+                                 own_vertical_speed=arguments.own_vertical_speed, churn=arguments.churn)
+    records = simulator.records(arguments.duration)
+    if arguments.log:
+        import harness
+        from flight_log import LogWriter
+
+        harness.set_clock(harness.VirtualClock(START_TIME))
+        writer = LogWriter(arguments.log)
+        for record in records:
+            harness.get_clock().set(record.time)
+            writer.record(record.type, record.payload)
+        writer.close()
+    elif arguments.replay:
+        from replay import Replay
+
+        result = Replay(records).run()
+        print(json.dumps(result, indent=1))
+    else:
+        for record in records:
+            if record.type == RECORD_TRAFFIC:
+                print(record.payload.decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from analyze_logs import analyze_log, analyze_logs, find_logs, histogram_from_dict, merge_results
+from flight_log import LogWriter
+from flight_recorder import RECORD_SITUATION, RECORD_TRAFFIC
+from harness.traffic import SITUATION_TEMPLATE, make_traffic_json
+
+
+def write_log(path: str, seconds: int, threat: bool):
+    clock = harness.VirtualClock()
+    harness.set_clock(clock)
+    writer = LogWriter(path)
+    writer.record(RECORD_SITUATION, json.dumps(SITUATION_TEMPLATE))
+    for second in range(seconds):
+        if threat:
+            # Descending towards us from 2000 ft above, closing in from 6 nm
+            writer.record(RECORD_TRAFFIC, make_traffic_json(
+                Icao_addr=0x4A1234, Alt=3000 - 20 * second, Vvel=-1200, DistanceEstimated=11000 - 100 * second,
+                Age=0.3))
+        writer.record(RECORD_TRAFFIC, make_traffic_json(Tail="FAR", Alt=9000, DistanceEstimated=40000, Age=1.5))
+        clock.advance(1)
+    writer.close()
+
+
+class TestAnalyzeLogs(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.directory.name, "later"))
+        write_log(os.path.join(self.directory.name, "threat.rec"), 60, True)
+        write_log(os.path.join(self.directory.name, "later", "quiet.rec"), 120, False)
+        with open(os.path.join(self.directory.name, "notes.txt"), "w") as notes:
+            notes.write("not a log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_single_log(self):
+        result = analyze_log(os.path.join(self.directory.name, "threat.rec"))
+        self.assertEqual(result["frames"], 120)
+        self.assertEqual(result["contacts"], 2)
+        self.assertEqual(result["alerts"], 1)
+        # Both contacts in the one minute of recording
+        self.assertEqual(result["contact_minutes"], 2)
+        alert_time = histogram_from_dict(result["alert_time"])
+        self.assertEqual(alert_time.count, 1)
+        self.assertGreater(alert_time.maximum, 10)
+        self.assertLess(alert_time.maximum, 60)
+        lag = histogram_from_dict(result["lag_ms"])
+        self.assertEqual(lag.count, 120)
+        self.assertEqual(lag.maximum, 1500)
+
+    def test_pool_matches_serial_and_merges(self):
+        paths = find_logs(self.directory.name, "*.rec")
+        self.assertEqual([os.path.basename(path) for path in paths], ["threat.rec", "quiet.rec"])
+        serial = analyze_logs(paths, workers=1)
+        pooled = analyze_logs(paths, workers=2)
+        self.assertEqual(serial, pooled)
+        total = merge_results(pooled + [{"log": "missing.rec", "error": "No such file"}])
+        self.assertEqual(total["logs"], 3)
+        self.assertEqual(total["failed"], 1)
+        self.assertEqual(total["frames"], 240)
+        self.assertEqual(total["alerts"], 1)
+        self.assertEqual(total["contact_minutes"], 2 + 2)
+        self.assertEqual(histogram_from_dict(total["lag_ms"]).count, 240)
+
+    def test_unreadable_log_is_reported(self):
+        result = analyze_log(os.path.join(self.directory.name, "missing.rec"))
+        self.assertIn("error", result)
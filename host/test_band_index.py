@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic_json
+from report import ReportList, read_response
+from synthetic import TrafficSimulator
+
+
+class TestBandIndex(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.reports = ReportList({}, self.situation, capacity=8)
+
+    def store(self, **fields):
+        return self.reports.store_report(read_response(make_traffic_json(**fields)))
+
+    def get_candidates(self):
+        return sorted(report.identifier for report in self.reports.get_threat_candidates())
+
+    def test_far_bands_are_skipped(self):
+        self.store(Icao_addr=1, Alt=3500, Vvel=0, DistanceEstimated=9000)
+        self.store(Icao_addr=2, Alt=12000, Vvel=0, DistanceEstimated=900)
+        # Far away but descending fast enough and close enough to score as dangerous
+        self.store(Icao_addr=3, Alt=9000, Vvel=-4000, DistanceEstimated=3000)
+        # Descending as fast, but too far away to be dangerous
+        self.store(Icao_addr=5, Alt=10000, Vvel=-4000, DistanceEstimated=30000)
+        # Unknown altitude is always a candidate
+        self.store(Icao_addr=4, Alt=0, Vvel=0, DistanceEstimated=9000)
+        self.assertEqual(self.get_candidates(), ["1", "3", "4"])
+
+    def test_slow_but_close_contact_in_a_far_band_alerts(self):
+        self.situation["OwnAltitude"] = 5000
+        # Crosses our altitude in 2.9 minutes, but only half a mile away: score 1.45
+        threat = self.store(Icao_addr=1, Alt=2100, Vvel=1000, DistanceEstimated=926)
+        self.store(Icao_addr=2, Alt=5200, Vvel=0, DistanceEstimated=9000)
+        self.assertTrue(threat.is_dangerous())
+        self.assertIs(self.reports.get_nearest(), threat)
+        self.assertTrue(self.reports.is_danger())
+        self.assertIs(self.reports.get_list_sorted_score()[0], threat)
+
+    def test_nearest_looks_past_pruned_bands(self):
+        # Neither is dangerous, the far one still scores lower
+        self.store(Icao_addr=1, Alt=3200, Vvel=0, DistanceEstimated=40000)
+        far = self.store(Icao_addr=2, Alt=9000, Vvel=-500, DistanceEstimated=9000)
+        self.assertEqual(self.get_candidates(), ["1"])
+        self.assertIs(self.reports.get_nearest(), far)
+        self.assertFalse(self.reports.is_danger())
+
+    def test_bands_follow_altitude_changes(self):
+        report = self.store(Icao_addr=1, Alt=12000, Vvel=0, DistanceEstimated=9000)
+        self.assertEqual(self.get_candidates(), [])
+        self.store(Icao_addr=1, Alt=4000, Vvel=0, DistanceEstimated=9000)
+        self.assertEqual(self.get_candidates(), ["1"])
+        self.assertEqual(len(self.reports.bands), 1)
+        # Own altitude changes only move the window
+        self.situation["OwnAltitude"] = 12000
+        self.assertEqual(self.get_candidates(), [])
+        self.reports.release_report(report)
+        self.assertEqual(self.reports.bands, {})
+
+    def test_nearest_matches_full_ranking(self):
+        simulator = TrafficSimulator(200, own_altitude=3000)
+        reports = ReportList({}, self.situation, capacity=200)
+        for _ in range(100):
+            for message in simulator.step(0.2):
+                reports.store_report(read_response(make_traffic_json(**message)))
+            full = min(reports.reports.values(), key=lambda k: k.get_distance_score())
+            self.assertEqual(reports.get_nearest().get_distance_score(), full.get_distance_score())
+            self.assertEqual(reports.is_danger(), full.is_dangerous())
+        self.assertEqual(sum(len(contacts) for contacts in reports.bands.values()), len(reports.reports))
@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import instrumentation
+from harness.traffic import make_traffic_json
+from report import ReportList, read_response
+
+
+class TestChangeDetection(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.reports = ReportList({}, self.situation)
+        instrumentation.enable()
+
+    def tearDown(self):
+        instrumentation.enable(False)
+
+    def store(self, **fields):
+        return self.reports.store_report(read_response(make_traffic_json(**fields)))
+
+    def test_repeated_contact_is_only_touched(self):
+        report = self.store(Icao_addr=1, Alt=2000, Vvel=500, DistanceEstimated=9000, Age=0.5)
+        revision = self.reports.revision
+        altitudes = list(report.altitudes)
+        self.clock.advance(1)
+        self.store(Icao_addr=1, Alt=2000, Vvel=500, DistanceEstimated=9000, Age=0.1)
+        self.assertEqual(self.reports.revision, revision)
+        self.assertEqual(report.altitudes, altitudes)
+        self.assertAlmostEqual(report.get_age(), 0.1, places=3)
+        self.assertEqual(instrumentation.counters["update_touch"], 1)
+
+    def test_changed_contact_is_updated(self):
+        report = self.store(Icao_addr=1, Alt=2000, Vvel=500, DistanceEstimated=9000)
+        revision = self.reports.revision
+        self.store(Icao_addr=1, Alt=2100, Vvel=500, DistanceEstimated=9000)
+        self.assertEqual(report.altitude, 2100)
+        self.assertGreater(self.reports.revision, revision)
+        self.assertEqual(instrumentation.counters["update_full"], 1)
+
+    def test_new_altitude_sample_without_vertical_rate_is_an_update(self):
+        report = self.store(Icao_addr=1, Alt=2000, Vvel=0, DistanceEstimated=9000, AgeLastAlt=0)
+        self.clock.advance(0.2)
+        self.store(Icao_addr=1, Alt=2000, Vvel=0, DistanceEstimated=9000, AgeLastAlt=0.2)
+        self.assertEqual(len(report.altitudes), 1)
+        self.clock.advance(5)
+        self.store(Icao_addr=1, Alt=2000, Vvel=0, DistanceEstimated=9000, AgeLastAlt=0)
+        self.assertEqual(len(report.altitudes), 2)
+
+    def test_ranking_is_cached_until_something_changes(self):
+        self.store(Icao_addr=1, Alt=2000, Vvel=500, DistanceEstimated=9000)
+        self.store(Icao_addr=2, Alt=3000, Vvel=500, DistanceEstimated=5000)
+        ranking = self.reports.get_list_sorted_score()
+        self.store(Icao_addr=1, Alt=2000, Vvel=500, DistanceEstimated=9000)
+        self.assertIs(self.reports.get_list_sorted_score(), ranking)
+        self.situation["OwnAltitude"] = 1500
+        self.assertIsNot(self.reports.get_list_sorted_score(), ranking)
+        ranking = self.reports.get_list_sorted_score()
+        self.store(Icao_addr=2, Alt=3000, Vvel=500, DistanceEstimated=1000)
+        self.assertIsNot(self.reports.get_list_sorted_score(), ranking)
+        self.assertEqual(instrumentation.snapshot()["hits"]["update"], 50)
+        self.assertEqual(instrumentation.snapshot()["hits"]["rank"], 40)
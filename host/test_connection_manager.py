@@ -0,0 +1,123 @@
+import socket
+import time
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from connection_manager import Backoff, ConnectionManager, JITTER, WebsocketConnector
+from fake_stratux import FakeStratux, StratuxThread
+from report import read_response
+from synthetic import TrafficSimulator
+from wifiCfg import wlan_sta
+
+# The longest a single step may take, well below a frame
+MAX_STEP_SECONDS = 0.05
+
+
+def step_until(function, seconds: float):
+    """
+    :return: The first result that is not None, and the longest step
+    """
+    longest = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.monotonic()
+        result = function()
+        longest = max(longest, time.monotonic() - start)
+        if result is not None:
+            return result, longest
+        time.sleep(0.001)
+    return None, longest
+
+
+class TestBackoff(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+
+    def test_doubles_with_jitter_up_to_the_maximum(self):
+        backoff = Backoff(1000, 8000)
+        for expected in (1000, 2000, 4000, 8000, 8000):
+            backoff.failed()
+            self.assertGreaterEqual(backoff.delay_ms, expected * (1 - JITTER) - 1)
+            self.assertLessEqual(backoff.delay_ms, expected * (1 + JITTER) + 1)
+        self.assertFalse(backoff.ready())
+        harness.get_clock().advance(backoff.delay_ms / 1000)
+        self.assertTrue(backoff.ready())
+        backoff.reset()
+        self.assertEqual(backoff.delay_ms, 0)
+
+
+class TestWebsocketConnector(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.RealClock())
+
+    def test_connects_to_stratux(self):
+        stratux = StratuxThread(FakeStratux(TrafficSimulator(10), speed=10))
+        port = stratux.start()
+        try:
+            connector = WebsocketConnector("ws://127.0.0.1:{}/traffic".format(port))
+            websocket, longest = step_until(connector.step, 5)
+            self.assertIsNotNone(websocket)
+            self.assertLess(longest, MAX_STEP_SECONDS)
+            websocket.settimeout(5)
+            read_response(websocket.recv())
+            websocket.close()
+        finally:
+            stratux.stop()
+
+    def test_refused(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        connector = WebsocketConnector("ws://127.0.0.1:{}/traffic".format(port))
+        with self.assertRaises(OSError):
+            step_until(connector.step, 5)
+
+    def test_hung_stratux_times_out_without_blocking(self):
+        # Accepts the TCP connection but never answers the handshake
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        connector = WebsocketConnector("ws://127.0.0.1:{}/traffic".format(listener.getsockname()[1]), 300)
+        longest = 0
+        with self.assertRaises(OSError):
+            while True:
+                start = time.monotonic()
+                try:
+                    connector.step()
+                finally:
+                    longest = max(longest, time.monotonic() - start)
+        self.assertLess(longest, MAX_STEP_SECONDS)
+        listener.close()
+
+
+class TestConnectionManager(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.RealClock())
+
+    def tearDown(self):
+        wlan_sta.connected = True
+
+    def test_waits_for_wifi_then_reconnects_after_outage(self):
+        wlan_sta.connected = False
+        stratux = StratuxThread(FakeStratux(TrafficSimulator(10), speed=10))
+        port = stratux.start()
+        manager = ConnectionManager(wlan_sta, "stratux", "", "ws://127.0.0.1:{}/traffic".format(port), 1000, 1)
+        try:
+            self.assertIsNone(manager.step())
+            self.assertEqual(wlan_sta.connect_calls, 1)
+            wlan_sta.connected = True
+            websocket, longest = step_until(manager.step, 5)
+            self.assertIsNotNone(websocket)
+            manager.lost()
+            self.assertFalse(manager.backoff.ready())
+            self.assertIn("Retry", (manager.step(), manager.status)[1])
+            websocket, longest = step_until(manager.step, 5)
+            self.assertIsNotNone(websocket)
+            self.assertEqual(manager.connects, 2)
+            self.assertLess(longest, MAX_STEP_SECONDS)
+        finally:
+            stratux.stop()
@@ -0,0 +1,143 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from m5stack import lcd
+
+from contact_history import (ALTITUDE_UNIT, BYTES_PER_CONTACT_MINUTE, DISTANCE_UNIT, HISTORY_TIME, TIERS,
+                             ContactHistoryStore, append_varint, read_varint)
+from display_manager import DisplayManager, TrendPage
+from harness.traffic import make_traffic_json
+from report import ReportList, read_response
+from synthetic import TrafficSimulator
+
+
+class TestContactHistory(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+
+    def test_varint_round_trip(self):
+        values = [0, 1, -1, 63, -64, 64, -65, 1000, -100000]
+        buffer = bytearray()
+        for value in values:
+            append_varint(buffer, value)
+        # Up to 63 either way takes one byte
+        self.assertEqual(len(buffer), 5 + 2 + 2 + 2 + 3)
+        decoded = []
+        position = 0
+        while position < len(buffer):
+            value, position = read_varint(buffer, position)
+            decoded.append(value)
+        self.assertEqual(decoded, values)
+
+    def test_samples_thin_out_with_age(self):
+        store = ContactHistoryStore()
+        for second in range(900):
+            store.record(1, 5000 - 10 * second, 20000 - 15 * second)
+            self.clock.advance(1)
+        # Thinning happens every COMPACT_INTERVAL, bring it up to date
+        now = self.clock.now()
+        store.histories[1].compact(now)
+        samples = store.get(1)
+        self.assertLessEqual(now - samples[0][0], HISTORY_TIME)
+        # At most one sample per interval of the spacing of its age
+        for (previous, _, _), (sample_time, _, _) in zip(samples, samples[1:]):
+            age = now - previous
+            spacing = min(spacing for limit, spacing in TIERS if age <= limit)
+            self.assertNotEqual(previous // spacing, sample_time // spacing)
+        for sample_time, altitude, distance in samples:
+            second = sample_time - self.clock.start
+            self.assertLessEqual(abs(altitude - (5000 - 10 * second)), ALTITUDE_UNIT / 2)
+            self.assertLessEqual(abs(distance - (20000 - 15 * second)), DISTANCE_UNIT / 2)
+        # 24 of the last two minutes, 12 of the three before and 5 of the rest
+        self.assertEqual(len(samples), 41)
+
+    def test_bytes_per_contact_minute(self):
+        simulator = TrafficSimulator(40, seed=2)
+        store = ContactHistoryStore(1 << 20)
+        minutes = 15
+        for _ in range(minutes * 600):
+            for message in simulator.step(0.1):
+                store.record(message["Icao_addr"], message["Alt"], message["DistanceEstimated"])
+            self.clock.advance(0.1)
+        self.assertEqual(store.bytes, sum(len(history.samples) for history in store.histories.values()))
+        per_contact_minute = store.bytes / len(store.histories) / (HISTORY_TIME / 60)
+        self.assertLessEqual(per_contact_minute, BYTES_PER_CONTACT_MINUTE)
+        self.assertGreater(per_contact_minute, BYTES_PER_CONTACT_MINUTE / 2)
+
+    def test_hard_cap(self):
+        store = ContactHistoryStore(1000)
+        for second in range(0, 600, 5):
+            for key in range(30):
+                store.record(key, 3000 + 37 * key * second, 9000 - 53 * second)
+            self.clock.advance(5)
+            self.assertLessEqual(store.bytes, 1000)
+        self.assertGreater(store.trimmed, 0)
+        self.assertEqual(store.bytes, sum(len(history.samples) for history in store.histories.values()))
+        # Trimming drops the oldest samples, the newest stay
+        self.assertEqual(store.get(29)[-1][0], self.clock.now() - 5)
+
+    def test_report_list_keeps_history_of_tracked_contacts(self):
+        situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        reports_list = ReportList({}, situation)
+        reports_list.history = ContactHistoryStore()
+        for second in range(0, 60, 5):
+            report = reports_list.store_report(read_response(make_traffic_json(
+                Icao_addr=0x4A1234, Alt=4000 - 10 * second, Vvel=-120, DistanceEstimated=9000 - 50 * second)))
+            self.clock.advance(5)
+        self.assertEqual(len(reports_list.history.get(report.key)), 12)
+        self.clock.advance(120)
+        reports_list.flush_old_reports()
+        self.assertEqual(reports_list.history.get(report.key), [])
+        self.assertEqual(reports_list.history.bytes, 0)
+
+
+class TestTrendPage(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.reports_list = ReportList({}, self.situation)
+        self.reports_list.history = ContactHistoryStore()
+        self.manager = DisplayManager(self.reports_list, {}, self.situation)
+        self.manager.release_free_bytes = 0
+
+    def store(self, **fields):
+        return self.reports_list.store_report(read_response(make_traffic_json(**fields)))
+
+    def test_plots_the_nearest_and_steps_through_contacts(self):
+        for second in range(0, 300, 5):
+            self.store(Icao_addr=0x4A1234, Alt=4000 - 5 * second, Vvel=-60, DistanceEstimated=9000 - 20 * second)
+            self.store(Tail="FAR", Alt=9000, DistanceEstimated=40000)
+            self.clock.advance(5)
+        self.manager.select_display(DisplayManager.TREND_PAGE)
+        self.manager.actually_change_display()
+        page = self.manager.active_display
+        self.assertIsInstance(page, TrendPage)
+        operations = lcd.operations
+        page.update_display()
+        self.assertIn("4A1234", page.title_box.text)
+        self.assertIn("nearest", page.title_box.text)
+        # A line between every two samples in both plots, and the axes
+        self.assertGreater(len(page.samples), 30)
+        self.assertGreater(lcd.operations - operations, 2 * (len(page.samples) - 1))
+        self.assertEqual(page.altitude_box.text, "+-1000ft")
+        operations = lcd.operations
+        page.update_display()
+        self.assertLess(lcd.operations - operations, 5)
+        page.button_a_was_pressed()
+        page.update_display()
+        self.assertEqual(page.title_box.text, "FAR")
+        page.button_c_was_pressed()
+        page.update_display()
+        self.assertIn("4A1234", page.title_box.text)
+
+    def test_without_history(self):
+        self.reports_list.history = None
+        self.manager.select_display(DisplayManager.TREND_PAGE)
+        self.manager.actually_change_display()
+        self.manager.active_display.update_display()
+        self.assertEqual(self.manager.active_display.title_box.text, "History off")
@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from display_manager import DisplayManager, ListDisplay, NearestDisplay
+from m5ui import M5TextBox
+from report import ReportList
+
+
+class TestLazyDisplays(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.manager = DisplayManager(ReportList({}, situation), {}, situation)
+        # The heap of the harness is make-believe, nothing is released unless a test asks for it
+        self.manager.release_free_bytes = 0
+
+    def show(self, display_type: int):
+        self.manager.select_display(display_type)
+        self.manager.actually_change_display()
+
+    def test_built_on_first_activation(self):
+        self.assertEqual(self.manager.display_list, {})
+        widgets = M5TextBox.instances
+        self.show(DisplayManager.AIRCRAFT_LIST)
+        self.assertIsInstance(self.manager.active_display, ListDisplay)
+        self.assertEqual(list(self.manager.display_list), [DisplayManager.AIRCRAFT_LIST])
+        self.assertGreater(M5TextBox.instances, widgets)
+        page = self.manager.active_display
+        self.show(DisplayManager.SETTINGS_PAGE)
+        self.show(DisplayManager.AIRCRAFT_LIST)
+        self.assertIs(self.manager.active_display, page)
+        self.assertEqual(self.manager.get_metrics()["created"], 2)
+
+    def test_release_when_memory_tight(self):
+        for display_type in DisplayManager.DISPLAY_TYPES:
+            self.show(display_type)
+        self.assertEqual(self.manager.release_idle_displays(), 0)
+        # Everything hidden goes except the pages an alert needs
+        self.manager.release_free_bytes = 1 << 30
+        self.assertEqual(self.manager.release_idle_displays(), 4)
+        self.assertEqual(set(self.manager.display_list),
+                         {DisplayManager.DIAGNOSTICS_PAGE, DisplayManager.NEAREST_PAGE})
+        self.assertIsInstance(self.manager.get_display(DisplayManager.NEAREST_PAGE), NearestDisplay)
+        self.manager.release_free_bytes = 0
+        self.show(DisplayManager.AIRCRAFT_LIST)
+        self.assertIsInstance(self.manager.active_display, ListDisplay)
+        self.assertEqual(self.manager.get_metrics()["released"], 4)
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from flight_log import LogWriter, read_records
+from flight_recorder import FlightRecorder, PAGE_SIZE, RECORD_SITUATION, RECORD_TRAFFIC
+from harness.traffic import make_traffic_json
+
+
+class TestFlightRecorder(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "flight.rec")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        recorder = FlightRecorder(self.path, pages=8)
+        frames = [make_traffic_json(Icao_addr=index, Alt=1000 + index) for index in range(20)]
+        for frame in frames:
+            recorder.record(RECORD_TRAFFIC, frame)
+            self.clock.advance(0.25)
+            recorder.service()
+        recorder.record(RECORD_SITUATION, b'{"GPSAltitudeMSL":1200}')
+        recorder.close()
+        self.assertEqual(os.path.getsize(self.path), 8 * PAGE_SIZE)
+        records = list(read_records(self.path))
+        self.assertEqual([record.payload.decode() for record in records[:-1]], frames)
+        self.assertEqual(records[-1].type, RECORD_SITUATION)
+        self.assertAlmostEqual(records[1].time - records[0].time, 0.25)
+
+    def test_record_does_not_touch_flash(self):
+        recorder = FlightRecorder(self.path, pages=4)
+        frame = make_traffic_json(Icao_addr=1)
+        while recorder.pending < 0:
+            recorder.record(RECORD_TRAFFIC, frame)
+        self.assertEqual(recorder.pages_written, 0)
+        # The second buffer takes records while the first waits for service()
+        recorder.record(RECORD_TRAFFIC, frame)
+        self.assertEqual(recorder.dropped, 0)
+        self.assertTrue(recorder.service())
+        self.assertEqual(recorder.pages_written, 1)
+
+    def test_worker_thread_records_while_ui_writes(self):
+        harness.set_clock(harness.RealClock())
+        recorder = FlightRecorder(self.path, pages=64)
+        frames = [make_traffic_json(Icao_addr=index) for index in range(300)]
+        situation = b'{"GPSAltitudeMSL":1200}'
+
+        def produce():
+            for frame in frames:
+                while True:
+                    dropped = recorder.dropped
+                    recorder.record(RECORD_TRAFFIC, frame)
+                    if recorder.dropped == dropped:
+                        break
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while producer.is_alive():
+            recorder.record(RECORD_SITUATION, situation)
+            recorder.service()
+            recorder.sync()
+            time.sleep(0.001)
+        producer.join()
+        recorder.close()
+        records = list(read_records(self.path))
+        self.assertEqual(len(records), recorder.records)
+        self.assertEqual([record.payload.decode() for record in records if record.type == RECORD_TRAFFIC], frames)
+        self.assertTrue(all(record.payload == situation for record in records if record.type == RECORD_SITUATION))
+
+    def test_only_sync_holds_the_lock_while_writing(self):
+        recorder = FlightRecorder(self.path, pages=4)
+        locked = []
+        write_page = recorder.write_page
+
+        def checked_write_page(buffer, sequence):
+            locked.append(recorder.lock.locked())
+            write_page(buffer, sequence)
+
+        recorder.write_page = checked_write_page
+        while recorder.pending < 0:
+            recorder.record(RECORD_TRAFFIC, make_traffic_json(Icao_addr=1))
+        recorder.record(RECORD_TRAFFIC, make_traffic_json(Icao_addr=2))
+        # A completed page is written without blocking the worker, the current page under the lock
+        recorder.sync()
+        self.assertEqual(locked, [False, True])
+
+    def test_ring_keeps_newest_pages(self):
+        recorder = FlightRecorder(self.path, pages=3)
+        for index in range(200):
+            recorder.record(RECORD_TRAFFIC, make_traffic_json(Icao_addr=index))
+            recorder.service()
+        recorder.close()
+        addresses = [int(record.payload.split(b'"Icao_addr":')[1].split(b",")[0]) for record in
+                     read_records(self.path)]
+        self.assertEqual(addresses[-1], 199)
+        self.assertGreater(addresses[0], 0)
+        self.assertEqual(addresses, sorted(addresses))
+        # A new session continues after the newest page
+        recorder = FlightRecorder(self.path, pages=3)
+        self.assertEqual(recorder.sequence, 1 + max(recorder.find_last_sequence(), 0))
+        recorder.file.close()
+
+    def test_log_writer(self):
+        writer = LogWriter(self.path)
+        for index in range(100):
+            writer.record(RECORD_TRAFFIC, make_traffic_json(Icao_addr=index))
+            self.clock.advance(0.1)
+        writer.close()
+        self.assertEqual(len(list(read_records(self.path))), 100)
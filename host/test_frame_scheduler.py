@@ -0,0 +1,121 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic_json
+from display_manager import DisplayManager
+from frame_scheduler import FrameScheduler
+from histogram import Histogram
+from report import ReportList, read_response
+
+
+class SlowClockScheduler(FrameScheduler):
+    """
+    Every slice costs 10 ms of virtual time
+    """
+
+    def end_slice(self):
+        harness.get_clock().advance(0.01)
+        super().end_slice()
+
+
+class TestHistogram(TestCase):
+    def test_percentiles(self):
+        histogram = Histogram((10, 20, 50))
+        for value in (5, 5, 15, 15, 15, 40, 100):
+            histogram.record(value)
+        self.assertEqual(histogram.count, 7)
+        self.assertEqual(histogram.percentile(0.5), 20)
+        self.assertEqual(histogram.percentile(0.99), 100)
+        self.assertEqual(histogram.maximum, 100)
+        histogram.reset()
+        self.assertEqual(histogram.percentile(0.5), 0)
+
+
+class TestFrameScheduler(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        self.situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.reports = ReportList({}, self.situation)
+        for index in range(12):
+            self.reports.store_report(read_response(
+                make_traffic_json(Icao_addr=index + 1, Alt=3000 + index * 100, DistanceEstimated=20000)))
+        self.scheduler = SlowClockScheduler(1, 25)
+        self.manager = DisplayManager(self.reports, {}, self.situation, scheduler=self.scheduler)
+        self.manager.select_display(DisplayManager.AIRCRAFT_LIST)
+        self.manager.actually_change_display()
+
+    def test_list_renders_in_chunks(self):
+        self.manager.update_display()
+        passes = 0
+        while self.manager.rendering:
+            self.manager.render()
+            passes += 1
+        # Four rows and the final clearing slice at 10 ms each with a 25 ms budget
+        self.assertEqual(passes, 2)
+        self.assertEqual(self.scheduler.frames, 1)
+        self.assertEqual(self.scheduler.split_frames, 1)
+        self.assertEqual(self.scheduler.slice_histogram.count, 5)
+
+    def test_changing_display_aborts_frame(self):
+        self.manager.update_display()
+        self.manager.render()
+        self.manager.select_display(DisplayManager.ALTITUDE_PROFILE_PAGE)
+        self.manager.actually_change_display()
+        self.assertFalse(self.manager.rendering)
+        self.assertEqual(self.scheduler.aborted_frames, 1)
+
+    def release_between_slices(self, display_type: int, recycle: bool):
+        self.manager.select_display(display_type)
+        self.manager.actually_change_display()
+        self.manager.update_display()
+        self.manager.render()
+        self.assertTrue(self.manager.rendering)
+        # Every contact expires before the next slice, a new one may take a released record
+        harness.get_clock().advance(120)
+        self.reports.flush_old_reports()
+        if recycle:
+            self.reports.store_report(read_response(make_traffic_json(Tail="NEW", Alt=3000,
+                                                                      DistanceEstimated=20000)))
+        while self.manager.rendering:
+            self.manager.render()
+        self.assertEqual(self.scheduler.frames, 1)
+
+    def test_list_rows_released_between_slices(self):
+        self.release_between_slices(DisplayManager.AIRCRAFT_LIST, True)
+        rows = self.manager.active_display.rows
+        self.assertNotIn("NEW", [row[0].text for row in rows])
+        # Three rows fit the first pass, the fourth expired before its slice
+        self.assertEqual(rows[3][0].text, "")
+
+    def test_profile_lines_released_between_slices(self):
+        # Level with the contacts, so their lines are on screen
+        self.situation["OwnAltitude"] = 3500
+        self.release_between_slices(DisplayManager.ALTITUDE_PROFILE_PAGE, False)
+
+    def test_restarted_profile_frame_is_drawn_again(self):
+        self.situation["OwnAltitude"] = 3500
+        self.manager.select_display(DisplayManager.ALTITUDE_PROFILE_PAGE)
+        self.manager.actually_change_display()
+        display = self.manager.active_display
+        self.manager.update_display()
+        self.manager.render()
+        self.assertTrue(self.manager.rendering)
+        self.assertIsNone(display.drawn_key)
+        # Restarted half-drawn with the same state, every line is drawn again
+        self.manager.update_display()
+        self.assertEqual(len(display.pending_keys), 12)
+        while self.manager.rendering:
+            self.manager.render()
+        self.assertIsNotNone(display.drawn_key)
+        # Only a complete frame is kept
+        self.manager.update_display()
+        self.assertEqual(display.pending_keys, [])
+
+    def test_frame_due(self):
+        self.manager.update_display()
+        self.assertFalse(self.scheduler.frame_due())
+        harness.get_clock().advance(1.0)
+        self.assertTrue(self.scheduler.frame_due())
@@ -0,0 +1,90 @@
+import gc
+from unittest import TestCase, mock
+
+import harness
+
+harness.install()
+
+import gc_policy
+from gc_policy import GCPolicy
+
+
+class FakeHeap:
+    def __init__(self):
+        self.allocated = 20000
+        self.free = 80000
+        self.largest = 30000
+        self.collections = 0
+        self.allocations = 0
+
+    def collect(self):
+        self.collections += 1
+
+    def bytearray(self, size):
+        self.allocations += 1
+        if size > self.largest:
+            raise MemoryError()
+        return b""
+
+
+class TestGCPolicy(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.heap = FakeHeap()
+        patches = (mock.patch.object(gc, "collect", self.heap.collect),
+                   mock.patch.object(gc, "mem_alloc", lambda: self.heap.allocated),
+                   mock.patch.object(gc, "mem_free", lambda: self.heap.free),
+                   mock.patch.object(gc_policy, "bytearray", self.heap.bytearray, create=True))
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.policy = GCPolicy(collect_after_bytes=10000, max_collect_interval_ms=5000, sample_interval_ms=30000)
+        self.policy.setup()
+
+    def test_collects_in_idle_slot_after_allocation(self):
+        collections = self.heap.collections
+        self.heap.allocated += 5000
+        self.policy.idle()
+        self.assertEqual(self.heap.collections, collections)
+        self.heap.allocated += 6000
+        self.policy.idle()
+        self.assertEqual(self.heap.collections, collections + 1)
+
+    def test_collects_after_interval(self):
+        collections = self.heap.collections
+        self.clock.advance(5.1)
+        self.policy.idle()
+        self.assertEqual(self.heap.collections, collections + 1)
+        self.assertEqual(self.policy.pause_histogram.count, self.heap.collections)
+
+    def test_probes_only_on_request(self):
+        self.clock.advance(31)
+        self.policy.idle()
+        self.assertEqual(self.heap.allocations, 0)
+        self.assertEqual(self.policy.largest_free_block, 0)
+        self.assertEqual(len(self.policy.get_history()), 2)
+        self.policy.request_probe()
+        self.policy.idle()
+        self.assertGreater(self.heap.allocations, 0)
+        self.assertFalse(self.policy.probe_requested)
+
+    def test_fragmentation(self):
+        self.policy.request_probe()
+        self.policy.idle()
+        self.assertLessEqual(30000 - self.policy.largest_free_block, 320)
+        self.assertEqual(self.policy.get_fragmentation(), 63)
+        self.heap.largest = 70000
+        self.policy.request_probe()
+        self.policy.idle()
+        self.assertLess(self.policy.get_fragmentation(), 15)
+
+    def test_probe_starts_from_last_result_and_is_capped(self):
+        self.policy.request_probe()
+        self.policy.idle()
+        self.assertLessEqual(self.heap.allocations, gc_policy.MAX_PROBE_TRIALS)
+        allocations = self.heap.allocations
+        # An unchanged heap is confirmed by two trials around the last result
+        self.policy.request_probe()
+        self.policy.idle()
+        self.assertEqual(self.heap.allocations - allocations, 2)
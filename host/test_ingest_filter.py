@@ -0,0 +1,102 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic_json
+from ingest_filter import IngestFilter, get_raw_value
+from report import ReportList, read_response
+
+
+class TestIngestFilter(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        self.situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+
+    def test_raw_values(self):
+        frame = make_traffic_json(Alt=2500, OnGround=True, Distance=1234.5, DistanceEstimated=99)
+        self.assertEqual(get_raw_value(frame, "Alt"), "2500")
+        self.assertEqual(get_raw_value(frame, "OnGround"), "true")
+        self.assertEqual(float(get_raw_value(frame, "Distance")), 1234.5)
+        self.assertEqual(float(get_raw_value(frame, "DistanceEstimated")), 99)
+        self.assertIsNone(get_raw_value("{}", "Alt"))
+
+    def test_raw_values_with_whitespace(self):
+        frame = '{"Icao_addr": 1, "OnGround" : true, "Alt": 2500}'
+        self.assertEqual(get_raw_value(frame, "OnGround"), "true")
+        self.assertEqual(get_raw_value(frame, "Alt"), "2500")
+        ingest_filter = IngestFilter(self.situation, reject_on_ground=True)
+        self.assertFalse(ingest_filter.accepts(frame))
+        self.assertFalse(ingest_filter.accepts(frame.encode()))
+
+    def test_altitude_band_waits_for_a_fix(self):
+        self.situation.update({"OwnAltitude": 700, "GPSHorizontalAccuracy": 99999})
+        ingest_filter = IngestFilter(self.situation, altitude_band=10000)
+        frame = make_traffic_json(Alt=15000, DistanceEstimated=5000)
+        self.assertTrue(ingest_filter.accepts(frame))
+        self.situation["GPSHorizontalAccuracy"] = 5
+        self.assertFalse(ingest_filter.accepts(frame))
+
+    def test_disabled_filter_passes_everything(self):
+        ingest_filter = IngestFilter(self.situation)
+        self.assertTrue(ingest_filter.accepts(make_traffic_json(OnGround=True, Alt=40000)))
+        self.assertEqual(ingest_filter.get_metrics()["passed"], 1)
+
+    def test_rejections(self):
+        ingest_filter = IngestFilter(self.situation, reject_on_ground=True, altitude_band=2000, max_distance=10,
+                                     include_valid_positions=False)
+        self.assertFalse(ingest_filter.accepts(make_traffic_json(OnGround=True, Alt=3000)))
+        self.assertFalse(ingest_filter.accepts(make_traffic_json(Alt=6000, DistanceEstimated=1000)))
+        self.assertFalse(ingest_filter.accepts(make_traffic_json(Alt=3500, DistanceEstimated=30000)))
+        self.assertFalse(ingest_filter.accepts(make_traffic_json(Alt=3500, Position_valid=True,
+                                                                 BearingDist_valid=True, Distance=1000)))
+        # Unknown altitude and an estimate within range
+        self.assertTrue(ingest_filter.accepts(make_traffic_json(Alt=0, DistanceEstimated=5000)))
+        # Bytes from a recording are checked the same way
+        self.assertFalse(ingest_filter.accepts(make_traffic_json(OnGround=True).encode()))
+        self.assertEqual(ingest_filter.get_metrics(), {"passed": 1, "ground": 2, "altitude": 1, "distance": 1,
+                                                       "position": 1})
+
+    def test_malformed_values_pass(self):
+        ingest_filter = IngestFilter(self.situation, altitude_band=2000, max_distance=10)
+        self.assertTrue(ingest_filter.accepts('{"Alt":null,"OnGround":false,"DistanceEstimated":null}'))
+        self.assertTrue(ingest_filter.accepts('{"Alt":-,"OnGround":false,"DistanceEstimated":1e'.encode()))
+        self.assertTrue(ingest_filter.accepts('{"OnGround":false,"Alt":9e'))
+        self.assertEqual(ingest_filter.passed, 3)
+
+    def test_exact_distance_used_with_gps(self):
+        ingest_filter = IngestFilter(self.situation, max_distance=10)
+        frame = make_traffic_json(Position_valid=True, BearingDist_valid=True, Distance=5000, DistanceEstimated=90000)
+        self.assertTrue(ingest_filter.accepts(frame))
+        self.situation["GPSHorizontalAccuracy"] = 99999
+        self.assertFalse(ingest_filter.accepts(frame))
+
+    def test_setting_drives_filter(self):
+        reports = ReportList({}, self.situation)
+        frame = make_traffic_json(Icao_addr=1, Alt=3000, Position_valid=True, BearingDist_valid=True, Distance=5000)
+        reports.store_report(read_response(frame))
+        reports.toggle_include_valid_positions()
+        self.assertEqual(len(reports.reports), 0)
+        self.assertFalse(reports.ingest_filter.accepts(frame))
+        reports.toggle_include_valid_positions()
+        self.assertTrue(reports.ingest_filter.accepts(frame))
+
+    def test_rejected_frames_release_tracked_contacts(self):
+        reports = ReportList({}, self.situation)
+        reports.ingest_filter.altitude_band = 2000
+        reports.toggle_hide_ground(True)
+        for frame in (make_traffic_json(Tail="LAND", Alt=3000, DistanceEstimated=2000),
+                      make_traffic_json(Icao_addr=0x4A1234, Alt=4000, DistanceEstimated=2000),
+                      make_traffic_json(Squawk=7000, Alt=3500, DistanceEstimated=2000)):
+            self.assertTrue(reports.accepts(frame))
+            reports.store_report(read_response(frame))
+        self.assertEqual(len(reports.reports), 3)
+        # One lands, one climbs out of the band
+        self.assertFalse(reports.accepts(make_traffic_json(Tail="LAND", Alt=0, OnGround=True)))
+        self.assertFalse(reports.accepts(make_traffic_json(Icao_addr=0x4A1234, Alt=9000, DistanceEstimated=2000)
+                                         .encode()))
+        self.assertEqual([report.message.Squawk for report in reports.reports.values()], [7000])
+        # An untracked contact is only rejected
+        self.assertFalse(reports.accepts(make_traffic_json(Tail="OTHER", OnGround=True)))
+        self.assertEqual(len(reports.reports), 1)
@@ -0,0 +1,129 @@
+import threading
+import time
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic_json
+from ingest_worker import IngestWorker, RingQueue
+from report import ReportList
+
+
+class FakeWebsocket:
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.closed = False
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self):
+        if self.frames:
+            return self.frames.pop(0)
+        time.sleep(0.001)
+        raise OSError("timed out")
+
+    def close(self):
+        self.closed = True
+
+
+class TestRingQueue(TestCase):
+    def test_full_and_empty(self):
+        queue = RingQueue(2)
+        self.assertIsNone(queue.get())
+        self.assertTrue(queue.put(1))
+        self.assertTrue(queue.put(2))
+        self.assertFalse(queue.put(3))
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.get(), 1)
+        self.assertTrue(queue.put(4))
+        self.assertEqual([queue.get(), queue.get(), queue.get()], [2, 4, None])
+
+    def test_threaded_producer_keeps_order(self):
+        queue = RingQueue(16)
+        count = 20000
+
+        def produce():
+            for item in range(count):
+                while not queue.put(item):
+                    time.sleep(0)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        received = []
+        while len(received) < count:
+            item = queue.get()
+            if item is None:
+                time.sleep(0)
+            else:
+                received.append(item)
+        producer.join()
+        self.assertEqual(received, list(range(count)))
+
+
+class TestIngestWorker(TestCase):
+    def test_worker_feeds_report_list(self):
+        harness.set_clock(harness.RealClock())
+        frames = [make_traffic_json(Icao_addr=index + 1, Alt=2000, DistanceEstimated=9000) for index in range(50)]
+        frames.insert(10, "not json")
+        worker = IngestWorker(lambda: FakeWebsocket(frames), RingQueue(64), error_timeout=30)
+        worker.start()
+        reports = ReportList({}, {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5})
+        deadline = time.monotonic() + 5
+        while len(reports.reports) < 50 and time.monotonic() < deadline:
+            worker.drain(reports)
+            time.sleep(0.001)
+        worker.stop()
+        self.assertEqual(len(reports.reports), 50)
+        self.assertEqual(worker.errors, 1)
+
+    def test_rejected_frames_release_tracked_contacts(self):
+        reports = ReportList({}, {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5})
+        reports.toggle_hide_ground(True)
+        worker = IngestWorker(lambda: None, RingQueue(8), error_timeout=30, ingest_filter=reports.ingest_filter)
+        frames = [make_traffic_json(Icao_addr=1, Alt=2000, DistanceEstimated=9000),
+                  make_traffic_json(Icao_addr=2, Alt=2000, DistanceEstimated=9000)]
+        websocket = FakeWebsocket(frames + [make_traffic_json(Icao_addr=1, OnGround=True)])
+        worker.receive(websocket)
+        worker.receive(websocket)
+        worker.drain(reports)
+        self.assertEqual(len(reports.reports), 2)
+        worker.receive(websocket)
+        self.assertEqual(worker.drain(reports), 1)
+        self.assertEqual([report.message.Icao_addr for report in reports.reports.values()], [2])
+
+    def test_filter_error_counts_the_frame(self):
+        class BrokenFilter:
+            def accepts(self, response):
+                if "BAD" in response:
+                    raise ValueError("bad frame")
+                return True
+
+        worker = IngestWorker(lambda: None, RingQueue(8), error_timeout=30, ingest_filter=BrokenFilter())
+        websocket = FakeWebsocket([make_traffic_json(Tail="BAD"), make_traffic_json(Icao_addr=1)])
+        # An error escaping receive() would make run() reconnect
+        worker.receive(websocket)
+        worker.receive(websocket)
+        self.assertEqual(worker.errors, 1)
+        self.assertEqual(worker.frames, 1)
+        self.assertEqual(len(worker.queue), 1)
+
+    def test_pongs_reach_the_recorder(self):
+        rtts = []
+        worker = IngestWorker(None, RingQueue(8), error_timeout=30, on_pong=rtts.append)
+
+        class StoppingWebsocket(FakeWebsocket):
+            def recv(self):
+                worker.stop()
+                return super().recv()
+
+        websocket = StoppingWebsocket([])
+        worker.connect = lambda: websocket
+        worker.running = True
+        worker.run()
+        websocket.on_pong(20000)
+        self.assertEqual(rtts, [20000])
+        self.assertTrue(websocket.closed)
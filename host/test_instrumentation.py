@@ -0,0 +1,79 @@
+import io
+import json
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import instrumentation
+from display_manager import DiagnosticsPage, DisplayManager
+from gc_policy import GCPolicy
+from report import ReportList
+from scrape_diagnostics import read_snapshots
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        instrumentation.enable(True)
+
+    def tearDown(self):
+        instrumentation.enable(False)
+
+    def test_disabled_records_nothing(self):
+        instrumentation.enable(False)
+        start_ticks = instrumentation.start()
+        self.assertEqual(start_ticks, 0)
+        instrumentation.stop("parse", start_ticks)
+        instrumentation.count("frames")
+        self.assertNotIn("parse", instrumentation.timers)
+        self.assertEqual(instrumentation.counters, {})
+
+    def test_snapshot_rates_and_latencies(self):
+        for _ in range(10):
+            start_ticks = instrumentation.start()
+            harness.get_clock().advance(0.0003)
+            instrumentation.stop("parse", start_ticks)
+            instrumentation.count("frames")
+        harness.get_clock().advance(1.997)
+        snapshot = instrumentation.snapshot()
+        self.assertEqual(snapshot["counts"]["frames"], 10)
+        self.assertEqual(snapshot["rates"]["frames"], 5)
+        count, p50, p99, maximum = snapshot["us"]["parse"]
+        self.assertEqual(count, 10)
+        self.assertEqual(p50, 300)
+        self.assertIn("free", snapshot["heap"])
+
+    def test_dump_is_scrapable(self):
+        instrumentation.count("frames", 3)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            print("Free memory: 1000 B")
+            instrumentation.dump()
+        snapshots = list(read_snapshots(output.getvalue().splitlines()))
+        self.assertEqual(len(snapshots), 1)
+        self.assertEqual(snapshots[0]["counts"]["frames"], 3)
+
+    def test_diagnostics_page(self):
+        situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        manager = DisplayManager(ReportList({}, situation), {}, situation)
+        page = manager.get_display(DisplayManager.DIAGNOSTICS_PAGE)
+        self.assertIsInstance(page, DiagnosticsPage)
+        page.update_display()
+        self.assertTrue(page.rows[1].text.startswith("parse"))
+        page.button_a_was_pressed()
+        page.update_display()
+        self.assertEqual(page.rows[0].text, "Instrumentation off")
+
+    def test_diagnostics_page_requests_heap_probe(self):
+        situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        manager = DisplayManager(ReportList({}, situation), {}, situation)
+        manager.gc_policy = GCPolicy()
+        manager.select_display(DisplayManager.DIAGNOSTICS_PAGE)
+        manager.actually_change_display()
+        self.assertTrue(manager.gc_policy.probe_requested)
+        manager.gc_policy.idle()
+        self.assertFalse(manager.gc_policy.probe_requested)
+        self.assertGreater(instrumentation.gauges["heap_largest"], 0)
@@ -0,0 +1,134 @@
+import json
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import utime
+
+from display_manager import DisplayManager
+from frame_scheduler import FrameScheduler
+from harness.traffic import make_traffic_json
+from ingest_worker import IngestWorker, RingQueue
+from latency import ALERT_BUDGET_MS, RENDER_BUDGET_MS, LatencyTracker
+from report import ReportList, read_response, update_situation
+from synthetic import TrafficSimulator
+from test_ingest_worker import FakeWebsocket
+
+
+class TestLatency(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.reports_list = ReportList({}, self.situation)
+        self.latency = LatencyTracker()
+        self.reports_list.latency = self.latency
+
+    def create_manager(self, scheduler=None) -> DisplayManager:
+        manager = DisplayManager(self.reports_list, {}, self.situation, scheduler)
+        manager.select_display(DisplayManager.AIRCRAFT_LIST)
+        manager.actually_change_display()
+        return manager
+
+    def test_receive_time_travels_through_the_ingest_queue(self):
+        worker = IngestWorker(lambda: None, RingQueue(8), error_timeout=30)
+        worker.receive(FakeWebsocket([make_traffic_json(Icao_addr=0x4A1234, Alt=4000, DistanceEstimated=9000)]))
+        received = utime.ticks_ms()
+        self.clock.advance(0.3)
+        worker.drain(self.reports_list)
+        report = self.reports_list.get_nearest()
+        self.assertEqual(report.received, received)
+        self.assertEqual(report.changed, received)
+
+    def test_each_frame_is_rendered_once(self):
+        manager = self.create_manager()
+        self.reports_list.store_report(read_response(make_traffic_json(Tail="ONE", Alt=9000, Age=0.4,
+                                                                       DistanceEstimated=40000)))
+        self.clock.advance(1.5)
+        manager.active_display.update_display()
+        manager.active_display.update_display()
+        self.assertEqual(self.latency.render.count, 1)
+        self.assertEqual(self.latency.render.maximum, 1500)
+        self.assertEqual(self.latency.source.maximum, 1900)
+        # A repeated frame only refreshes the age, it still counts
+        self.reports_list.store_report(read_response(make_traffic_json(Tail="ONE", Alt=9000, Age=0.4,
+                                                                       DistanceEstimated=40000)))
+        self.clock.advance(0.2)
+        manager.active_display.update_display()
+        self.assertEqual(self.latency.render.count, 2)
+        self.assertEqual(self.latency.render.percentile(0.5), 200)
+
+    def test_alert_latency_from_the_changing_frame(self):
+        manager = self.create_manager()
+        self.reports_list.store_report(read_response(make_traffic_json(Icao_addr=0x4A1234, Alt=3500, Vvel=-1000,
+                                                                       DistanceEstimated=1852)))
+        self.clock.advance(0.5)
+        # Repeats of the same data do not move the alert latency
+        self.reports_list.store_report(read_response(make_traffic_json(Icao_addr=0x4A1234, Alt=3500, Vvel=-1000,
+                                                                       DistanceEstimated=1852)))
+        self.clock.advance(0.5)
+        manager.update_display()
+        self.assertEqual(self.latency.alert.count, 1)
+        self.assertEqual(self.latency.alert.maximum, 1000)
+        # The alert goes on, it is not counted again
+        self.clock.advance(4)
+        manager.update_display()
+        self.assertEqual(self.latency.alert.count, 1)
+
+    def test_alert_latency_from_our_own_climb(self):
+        manager = self.create_manager()
+        # Level, half a mile away and 1000 ft above us, not heard from with a change for a minute
+        for _ in range(60):
+            self.reports_list.store_report(read_response(make_traffic_json(Icao_addr=0x4A1234, Alt=4000, Vvel=0,
+                                                                           DistanceEstimated=926)))
+            self.clock.advance(1)
+        manager.update_display()
+        self.assertEqual(self.latency.alert.count, 0)
+        # We climb towards it, the situation update makes it dangerous
+        update_situation(self.situation, {"GPSAltitudeMSL": 3600, "GPSVerticalSpeed": 500,
+                                          "GPSHorizontalAccuracy": 5}, 3000)
+        self.clock.advance(0.3)
+        manager.update_display()
+        self.assertEqual(self.latency.alert.count, 1)
+        self.assertEqual(self.latency.alert.maximum, 300)
+
+    def run_loop(self, scheduler, duration: float) -> DisplayManager:
+        """
+        The traffic path of the main loop under synthetic load, with a contact turning into a threat halfway
+        """
+        manager = self.create_manager(scheduler)
+        simulator = TrafficSimulator(40, seed=3)
+        step = 0.1
+        steps = int(duration / step)
+        for index in range(steps):
+            for message in simulator.step(step):
+                self.reports_list.store_report(read_response(json.dumps(message)), utime.ticks_ms())
+            if index >= steps // 2 and index % 10 == 0:
+                second = (index - steps // 2) // 10
+                self.reports_list.store_report(read_response(make_traffic_json(
+                    Icao_addr=0x4A1234, Alt=6000 - 100 * second, Vvel=-1500, DistanceEstimated=5000 - 100 * second)),
+                    utime.ticks_ms())
+            if manager.trigger_select_display > -1:
+                manager.actually_change_display()
+            if not manager.rendering and (manager.trigger_update_display or manager.scheduler.frame_due()):
+                manager.update_display()
+            manager.render()
+            self.clock.advance(step)
+        return manager
+
+    def test_synthetic_load_within_budget(self):
+        self.run_loop(FrameScheduler(0.25, 30), 120)
+        metrics = self.latency.get_metrics()
+        self.assertGreater(metrics["render"]["n"], 50)
+        self.assertGreater(metrics["alert"]["n"], 0)
+        self.assertLessEqual(metrics["render"]["p95"], RENDER_BUDGET_MS)
+        self.assertLessEqual(metrics["alert"]["max"], ALERT_BUDGET_MS)
+        self.assertEqual(metrics["over"], [])
+
+    def test_tight_budget_is_reported(self):
+        self.latency = LatencyTracker(render_budget_ms=100, alert_budget_ms=10)
+        self.reports_list.latency = self.latency
+        self.run_loop(FrameScheduler(0.25, 30), 120)
+        self.assertEqual(self.latency.get_over_budget(), ["render", "alert"])
@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from poll_scheduler import (AdaptivePoll, STATUS_MAX_INTERVAL_MS, STATUS_MIN_INTERVAL_MS, SITUATION_MAX_INTERVAL_MS,
+                            SITUATION_MIN_INTERVAL_MS, get_situation_interval, get_status_interval)
+
+
+class TestPollScheduler(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+
+    def test_due(self):
+        poll = AdaptivePoll("situation", SITUATION_MIN_INTERVAL_MS, SITUATION_MAX_INTERVAL_MS)
+        self.assertTrue(poll.due())
+        poll.polled()
+        poll.set_interval(2000)
+        self.clock.advance(1.9)
+        self.assertFalse(poll.due())
+        self.clock.advance(0.1)
+        self.assertTrue(poll.due())
+
+    def test_intervals_are_bounded(self):
+        poll = AdaptivePoll("situation", SITUATION_MIN_INTERVAL_MS, SITUATION_MAX_INTERVAL_MS)
+        poll.set_interval(10)
+        self.assertEqual(poll.interval_ms, SITUATION_MIN_INTERVAL_MS)
+        poll.set_interval(100000)
+        self.assertEqual(poll.interval_ms, SITUATION_MAX_INTERVAL_MS)
+
+    def test_situation_follows_climb_and_threats(self):
+        self.assertEqual(get_situation_interval(0, None), SITUATION_MAX_INTERVAL_MS)
+        self.assertEqual(get_situation_interval(-1500, None), 2000)
+        self.assertGreater(get_situation_interval(300, 100), SITUATION_MAX_INTERVAL_MS)
+        self.assertEqual(get_situation_interval(0, 3), SITUATION_MIN_INTERVAL_MS)
+
+    def test_status_backs_off_until_a_change(self):
+        poll = AdaptivePoll("status", STATUS_MIN_INTERVAL_MS, STATUS_MAX_INTERVAL_MS)
+        for _ in range(10):
+            poll.set_interval(get_status_interval(poll.interval_ms, False))
+        self.assertEqual(poll.interval_ms, STATUS_MAX_INTERVAL_MS)
+        poll.set_interval(get_status_interval(poll.interval_ms, True))
+        self.assertEqual(poll.interval_ms, STATUS_MIN_INTERVAL_MS)
@@ -0,0 +1,143 @@
+import socket
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from display_manager import DisplayManager
+from frame_scheduler import FrameScheduler
+from harness.traffic import make_traffic_json
+from power_manager import IDLE_WAIT_MS, PowerManager, WAKE_BUTTON, WAKE_CHECK_MS, WAKE_DATA
+from report import ReportList, read_response
+
+# A pass of the active loop blocks this long in websocket.recv(), SOCKET_TIMEOUT in main.py
+SOCKET_TIMEOUT = 0.1
+
+
+class PressingPoller:
+    """
+    Poller stand-in that presses a button on its third poll
+    """
+
+    def __init__(self, clock, callback):
+        self.clock = clock
+        self.callback = callback
+        self.polls = 0
+
+    def poll(self, timeout):
+        self.polls += 1
+        self.clock.advance(timeout / 1000)
+        if self.polls == 3:
+            self.callback()
+        return []
+
+
+class TestPowerManager(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.scheduler = FrameScheduler(0.25, 30)
+        self.power = PowerManager(self.scheduler, idle_after_ms=10000, idle_frame_interval_ms=16000)
+        self.stratux, self.device = socket.socketpair()
+
+    def tearDown(self):
+        self.stratux.close()
+        self.device.close()
+
+    def test_goes_idle_without_activity(self):
+        self.power.update()
+        self.clock.advance(9)
+        self.power.activity(WAKE_DATA)
+        self.clock.advance(9)
+        self.power.update()
+        self.assertFalse(self.power.idle)
+        self.clock.advance(1)
+        self.power.update()
+        self.assertTrue(self.power.idle)
+        self.assertEqual(self.scheduler.frame_interval_ms, 16000)
+        self.power.activity(WAKE_DATA)
+        self.assertFalse(self.power.idle)
+        self.assertEqual(self.scheduler.frame_interval_ms, 4000)
+        self.assertTrue(self.scheduler.frame_due())
+        self.assertEqual(self.power.get_metrics()["wakeups"][WAKE_DATA], 1)
+
+    def test_alert_keeps_the_loop_active(self):
+        for _ in range(20):
+            self.clock.advance(1)
+            self.power.update(alert=True)
+        self.assertFalse(self.power.idle)
+
+    def test_wait_ends_on_data(self):
+        self.power.watch(self.device)
+        self.clock.advance(10)
+        self.power.update()
+        self.assertFalse(self.power.wait())
+        self.assertAlmostEqual(self.clock.monotonic(), 10 + IDLE_WAIT_MS / 1000)
+        self.stratux.send(b"traffic")
+        start = self.clock.monotonic()
+        self.assertTrue(self.power.wait())
+        self.assertEqual(self.clock.monotonic(), start)
+        self.power.update()
+        metrics = self.power.get_metrics()
+        self.assertEqual(metrics["waited_ms"], IDLE_WAIT_MS)
+        self.assertLess(metrics["duty"], 100)
+
+    def test_button_ends_wait_within_a_slice(self):
+        pressed = []
+        callback = self.power.button(lambda: pressed.append(True))
+        self.clock.advance(10)
+        self.power.update()
+        self.power.poller = PressingPoller(self.clock, callback)
+        start = self.clock.monotonic()
+        self.power.wait()
+        self.assertEqual(pressed, [True])
+        self.assertFalse(self.power.idle)
+        self.assertAlmostEqual(self.clock.monotonic() - start, 3 * WAKE_CHECK_MS / 1000)
+        self.assertEqual(self.power.wakeups[WAKE_BUTTON], 1)
+
+    def test_quiet_loop_mostly_waits_and_alerts_promptly(self):
+        situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        reports_list = ReportList({}, situation)
+        display_manager = DisplayManager(reports_list, {}, situation, self.scheduler)
+        display_manager.select_display(DisplayManager.AIRCRAFT_LIST)
+        display_manager.actually_change_display()
+        self.power.watch(self.device)
+        self.device.settimeout(0)
+        frames = 0
+
+        def run_pass():
+            nonlocal frames
+            # The traffic path of the main loop, with a socket pair for the websocket
+            if self.power.wait(IDLE_WAIT_MS) or not self.power.idle:
+                try:
+                    frame = self.device.recv(4096)
+                except BlockingIOError:
+                    self.clock.advance(SOCKET_TIMEOUT)
+                    frame = None
+                if frame:
+                    reports_list.store_report(read_response(frame.decode()))
+                    self.power.activity(WAKE_DATA)
+            self.power.update(display_manager.alert_time > -1 or reports_list.is_danger())
+            if self.scheduler.frame_due():
+                frames += 1
+                display_manager.update_display()
+                while display_manager.rendering:
+                    display_manager.render()
+
+        while self.clock.monotonic() < 300:
+            run_pass()
+        metrics = self.power.get_metrics()
+        self.assertTrue(metrics["idle"])
+        self.assertLess(metrics["duty"], 10)
+        # 10 s at 4 s per frame, the rest at 16 s per frame
+        self.assertLess(frames, 25)
+        # A contact 1 nm away, descending through our altitude within a minute, arrives while the loop waits
+        self.stratux.send(make_traffic_json(Icao_addr=0x4A1234, Alt=3500, Vvel=-1000,
+                                            DistanceEstimated=1852).encode())
+        threat_time = self.clock.monotonic()
+        run_pass()
+        self.assertFalse(self.power.idle)
+        self.assertGreater(display_manager.alert_time, -1)
+        # Only the alert blink of update_display has passed
+        self.assertLessEqual(self.clock.monotonic() - threat_time, 0.25)
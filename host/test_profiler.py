@@ -0,0 +1,52 @@
+import io
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from profile_report import format_folded, get_rows, load_table
+from profiler import Profiler
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        self.profiler = Profiler(capacity=4)
+
+        def leaf():
+            harness.get_clock().advance(0.002)
+
+        self.leaf = self.profiler.wrap(leaf)
+
+        def outer():
+            harness.get_clock().advance(0.001)
+            self.leaf()
+            self.leaf()
+
+        self.outer = self.profiler.wrap(outer)
+
+    def test_stacks_and_folded_output(self):
+        self.outer()
+        self.outer()
+        self.leaf()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.profiler.dump()
+        rows = get_rows(load_table(output.getvalue()))
+        by_stack = {";".join(row["stack"]): row for row in rows}
+        self.assertEqual(by_stack["outer"]["calls"], 2)
+        self.assertEqual(by_stack["outer"]["time_us"], 10000)
+        self.assertEqual(by_stack["outer"]["self_us"], 2000)
+        self.assertEqual(by_stack["outer;leaf"]["calls"], 4)
+        self.assertEqual(by_stack["leaf"]["calls"], 1)
+        self.assertIn("outer;leaf 8000", format_folded(rows))
+
+    def test_capacity_overflow(self):
+        functions = [self.profiler.wrap(lambda: None, "f{}".format(index)) for index in range(6)]
+        for function in functions:
+            function()
+        self.assertEqual(self.profiler.path_count, 4)
+        self.assertEqual(self.profiler.overflow, 2)
+        self.assertEqual(self.profiler.depth, 0)
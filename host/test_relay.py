@@ -0,0 +1,85 @@
+import asyncio
+import json
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import ws
+from fake_stratux import FakeStratux
+from ingest_filter import REJECT_ALTITUDE
+from relay import REFRESH_TIME, Relay
+from report import read_response
+from synthetic import TrafficSimulator
+from traffic_codec import decode_frame
+
+
+class TestRelay(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.RealClock())
+
+    def test_repeats_held_back(self):
+        relay = Relay("127.0.0.1", altitude_band=0)
+        simulator = TrafficSimulator(5)
+        relay.publish_situation(simulator.get_situation())
+        frames = [json.dumps(message) for message in simulator.step(3)]
+        for frame in frames + frames:
+            relay.ingest(frame)
+        sent = relay.take_pending()
+        self.assertEqual(len(sent), len(frames))
+        scores = [relay.reports.reports[relay.reports.map_to_key(read_response(frame))].get_distance_score()
+                  for frame in sent]
+        self.assertEqual(scores, sorted(scores))
+        relay.ingest(frames[0])
+        self.assertEqual(relay.take_pending(), [])
+        for key in relay.sent_time:
+            relay.sent_time[key] -= REFRESH_TIME
+        relay.ingest(frames[0])
+        self.assertEqual(relay.take_pending(), [frames[0]])
+
+    def test_malformed_frames_are_counted(self):
+        relay = Relay("127.0.0.1", altitude_band=0)
+        frame = json.dumps(TrafficSimulator(1).step(3)[0])
+        for bad in ("not json", json.dumps({"Icao_addr": 1}), frame):
+            relay.ingest(bad)
+        self.assertEqual(relay.errors, 2)
+        self.assertEqual(relay.take_pending(), [frame])
+
+    def test_binary_records(self):
+        relay = Relay("127.0.0.1", binary=True)
+        frames = [json.dumps(message) for message in TrafficSimulator(300).step(3)]
+        payloads = relay.encode_traffic(frames)
+        self.assertEqual(len(payloads), 2)
+        contacts = [contact for payload in payloads for contact in decode_frame(payload)]
+        self.assertEqual([contact.Icao_addr for contact in contacts],
+                         [json.loads(frame)["Icao_addr"] for frame in frames])
+
+    def test_fans_out_filtered_traffic(self):
+        async def scenario():
+            stratux = FakeStratux(TrafficSimulator(40), speed=10)
+            stratux_port = await stratux.start()
+            relay = Relay("127.0.0.1", stratux_port, altitude_band=2000)
+            port = await relay.start()
+            clients = [await ws.connect("127.0.0.1", port, "/traffic") for _ in range(3)]
+            received = [[await asyncio.wait_for(client.recv(), 5) for _ in range(10)] for client in clients]
+            situation = await asyncio.wait_for((await ws.connect("127.0.0.1", port, "/situation")).recv(), 5)
+            for client in clients:
+                client.close()
+            await relay.stop()
+            stratux.stop()
+            # Lets the Stratux connection handlers finish
+            await asyncio.sleep(0.1)
+            return relay, received, json.loads(situation)
+
+        relay, received, situation = asyncio.run(scenario())
+        self.assertIn("GPSAltitudeMSL", situation)
+        for frames in received:
+            self.assertEqual(len(frames), 10)
+            for frame in frames:
+                message = read_response(frame)
+                # Contacts without altitude always pass
+                if message.Alt != 0:
+                    self.assertLessEqual(abs(message.Alt - relay.situation["OwnAltitude"]), 2000 + 500)
+        self.assertGreater(relay.get_metrics()["filter"][REJECT_ALTITUDE], 0)
+        self.assertGreaterEqual(relay.frames_sent, 30)
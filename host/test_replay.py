@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from flight_log import LogWriter, read_records
+from flight_recorder import RECORD_SITUATION, RECORD_TRAFFIC
+from harness.traffic import SITUATION_TEMPLATE, make_traffic_json
+from replay import Replay, compare
+from report import ReportPool
+
+
+class TestReplay(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "flight.rec")
+        clock = harness.VirtualClock()
+        harness.set_clock(clock)
+        writer = LogWriter(self.path)
+        writer.record(RECORD_SITUATION, json.dumps(SITUATION_TEMPLATE))
+        # A contact descending towards us from 2000 ft above, closing in from 6 nm
+        for second in range(60):
+            writer.record(RECORD_TRAFFIC, make_traffic_json(
+                Icao_addr=0x4A1234, Alt=3000 - 20 * second, Vvel=-1200, DistanceEstimated=11000 - 100 * second))
+            writer.record(RECORD_TRAFFIC, make_traffic_json(Tail="FAR", Alt=9000, DistanceEstimated=40000))
+            clock.advance(1)
+        writer.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay_is_deterministic(self):
+        first = Replay(read_records(self.path)).run()
+        second = Replay(read_records(self.path), speed=1000).run()
+        self.assertEqual(first["frames"], 120)
+        self.assertEqual(first["contacts"], 2)
+        self.assertAlmostEqual(first["duration"], 60, delta=0.5)
+        self.assertTrue(first["alerts"])
+        self.assertEqual(first["alerts"][0][1], "4A1234")
+        self.assertEqual(first["alerts"], second["alerts"])
+        self.assertGreater(second["wall_time"], 0.05)
+        self.assertIn("4A1234 alert", compare(second, first))
+
+    def test_dropped_contacts_are_not_errors(self):
+        replay = Replay(read_records(self.path))
+        replay.reports_list.pool = ReportPool(replay.reports_list, 1, ReportPool.DROP_NEW)
+        result = replay.run()
+        self.assertEqual(result["errors"], 0)
+        self.assertEqual(result["contacts"], 1)
+        self.assertGreater(replay.reports_list.pool.dropped, 0)
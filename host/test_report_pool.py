@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic_json
+from report import ReportList, ReportPool, read_response
+
+
+class TestReportPool(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.situation = {"OwnAltitude": 1000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+
+    def store(self, reports, **fields):
+        return reports.store_report(read_response(make_traffic_json(**fields)))
+
+    def test_records_are_reused(self):
+        reports = ReportList({}, self.situation, capacity=4)
+        records = set()
+        for index in range(4):
+            records.add(id(self.store(reports, Icao_addr=index + 1, Alt=2000, DistanceEstimated=9000)))
+        self.clock.advance(61)
+        reports.flush_old_reports()
+        self.assertEqual(len(reports.reports), 0)
+        self.assertEqual(len(reports.pool.free), 4)
+        for index in range(4):
+            records.add(id(self.store(reports, Icao_addr=index + 10, Alt=2000, DistanceEstimated=9000)))
+        self.assertEqual(len(records), 4)
+        self.assertEqual(reports.pool.allocations, 5)
+
+    def test_overflow_evicts_lowest_threat(self):
+        reports = ReportList({}, self.situation, capacity=2)
+        self.store(reports, Icao_addr=1, Alt=1500, Vvel=-500, DistanceEstimated=5000)
+        self.store(reports, Icao_addr=2, Alt=1500, Vvel=-500, DistanceEstimated=50000)
+        # Further away than both, dropped
+        self.assertIsNone(self.store(reports, Icao_addr=3, Alt=1500, Vvel=-500, DistanceEstimated=90000))
+        # Closer than the furthest, which is evicted
+        report = self.store(reports, Icao_addr=4, Alt=1500, Vvel=-500, DistanceEstimated=3000)
+        self.assertEqual(report.identifier, "4")
+        self.assertEqual(sorted(report.identifier for report in reports.reports.values()), ["1", "4"])
+        self.assertEqual(reports.pool.evicted, 1)
+        self.assertEqual(reports.pool.dropped, 1)
+
+    def test_drop_new_policy(self):
+        reports = ReportList({}, self.situation, capacity=1, overflow_policy=ReportPool.DROP_NEW)
+        self.store(reports, Icao_addr=1, Alt=1500, DistanceEstimated=50000)
+        self.assertIsNone(self.store(reports, Icao_addr=2, Alt=1500, DistanceEstimated=1000))
+        self.assertEqual(reports.pool.dropped, 1)
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import socket
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import ws
+from fake_stratux import FakeStratux
+from harness.traffic import SITUATION_TEMPLATE
+from situation_stream import RETRY_TIME_MS, STALE_TIME_MS, SituationStream
+from synthetic import TrafficSimulator
+
+
+class PairWebsocket:
+    """
+    Websocket stand-in over a socket pair, one JSON document per recv()
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def recv(self):
+        data = self.sock.recv(4096)
+        return data.decode() if data else None
+
+    def close(self):
+        self.sock.close()
+
+
+class TestSituationStream(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        self.situation = {}
+        self.connections = 0
+        self.server = None
+
+    def connect(self):
+        self.connections += 1
+        client, self.server = socket.socketpair()
+        return PairWebsocket(client)
+
+    def send(self, **fields):
+        situation = dict(SITUATION_TEMPLATE)
+        situation.update(fields)
+        self.server.send(json.dumps(situation).encode())
+
+    def test_updates_own_state(self):
+        stream = SituationStream(self.connect, self.situation, 700)
+        self.assertFalse(stream.service())
+        self.assertFalse(stream.is_live())
+        self.send(GPSAltitudeMSL=4500, GPSVerticalSpeed=-800)
+        self.assertTrue(stream.service())
+        self.assertTrue(stream.is_live())
+        self.assertEqual(self.situation["OwnAltitude"], 4500)
+        self.assertEqual(self.situation["OwnVerticalVelocity"], -800)
+        self.server.close()
+
+    def test_falls_back_when_quiet_and_retries(self):
+        stream = SituationStream(self.connect, self.situation, 700)
+        stream.service()
+        self.send(GPSAltitudeMSL=4500)
+        stream.service()
+        self.clock.advance(STALE_TIME_MS / 1000)
+        self.assertFalse(stream.service())
+        self.assertFalse(stream.is_live())
+        self.assertIsNone(stream.websocket)
+        self.clock.advance(RETRY_TIME_MS / 1000)
+        stream.service()
+        self.assertEqual(self.connections, 2)
+        self.server.close()
+
+    def test_connect_failure(self):
+        def fail():
+            raise OSError("refused")
+
+        stream = SituationStream(fail, self.situation, 700)
+        stream.service()
+        stream.service()
+        self.assertEqual(stream.failures, 1)
+        self.assertFalse(stream.is_live())
+
+
+class TestFakeStratuxSituationStream(TestCase):
+    def test_stream_and_fallback(self):
+        async def scenario():
+            stratux = FakeStratux(TrafficSimulator(5), speed=10)
+            port = await stratux.start()
+            connection = await ws.connect("127.0.0.1", port, "/situation")
+            frame = await asyncio.wait_for(connection.recv(), 5)
+            connection.close()
+            stratux.stop()
+            without_stream = FakeStratux(TrafficSimulator(5), speed=10, situation_stream=False)
+            port = await without_stream.start()
+            with self.assertRaises(ws.ConnectionClosed):
+                await ws.connect("127.0.0.1", port, "/situation")
+            without_stream.stop()
+            return frame
+
+        self.assertIn("GPSAltitudeMSL", json.loads(asyncio.run(scenario())))
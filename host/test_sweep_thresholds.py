@@ -0,0 +1,84 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from flight_log import LogWriter
+from report import calculate_crossing_time
+from synthetic import TrafficSimulator
+from test_analyze_logs import write_log
+
+try:
+    import numpy
+    import sweep_thresholds
+except ImportError:
+    numpy = None
+
+
+def write_synthetic_log(path: str, seed: int):
+    simulator = TrafficSimulator(20, seed, own_vertical_speed=300, churn=0.2)
+    clock = harness.VirtualClock()
+    harness.set_clock(clock)
+    writer = LogWriter(path)
+    for record in simulator.records(300):
+        clock.set(record.time)
+        writer.record(record.type, record.payload)
+    writer.close()
+
+
+class TestSweepThresholds(TestCase):
+    def setUp(self):
+        if numpy is None:
+            self.skipTest("numpy is not installed")
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.directory.name, name) for name in ("threat.rec", "a.rec", "b.rec")]
+        write_log(self.paths[0], 60, True)
+        write_synthetic_log(self.paths[1], 1)
+        write_synthetic_log(self.paths[2], 2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_crossing_time_matches_device_code(self):
+        generator = random.Random(4)
+        values = [[generator.choice((0, 500, -500, generator.uniform(-3000, 3000))) for _ in range(4)]
+                  for _ in range(500)]
+        columns = numpy.array(values).T
+        vectorized = sweep_thresholds.calculate_crossing_time(*columns)
+        for row, minutes in zip(values, vectorized):
+            self.assertAlmostEqual(calculate_crossing_time(*row), minutes)
+
+    def test_device_setting_gives_device_alerts(self):
+        samples = sweep_thresholds.Samples.from_logs(self.paths, workers=1)
+        self.assertGreater(samples.device_alerts, 1)
+        sweep = sweep_thresholds.Sweep(samples)
+        rows = sweep.run([sweep_thresholds.THRESHOLD], [sweep_thresholds.CUTOFF], [sweep_thresholds.SUBSTITUTE])
+        self.assertEqual(rows[0]["alerts"], samples.device_alerts)
+        self.assertIsNotNone(rows[0]["lead_p50"])
+
+    def test_grid_is_monotonic_in_threshold(self):
+        samples = sweep_thresholds.Samples.from_logs(self.paths, workers=1)
+        thresholds = sweep_thresholds.parse_values("0:20:1")
+        self.assertEqual(len(thresholds), 21)
+        rows = sweep_thresholds.Sweep(samples).run(thresholds, [0, 0.5, 1], [5, 10])
+        self.assertEqual(len(rows), 21 * 3 * 2)
+        for start in range(0, len(rows), len(thresholds)):
+            setting = rows[start:start + len(thresholds)]
+            self.assertEqual(setting[0]["alerts"], 0)
+            # A higher threshold is dangerous more often and never misses more conflicts
+            self.assertEqual([row["danger"] for row in setting], sorted(row["danger"] for row in setting))
+            self.assertEqual([row["missed"] for row in setting],
+                             sorted((row["missed"] for row in setting), reverse=True))
+
+    def test_saved_samples_sweep_the_same(self):
+        samples = sweep_thresholds.Samples.from_logs(self.paths, workers=1)
+        path = os.path.join(self.directory.name, "samples.npz")
+        samples.save(path)
+        loaded = sweep_thresholds.Samples.load(path)
+        grid = ([2, 5, 8], [0.5], [10])
+        self.assertEqual(sweep_thresholds.Sweep(samples).run(*grid), sweep_thresholds.Sweep(loaded).run(*grid))
+        self.assertEqual(loaded.device_alerts, samples.device_alerts)
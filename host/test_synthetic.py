@@ -0,0 +1,59 @@
+import asyncio
+import json
+import urllib.request
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import ws
+from fake_stratux import FakeStratux
+from report import read_response
+from synthetic import TrafficSimulator
+
+
+class TestTrafficSimulator(TestCase):
+    def test_messages_are_stratux_shaped_and_consistent(self):
+        simulator = TrafficSimulator(30, seed=3)
+        first = {}
+        last = {}
+        for _ in range(100):
+            for message in simulator.step(0.1):
+                read_response(json.dumps(message))
+                first.setdefault(message["Icao_addr"], (simulator.now, message))
+                last[message["Icao_addr"]] = (simulator.now, message)
+        kinds = {contact.kind for contact in simulator.contacts}
+        self.assertEqual(kinds, {"modec", "adsb", "adsb_pos"})
+        for contact in simulator.contacts:
+            if contact.kind == "modec" or contact.altitude == 0:
+                continue
+            start_time, start = first[contact.icao]
+            end_time, end = last[contact.icao]
+            expected = contact.vertical_speed * (end_time - start_time) / 60
+            self.assertAlmostEqual(end["Alt"] - start["Alt"], expected, delta=30)
+            self.assertEqual(end["Position_valid"], contact.kind == "adsb_pos")
+
+    def test_same_seed_same_traffic(self):
+        first = [message for _ in range(20) for message in TrafficSimulator(10, seed=5).step(0.1)]
+        second = [message for _ in range(20) for message in TrafficSimulator(10, seed=5).step(0.1)]
+        self.assertEqual(first, second)
+
+
+class TestFakeStratux(TestCase):
+    def test_serves_traffic_and_situation(self):
+        async def scenario():
+            stratux = FakeStratux(TrafficSimulator(20), speed=10)
+            port = await stratux.start()
+            connection = await ws.connect("127.0.0.1", port, "/traffic")
+            frames = [await asyncio.wait_for(connection.recv(), 5) for _ in range(10)]
+            situation = await asyncio.get_running_loop().run_in_executor(None, lambda: json.loads(
+                urllib.request.urlopen("http://127.0.0.1:{}/getSituation".format(port)).read()))
+            connection.close()
+            stratux.stop()
+            return frames, situation
+
+        frames, situation = asyncio.run(scenario())
+        self.assertEqual(len(frames), 10)
+        read_response(frames[0])
+        self.assertIn("GPSAltitudeMSL", situation)
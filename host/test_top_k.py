@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic_json
+from report import ReportList, read_response
+from synthetic import TrafficSimulator
+
+
+class TestTopK(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        self.situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        self.reports = ReportList({}, self.situation, capacity=300)
+        simulator = TrafficSimulator(300, own_altitude=3000)
+        for _ in range(20):
+            for message in simulator.step(0.5):
+                self.reports.store_report(read_response(make_traffic_json(**message)))
+
+    def get_full_ranking(self):
+        return sorted(self.reports.reports.values(), key=lambda k: k.get_distance_score())
+
+    def test_top_matches_full_sort(self):
+        full = self.get_full_ranking()
+        for count in (1, 4, 12, 299, 500):
+            self.reports.revision += 1
+            self.assertEqual(self.reports.get_top(count), full[:count])
+
+    def test_pages(self):
+        full = self.get_full_ranking()
+        self.assertEqual(self.reports.get_ranked_page(0, 4), full[:4])
+        self.assertEqual(self.reports.get_ranked_page(2, 4), full[8:12])
+        # The last page is filled up from the page before
+        self.assertEqual(self.reports.get_ranked_page(74, 4), full[-4:])
+
+    def test_ties_keep_insertion_order(self):
+        reports = ReportList({}, self.situation)
+        for index in range(6):
+            reports.store_report(read_response(make_traffic_json(Icao_addr=index + 1, Alt=4000,
+                                                                 DistanceEstimated=9000)))
+        self.assertEqual([report.identifier for report in reports.get_top(3)], ["1", "2", "3"])
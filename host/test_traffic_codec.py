@@ -0,0 +1,60 @@
+import json
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+from harness.traffic import make_traffic
+from report import ReportList, read_response
+from synthetic import TrafficSimulator
+from traffic_codec import (MAX_RECORDS, RECORD_SIZE, contact_keys, decode_frame, encode_frame, encode_message,
+                           store_frame)
+
+
+class TestTrafficCodec(TestCase):
+    def setUp(self):
+        harness.set_clock(harness.VirtualClock())
+        simulator = TrafficSimulator(30)
+        self.messages = [message for _ in range(30) for message in simulator.step(0.1)]
+
+    def test_round_trip(self):
+        contacts = decode_frame(encode_frame(self.messages))
+        self.assertEqual(len(contacts), len(self.messages))
+        for message, contact in zip(self.messages, contacts):
+            expected = read_response(json.dumps(message))
+            for key in ("Addr_type", "Alt", "BearingDist_valid", "Icao_addr", "OnGround", "Position_valid",
+                        "Squawk", "Tail", "Vvel"):
+                self.assertEqual(getattr(contact, key), getattr(expected, key), key)
+            for key in ("Distance", "DistanceEstimated"):
+                self.assertAlmostEqual(getattr(contact, key), getattr(expected, key), delta=0.01)
+            for key in ("Age", "AgeLastAlt"):
+                self.assertAlmostEqual(getattr(contact, key), getattr(expected, key), delta=0.051)
+        self.assertEqual(len(encode_message(self.messages[0])), RECORD_SIZE)
+
+    def test_stores_like_json(self):
+        situation = {"OwnAltitude": 3000, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 5}
+        from_json = ReportList({}, situation, capacity=64)
+        from_binary = ReportList({}, situation, capacity=64)
+        for message in self.messages:
+            from_json.store_report(read_response(json.dumps(message)))
+        self.assertEqual(store_frame(from_binary, encode_frame(self.messages)), len(self.messages))
+        self.assertEqual(sorted(from_json.reports), sorted(from_binary.reports))
+        for key, report in from_json.reports.items():
+            other = from_binary.reports[key]
+            self.assertEqual(report.identifier, other.identifier)
+            self.assertEqual(report.altitude, other.altitude)
+            self.assertAlmostEqual(report.get_distance_score(), other.get_distance_score(), places=3)
+
+    def test_limits(self):
+        message = make_traffic(Tail="LONGTAIL99", Vvel=99999, Age=-1)
+        contact = decode_frame(encode_frame([message]))[0]
+        self.assertEqual((contact.Tail, contact.Vvel, contact.Age), ("LONGTAIL", 0x7fff, 0))
+        self.assertEqual(sorted(contact._fields), sorted(contact_keys))
+        with self.assertRaises(ValueError):
+            encode_frame([message] * (MAX_RECORDS + 1))
+        frame = encode_frame([message, message])
+        with self.assertRaises(ValueError):
+            decode_frame(frame[:-1])
+        with self.assertRaises(ValueError):
+            decode_frame(b"\x09" + frame[1:])
@@ -0,0 +1,135 @@
+import socket
+import struct
+from unittest import TestCase
+
+import harness
+
+harness.install()
+
+import instrumentation
+import usocket
+from connection_manager import ConnectionManager
+from uwebsockets.client import WebsocketClient
+from uwebsockets.protocol import OP_PING, OP_PONG, OP_TEXT
+from wifiCfg import wlan_sta
+
+
+def read_frame(sock) -> (int, bytes):
+    """
+    Read a masked client frame on the server side
+    """
+    byte1, byte2 = sock.recv(2)
+    mask = sock.recv(4)
+    data = sock.recv(byte2 & 0x7f)
+    return byte1 & 0x0f, bytes(byte ^ mask[index % 4] for index, byte in enumerate(data))
+
+
+def write_frame(sock, opcode: int, data: bytes):
+    sock.sendall(struct.pack("!BB", 0x80 | opcode, len(data)) + data)
+
+
+class StubConnector:
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    def step(self):
+        return self.websocket
+
+
+class TestWebsocketLiveness(TestCase):
+    def setUp(self):
+        self.clock = harness.VirtualClock()
+        harness.set_clock(self.clock)
+        client, self.server = socket.socketpair()
+        self.server.settimeout(1)
+        self.websocket = WebsocketClient(usocket.socket(_sock=client))
+        self.websocket.settimeout(0.05)
+
+    def tearDown(self):
+        self.server.close()
+        instrumentation.enable(False)
+
+    def answer_ping(self, delay: float = 0.0):
+        opcode, data = read_frame(self.server)
+        self.assertEqual(opcode, OP_PING)
+        self.clock.advance(delay)
+        write_frame(self.server, OP_PONG, data)
+
+    def test_pong_round_trip(self):
+        rtts = []
+        self.websocket.set_keepalive(1000, 2)
+        self.websocket.on_pong = rtts.append
+        self.assertTrue(self.websocket.keepalive())
+        self.answer_ping(0.02)
+        with self.assertRaises(OSError):
+            # The pong is taken in, then the receive times out waiting for data
+            self.websocket.recv()
+        self.assertEqual(rtts, [20000])
+        self.assertFalse(self.websocket.awaiting_pong)
+        for _ in range(5):
+            self.clock.advance(1)
+            self.assertTrue(self.websocket.keepalive())
+            self.answer_ping()
+            with self.assertRaises(OSError):
+                self.websocket.recv()
+        self.assertEqual(self.websocket.missed_pongs, 0)
+
+    def test_missed_pongs(self):
+        self.websocket.set_keepalive(1000, 2)
+        self.assertTrue(self.websocket.keepalive())
+        self.clock.advance(0.5)
+        self.assertTrue(self.websocket.keepalive())
+        self.clock.advance(0.5)
+        self.assertTrue(self.websocket.keepalive())
+        self.assertEqual(self.websocket.missed_pongs, 1)
+        self.clock.advance(1)
+        self.assertFalse(self.websocket.keepalive())
+
+    def test_data_counts_as_alive(self):
+        self.websocket.set_keepalive(1000, 2)
+        self.websocket.keepalive()
+        self.clock.advance(1)
+        self.websocket.keepalive()
+        self.assertEqual(self.websocket.missed_pongs, 1)
+        write_frame(self.server, OP_TEXT, b"{}")
+        self.assertEqual(self.websocket.recv(), "{}")
+        self.assertEqual(self.websocket.missed_pongs, 0)
+
+    def test_stale_pong_ignored(self):
+        self.websocket.set_keepalive(1000, 3)
+        self.websocket.keepalive()
+        opcode, data = read_frame(self.server)
+        self.clock.advance(1)
+        self.websocket.keepalive()
+        write_frame(self.server, OP_PONG, data)
+        with self.assertRaises(OSError):
+            self.websocket.recv()
+        self.assertTrue(self.websocket.awaiting_pong)
+
+    def test_connection_manager(self):
+        instrumentation.enable()
+        manager = ConnectionManager(wlan_sta, "stratux", "", "ws://127.0.0.1/traffic", 30000, 0.05, 1000, 2)
+        manager.connector = StubConnector(self.websocket)
+        self.assertIs(manager.step(), self.websocket)
+        # Pinging starts on the pass after connecting
+        self.assertIs(manager.step(), self.websocket)
+        self.answer_ping(0.01)
+        with self.assertRaises(OSError):
+            self.websocket.recv()
+        self.assertEqual(manager.get_metrics()["rtt_ms"], 10)
+        self.assertEqual(instrumentation.timers["ping_rtt"].count, 1)
+        # Quiet but answering, stays up well past the error timeout
+        for _ in range(40):
+            self.clock.advance(1)
+            self.assertIs(manager.step(), self.websocket)
+            self.answer_ping()
+            with self.assertRaises(OSError):
+                self.websocket.recv()
+        # Gone silent, lost once two pings in a row went unanswered
+        for _ in range(2):
+            self.clock.advance(1)
+            self.assertIs(manager.step(), self.websocket)
+        self.clock.advance(1)
+        self.assertIsNone(manager.step())
+        self.assertFalse(manager.is_connected())
+        self.assertEqual(manager.dead_links, 1)
@@ -0,0 +1,177 @@
+"""
+Minimal asyncio websocket (RFC 6455) server and client for the host tools.
+
+Only what the Stratux endpoints use: unfragmented text and binary frames, ping/pong and close.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BYTES = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xa
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+def get_accept_key(key: bytes) -> bytes:
+    return base64.b64encode(hashlib.sha1(key.strip() + GUID).digest())
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """
+    :return: method, path and lower case headers of an HTTP request
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        raise ConnectionClosed()
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return method, path, headers
+
+
+def write_response(writer: asyncio.StreamWriter, body: bytes, status: str = "200 OK",
+                   content_type: str = "application/json"):
+    writer.write("HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+        status, content_type, len(body)).encode() + body)
+
+
+def encode_frame(opcode: int, data: bytes = b"", masked: bool = False) -> bytes:
+    """
+    :param masked: Frames from clients are masked
+    """
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if masked else 0
+    length = len(data)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < (1 << 16):
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if masked:
+        mask = os.urandom(4)
+        header += mask
+        data = bytes(byte ^ mask[index % 4] for index, byte in enumerate(data))
+    return bytes(header) + data
+
+
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, is_client: bool, path: str = ""):
+        self.reader = reader
+        self.writer = writer
+        self.is_client = is_client
+        self.path = path
+        self.open = True
+        self.pongs = 0
+
+    def write_frame(self, opcode: int, data: bytes = b""):
+        self.writer.write(encode_frame(opcode, data, self.is_client))
+
+    def write_encoded(self, frame: bytes):
+        """
+        Write a frame made by encode_frame(), servers can encode a broadcast once for every client
+        """
+        self.writer.write(frame)
+
+    async def send(self, data):
+        if not self.open:
+            raise ConnectionClosed()
+        if isinstance(data, str):
+            self.write_frame(OP_TEXT, data.encode("utf-8"))
+        else:
+            self.write_frame(OP_BYTES, data)
+        await self.writer.drain()
+
+    async def ping(self, data: bytes = b""):
+        self.write_frame(OP_PING, data)
+        await self.writer.drain()
+
+    async def read_frame(self):
+        try:
+            byte1, byte2 = await self.reader.readexactly(2)
+            length = byte2 & 0x7f
+            if length == 126:
+                length, = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if byte2 & 0x80 else None
+            data = await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.open = False
+            raise ConnectionClosed()
+        if mask:
+            data = bytes(byte ^ mask[index % 4] for index, byte in enumerate(data))
+        return byte1 & 0x0f, data
+
+    async def recv(self):
+        """
+        :return: str for text frames, bytes for binary frames. Pings are answered on the way.
+        """
+        while True:
+            opcode, data = await self.read_frame()
+            if opcode == OP_TEXT:
+                return data.decode("utf-8")
+            if opcode == OP_BYTES:
+                return data
+            if opcode == OP_PING:
+                self.write_frame(OP_PONG, data)
+                await self.writer.drain()
+            elif opcode == OP_PONG:
+                self.pongs += 1
+            elif opcode == OP_CLOSE:
+                self.close()
+                raise ConnectionClosed()
+
+    def close(self):
+        if self.open:
+            self.open = False
+            try:
+                self.write_frame(OP_CLOSE, struct.pack("!H", 1000))
+            except (ConnectionError, RuntimeError):
+                pass
+        self.writer.close()
+
+
+async def accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, headers: dict) -> Connection:
+    """
+    Complete the server side of the handshake for a request that asked for an upgrade
+    """
+    accept_key = get_accept_key(headers["sec-websocket-key"].encode())
+    writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Accept: " + accept_key + b"\r\n\r\n")
+    await writer.drain()
+    return Connection(reader, writer, is_client=False, path=path)
+
+
+async def connect(host: str, port: int, path: str) -> Connection:
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write("GET {} HTTP/1.1\r\nHost: {}:{}\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n"
+                 "Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n".format(
+                     path, host, port, key.decode()).encode())
+    await writer.drain()
+    status = await reader.readline()
+    if not status.startswith(b"HTTP/1.1 101"):
+        writer.close()
+        raise ConnectionClosed(status)
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    return Connection(reader, writer, is_client=True, path=path)
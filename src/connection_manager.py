@@ -0,0 +1,313 @@
+"""
+Non-blocking Wi-Fi join and websocket connection to the Stratux.
+
+Joining the network, the TCP connect and the websocket handshake are advanced a little on every pass of the main
+loop instead of blocking it, so the display and the buttons keep working and tracked contacts keep ageing on screen
+while the Stratux is away. Failed attempts are retried with exponential backoff and jitter.
+"""
+import ubinascii as binascii
+import uerrno as errno
+import urandom as random
+import uselect as select
+import usocket as socket
+import utime as time
+
+import instrumentation
+from uwebsockets.client import WebsocketClient
+from uwebsockets.protocol import urlparse
+
+CONNECT_TIMEOUT_MS = const(5000)
+WIFI_TIMEOUT_MS = const(15000)
+BACKOFF_INITIAL_MS = const(1000)
+BACKOFF_MAX_MS = const(30000)
+# Delays are spread by this fraction either way
+JITTER = 0.25
+MAX_HANDSHAKE_BYTES = const(1024)
+
+IDLE = const(0)
+CONNECTING = const(1)
+SENDING = const(2)
+READING = const(3)
+
+
+class Backoff:
+    def __init__(self, initial_ms: int = BACKOFF_INITIAL_MS, max_ms: int = BACKOFF_MAX_MS):
+        self.initial_ms = initial_ms
+        self.max_ms = max_ms
+        self.consecutive = 0
+        self.delay_ms = 0
+        self.last_failure = None
+
+    def ready(self) -> bool:
+        return self.last_failure is None or time.ticks_diff(time.ticks_ms(), self.last_failure) >= self.delay_ms
+
+    def failed(self):
+        self.consecutive += 1
+        delay_ms = min(self.initial_ms * 2 ** (self.consecutive - 1), self.max_ms)
+        self.delay_ms = int(delay_ms * (1 - JITTER + 2 * JITTER * random.getrandbits(16) / 65535))
+        self.last_failure = time.ticks_ms()
+
+    def reset(self):
+        self.consecutive = 0
+        self.delay_ms = 0
+        self.last_failure = None
+
+    def get_remaining(self) -> int:
+        """
+        :return: ms until the next attempt
+        """
+        if self.last_failure is None:
+            return 0
+        return max(self.delay_ms - time.ticks_diff(time.ticks_ms(), self.last_failure), 0)
+
+
+class WebsocketConnector:
+    """
+    Websocket client connection made in non-blocking steps
+    """
+
+    def __init__(self, uri: str, timeout_ms: int = CONNECT_TIMEOUT_MS):
+        self.uri = urlparse(uri)
+        self.timeout_ms = timeout_ms
+        self.state = IDLE
+        self.sock = None
+        self.poller = None
+        self.started = 0
+        self.request = b""
+        self.response = b""
+
+    def step(self):
+        """
+        Advance the connection attempt, starting one if none is in progress
+
+        :return: The connected websocket, None while the attempt is in progress
+        :raises OSError: The attempt failed, the next call starts a new one
+        """
+        try:
+            return self.advance()
+        except OSError:
+            self.abort()
+            raise
+
+    def advance(self):
+        if self.state == IDLE:
+            self.begin()
+        if time.ticks_diff(time.ticks_ms(), self.started) > self.timeout_ms:
+            raise OSError(errno.ETIMEDOUT)
+        if self.state == CONNECTING:
+            events = self.poller.poll(0)
+            if not events:
+                return None
+            flags = events[0][1]
+            if flags & (select.POLLERR | select.POLLHUP):
+                raise OSError(errno.ECONNREFUSED)
+            if not flags & select.POLLOUT:
+                return None
+            self.state = SENDING
+        if self.state == SENDING:
+            try:
+                sent = self.sock.send(self.request)
+            except OSError as e:
+                if e.args[0] == errno.EAGAIN:
+                    return None
+                raise
+            self.request = self.request[sent:]
+            if self.request:
+                return None
+            self.state = READING
+        # Read the response a byte at a time, so nothing after the headers is taken from the websocket
+        while not self.response.endswith(b"\r\n\r\n"):
+            try:
+                byte = self.sock.recv(1)
+            except OSError as e:
+                if e.args[0] == errno.EAGAIN:
+                    return None
+                raise
+            if not byte:
+                raise OSError(errno.ECONNRESET)
+            self.response += byte
+            if len(self.response) > MAX_HANDSHAKE_BYTES:
+                raise OSError(errno.EIO)
+        if not self.response.startswith(b"HTTP/1.1 101 "):
+            raise OSError(errno.ECONNREFUSED)
+        websocket = WebsocketClient(self.sock)
+        self.poller.unregister(self.sock)
+        self.sock = None
+        self.poller = None
+        self.state = IDLE
+        return websocket
+
+    def begin(self):
+        self.started = time.ticks_ms()
+        self.response = b""
+        address = socket.getaddrinfo(self.uri.hostname, self.uri.port)[0][-1]
+        self.sock = socket.socket()
+        self.sock.setblocking(False)
+        try:
+            self.sock.connect(address)
+        except OSError as e:
+            if e.args[0] not in (errno.EINPROGRESS, errno.EAGAIN):
+                raise
+        self.poller = select.poll()
+        self.poller.register(self.sock, select.POLLOUT)
+        # Sec-WebSocket-Key is 16 random bytes, base64 encoded
+        key = binascii.b2a_base64(bytes(random.getrandbits(8) for _ in range(16)))[:-1]
+        self.request = ("GET {} HTTP/1.1\r\nHost: {}:{}\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n"
+                        "Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n").format(
+            self.uri.path or "/", self.uri.hostname, self.uri.port, key.decode()).encode()
+        self.state = CONNECTING
+
+    def abort(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.poller = None
+        self.state = IDLE
+
+
+class WifiConnector:
+    def __init__(self, station, ssid: str, password: str, timeout_ms: int = WIFI_TIMEOUT_MS):
+        """
+        :param station: The station interface, wifiCfg.wlan_sta
+        """
+        self.station = station
+        self.ssid = ssid
+        self.password = password
+        self.timeout_ms = timeout_ms
+        self.backoff = Backoff()
+        self.joining_since = None
+        self.joins = 0
+
+    def step(self) -> bool:
+        """
+        :return: True while connected
+        """
+        if self.station.isconnected():
+            if self.joining_since is not None:
+                self.joining_since = None
+                self.backoff.reset()
+            return True
+        if self.joining_since is None:
+            if not self.backoff.ready():
+                return False
+            self.station.active(True)
+            self.station.connect(self.ssid, self.password)
+            self.joining_since = time.ticks_ms()
+            self.joins += 1
+        elif time.ticks_diff(time.ticks_ms(), self.joining_since) > self.timeout_ms:
+            self.joining_since = None
+            try:
+                self.station.disconnect()
+            except OSError:
+                pass
+            self.backoff.failed()
+        return False
+
+
+class ConnectionManager:
+    """
+    Keeps the station joined and the /traffic websocket open
+    """
+
+    def __init__(self, station, ssid: str, password: str, uri: str, error_timeout_ms: int, socket_timeout=None,
+                 ping_interval_ms: int = 0, max_missed_pongs: int = 3):
+        """
+        :param error_timeout_ms: Without pings, the websocket counts as lost after this long without a frame
+        :param socket_timeout: Receive timeout of the connected websocket in seconds
+        :param ping_interval_ms: Ping the Stratux this often, 0 falls back to the error timeout
+        :param max_missed_pongs: With pings, the websocket counts as lost after this many pings in a row go unanswered
+        """
+        self.wifi = WifiConnector(station, ssid, password)
+        self.connector = WebsocketConnector(uri)
+        self.backoff = Backoff()
+        self.error_timeout_ms = error_timeout_ms
+        self.socket_timeout = socket_timeout
+        self.ping_interval_ms = ping_interval_ms
+        self.max_missed_pongs = max_missed_pongs
+        self.rtt_us = None
+        self.dead_links = 0
+        self.websocket = None
+        self.last_frame = 0
+        self.connects = 0
+        self.failures = 0
+        self.status = ""
+
+    def is_connected(self) -> bool:
+        return self.websocket is not None
+
+    def step(self):
+        """
+        Call on every pass of the main loop
+
+        :return: The connected websocket, None while there is none
+        """
+        if not self.wifi.step():
+            if self.websocket is not None:
+                self.lost()
+            self.status = "Joining {}".format(self.wifi.ssid)
+            return None
+        if self.websocket is not None:
+            if self.ping_interval_ms:
+                # A quiet link stays up as long as the Stratux answers pings
+                if not self.websocket.keepalive():
+                    print("Stratux stopped answering pings")
+                    self.dead_links += 1
+                    instrumentation.count("link_dead")
+                    self.lost()
+            elif time.ticks_diff(time.ticks_ms(), self.last_frame) > self.error_timeout_ms:
+                self.lost()
+            return self.websocket
+        if not self.backoff.ready():
+            self.status = "Retry in {}s".format(self.backoff.get_remaining() // 1000 + 1)
+            return None
+        try:
+            websocket = self.connector.step()
+        except OSError as e:
+            print("Failed connecting to Stratux: {}".format(e))
+            self.failures += 1
+            instrumentation.count("connect_failed")
+            self.backoff.failed()
+            return None
+        if websocket is None:
+            self.status = "Connecting"
+            return None
+        websocket.settimeout(self.socket_timeout)
+        websocket.set_keepalive(self.ping_interval_ms, self.max_missed_pongs)
+        websocket.on_pong = self.pong
+        self.websocket = websocket
+        self.last_frame = time.ticks_ms()
+        self.connects += 1
+        self.backoff.reset()
+        self.status = "Stratux connected"
+        return websocket
+
+    def received(self):
+        """
+        Call for every frame received
+        """
+        self.last_frame = time.ticks_ms()
+
+    def pong(self, rtt_us: int):
+        self.rtt_us = rtt_us
+        instrumentation.record("ping_rtt", rtt_us)
+
+    def lost(self):
+        """
+        Close the websocket, a new one is connected after a backoff delay
+        """
+        if self.websocket is not None:
+            try:
+                self.websocket.close()
+            except Exception:
+                pass
+        self.websocket = None
+        self.backoff.failed()
+        self.status = "Stratux lost"
+
+    def get_metrics(self) -> dict:
+        return {"connected": self.is_connected(), "connects": self.connects, "failures": self.failures,
+                "wifi_joins": self.wifi.joins, "backoff": self.backoff.delay_ms, "dead_links": self.dead_links,
+                "rtt_ms": None if self.rtt_us is None else self.rtt_us // 1000}
@@ -0,0 +1,211 @@
+"""
+Altitude and estimated distance history of the tracked contacts, for the trend page.
+
+Each contact keeps one sample every SAMPLE_INTERVAL seconds at most. Samples are stored as differences to the
+previous sample in a bytearray, as zigzag varints: seconds since the previous sample, altitude in ALTITUDE_UNIT and
+DistanceEstimated in DISTANCE_UNIT. Consecutive samples rarely differ by more than 63 units, so a sample takes three
+bytes. Samples are thinned as they age, to the spacing given by TIERS, and dropped after HISTORY_TIME. The store never
+holds more than max_bytes of samples, the longest histories lose their oldest samples first.
+
+A contact followed for the full HISTORY_TIME keeps 24 samples of the last two minutes, 12 of the three minutes
+before and 5 of the rest, about 135 bytes or BYTES_PER_CONTACT_MINUTE per contact-minute. The object holding the
+samples of a contact comes on top of that.
+"""
+import utime as time
+
+SAMPLE_INTERVAL = const(5)
+HISTORY_TIME = const(600)
+# (age up to, seconds between samples)
+TIERS = ((120, 5), (300, 15), (600, 60))
+COMPACT_INTERVAL = const(30)
+ALTITUDE_UNIT = const(25)  # ft
+DISTANCE_UNIT = const(50)  # m
+MAX_BYTES = const(8192)
+BYTES_PER_CONTACT_MINUTE = const(14)
+
+
+def append_varint(buffer: bytearray, value: int):
+    # Zigzag, small negative numbers stay small
+    value = -2 * value - 1 if value < 0 else 2 * value
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(buffer, position: int) -> tuple:
+    """
+    :return: The value and the position after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), position
+
+
+def get_spacing(age: float) -> int:
+    """
+    :return: Seconds between samples of this age, 0 when they are too old to keep
+    """
+    for limit, spacing in TIERS:
+        if age <= limit:
+            return spacing
+    return 0
+
+
+class ContactHistory:
+    def __init__(self, sample_time: int, altitude: int, distance: int):
+        """
+        Altitude and distance in units
+        """
+        self.samples = bytearray()
+        self.first_time = sample_time
+        self.first_altitude = altitude
+        self.first_distance = distance
+        self.last_time = sample_time
+        self.last_altitude = altitude
+        self.last_distance = distance
+        self.count = 1
+        self.next_compact = sample_time + COMPACT_INTERVAL
+
+    def append(self, sample_time: int, altitude: int, distance: int):
+        append_varint(self.samples, sample_time - self.last_time)
+        append_varint(self.samples, altitude - self.last_altitude)
+        append_varint(self.samples, distance - self.last_distance)
+        self.last_time = sample_time
+        self.last_altitude = altitude
+        self.last_distance = distance
+        self.count += 1
+
+    def decode(self) -> list:
+        """
+        :return: (time, altitude, distance) in units, oldest first
+        """
+        sample_time = self.first_time
+        altitude = self.first_altitude
+        distance = self.first_distance
+        samples = [(sample_time, altitude, distance)]
+        position = 0
+        buffer = self.samples
+        while position < len(buffer):
+            delta, position = read_varint(buffer, position)
+            sample_time += delta
+            delta, position = read_varint(buffer, position)
+            altitude += delta
+            delta, position = read_varint(buffer, position)
+            distance += delta
+            samples.append((sample_time, altitude, distance))
+        return samples
+
+    def encode(self, samples: list):
+        """
+        Replace the history, samples oldest first and never empty
+        """
+        self.first_time, self.first_altitude, self.first_distance = samples[0]
+        self.last_time, self.last_altitude, self.last_distance = samples[0]
+        self.samples = bytearray()
+        self.count = 1
+        for sample in samples[1:]:
+            self.append(*sample)
+
+    def compact(self, now: int):
+        """
+        Thin the samples to one per interval of the spacing of their age, the newest of each. The intervals are
+        aligned to absolute time, so a sample that was kept stays kept until its age calls for a coarser spacing.
+        The newest sample is always kept.
+        """
+        self.next_compact = now + COMPACT_INTERVAL
+        samples = self.decode()
+        kept = [samples[-1]]
+        for sample in reversed(samples[:-1]):
+            spacing = get_spacing(now - sample[0])
+            if spacing == 0:
+                break
+            if sample[0] // spacing != kept[-1][0] // spacing:
+                kept.append(sample)
+        if len(kept) < len(samples):
+            kept.reverse()
+            self.encode(kept)
+
+    def drop_oldest(self, count: int):
+        samples = self.decode()
+        self.encode(samples[min(count, len(samples) - 1):])
+
+
+class ContactHistoryStore:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.histories = {}
+        self.bytes = 0
+        self.trimmed = 0
+
+    def record(self, key, altitude: float, distance: float):
+        """
+        Sample a contact, at most once every SAMPLE_INTERVAL seconds
+
+        :param altitude: ft
+        :param distance: DistanceEstimated, m
+        """
+        now = time.time()
+        history = self.histories.get(key)
+        if history is not None and now - history.last_time < SAMPLE_INTERVAL:
+            return
+        altitude = int(round(altitude / ALTITUDE_UNIT))
+        distance = int(round(distance / DISTANCE_UNIT))
+        if history is None:
+            self.histories[key] = ContactHistory(now, altitude, distance)
+            return
+        size = len(history.samples)
+        history.append(now, altitude, distance)
+        if now >= history.next_compact:
+            history.compact(now)
+        self.bytes += len(history.samples) - size
+        if self.bytes > self.max_bytes:
+            self.trim()
+
+    def trim(self):
+        """
+        Drop the oldest quarter of the longest history until the store fits
+        """
+        while self.bytes > self.max_bytes:
+            history = max(self.histories.values(), key=lambda h: len(h.samples))
+            size = len(history.samples)
+            if size == 0:
+                return
+            history.drop_oldest(max(history.count // 4, 1))
+            self.bytes += len(history.samples) - size
+            self.trimmed += 1
+
+    def forget(self, key):
+        history = self.histories.pop(key, None)
+        if history is not None:
+            self.bytes -= len(history.samples)
+
+    def get_revision(self, key):
+        """
+        :return: Changes when a sample of the contact is added, None without history
+        """
+        history = self.histories.get(key)
+        if history is None:
+            return None
+        return history.last_time, history.count
+
+    def get(self, key) -> list:
+        """
+        :return: (time, altitude in ft, DistanceEstimated in m) of the contact, oldest first
+        """
+        history = self.histories.get(key)
+        if history is None:
+            return []
+        return [(sample_time, altitude * ALTITUDE_UNIT, distance * DISTANCE_UNIT) for sample_time, altitude, distance
+                in history.decode()]
+
+    def get_metrics(self) -> dict:
+        return {"contacts": len(self.histories), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "trimmed": self.trimmed}
@@ -1,3 +1,4 @@
+import gc
 import json
 import utime as time
 
@@ -8,6 +9,14 @@ import math
 
 from clip_line import SCREEN_HEIGHT, SCREEN_WIDTH, clip_line, HEADER_OFFSET, FOOTER_OFFSET, extend_line, \
     centre_position_along_line
+from frame_scheduler import FrameScheduler
+from contact_history import HISTORY_TIME
+import instrumentation
+
+TARGET_FRAME_RATE = 0.25  # Frames per second
+FRAME_BUDGET_MS = const(30)
+# Hidden pages give up their widgets when less than this is free after switching pages
+RELEASE_FREE_BYTES = const(24000)
 
 
 class DisplayManager:
@@ -18,9 +27,13 @@ class DisplayManager:
     MESSAGE_PAGE = 4
     SETTINGS_PAGE = 5
     ALTITUDE_PROFILE_PAGE = 6
-    DISPLAY_TYPES = (AIRCRAFT_LIST, ALTITUDE_PROFILE_PAGE, NEAREST_PAGE, SETTINGS_PAGE)
+    DIAGNOSTICS_PAGE = 7
+    TREND_PAGE = 8
+    DISPLAY_TYPES = (AIRCRAFT_LIST, ALTITUDE_PROFILE_PAGE, TREND_PAGE, NEAREST_PAGE, SETTINGS_PAGE, DIAGNOSTICS_PAGE)
+    # Kept once built, so alerts do not rebuild their pages
+    PINNED_DISPLAYS = (NEAREST_PAGE, ALERT_PAGE)
 
-    def __init__(self, report_list: "ReportList", status_dictionary, situation_dictionary):
+    def __init__(self, report_list: "ReportList", status_dictionary, situation_dictionary, scheduler=None):
         self.status_dictionary = status_dictionary
         self.situation_dictionary = situation_dictionary
         lcd.clear()
@@ -35,7 +48,16 @@ class DisplayManager:
         self.active_display = None
         self.display_box = M5TextBox(130, 225, "SCREEN", lcd.FONT_Default, lcd.GREEN, rotate=0)
         self.alert_time = -1
-        self.__create_displays()
+        self.scheduler = scheduler or FrameScheduler(TARGET_FRAME_RATE, FRAME_BUDGET_MS)
+        self.rendering = False
+        instrumentation.register_histogram("render", self.scheduler.frame_histogram)
+        self.release_free_bytes = RELEASE_FREE_BYTES
+        self.created_displays = 0
+        self.released_displays = 0
+        # Optional GCPolicy, the Diagnostics page asks it for the largest free block
+        self.gc_policy = None
+        # Pages are built on first activation, the settings apply from the start
+        load_settings(get_settings(report_list))
 
     def update_connection_status(self, text):
         self.connection_status.setText(text)
@@ -43,14 +65,65 @@ class DisplayManager:
     def updated_gps_status(self, text):
         self.gps_status.setText(text)
 
-    def __create_displays(self):
-        self.display_list[self.AIRCRAFT_LIST] = ListDisplay(self.report_list, self)
-        # self.display_list[self.AIRCRAFT_DETAILS] = DetailDisplay(self.report_list, self)
-        self.display_list[self.NEAREST_PAGE] = NearestDisplay(self.report_list, self)
-        self.display_list[self.ALERT_PAGE] = AlertDisplay()
-        # self.display_list[self.MESSAGE_PAGE] = MessageDisplay(self)
-        self.display_list[self.SETTINGS_PAGE] = SettingsPage(self.report_list, self)
-        self.display_list[self.ALTITUDE_PROFILE_PAGE] = AltitudeProfilePage(self.report_list, self)
+    def __create_display(self, display_type: int) -> "Display":
+        if display_type == self.AIRCRAFT_LIST:
+            return ListDisplay(self.report_list, self)
+        # if display_type == self.AIRCRAFT_DETAILS:
+        #     return DetailDisplay(self.report_list, self)
+        if display_type == self.NEAREST_PAGE:
+            return NearestDisplay(self.report_list, self)
+        if display_type == self.ALERT_PAGE:
+            return AlertDisplay()
+        # if display_type == self.MESSAGE_PAGE:
+        #     return MessageDisplay(self)
+        if display_type == self.SETTINGS_PAGE:
+            return SettingsPage(self.report_list, self)
+        if display_type == self.ALTITUDE_PROFILE_PAGE:
+            return AltitudeProfilePage(self.report_list, self)
+        if display_type == self.DIAGNOSTICS_PAGE:
+            return DiagnosticsPage(self)
+        if display_type == self.TREND_PAGE:
+            return TrendPage(self.report_list, self)
+        raise KeyError(display_type)
+
+    def get_display(self, display_type: int) -> "Display":
+        """
+        :return: The page, built with its widgets the first time it is asked for
+        """
+        display = self.display_list.get(display_type)
+        if display is None:
+            start_ticks = instrumentation.start()
+            display = self.__create_display(display_type)
+            instrumentation.stop("display_create", start_ticks)
+            self.display_list[display_type] = display
+            self.created_displays += 1
+        return display
+
+    def release_idle_displays(self) -> int:
+        """
+        Drop the hidden pages, and their widgets, when less than release_free_bytes of heap is free.
+        They are built again when shown next.
+
+        :return: Number of pages released
+        """
+        if gc.mem_free() >= self.release_free_bytes:
+            return 0
+        released = 0
+        for display_type in list(self.display_list):
+            display = self.display_list[display_type]
+            if display is self.active_display or display_type in self.PINNED_DISPLAYS:
+                continue
+            del self.display_list[display_type]
+            released += 1
+        if released:
+            self.released_displays += released
+            instrumentation.count("display_released", released)
+            gc.collect()
+        return released
+
+    def get_metrics(self) -> dict:
+        return {"built": len(self.display_list), "created": self.created_displays,
+                "released": self.released_displays}
 
     def select_display(self, display_type: int):
         self.trigger_select_display = display_type
@@ -65,24 +138,33 @@ class DisplayManager:
             self.previous_display = self.selected_display
         if self.active_display:
             self.active_display.hide()
+        if self.rendering:
+            self.rendering = False
+            self.scheduler.abort_frame()
         self.selected_display = display_type
-        self.active_display = self.display_list[display_type]
+        self.active_display = self.get_display(display_type)
         # self.display_box.setText(self.display_list[self.DISPLAY_TYPES[self.__get_next_display_index()]].get_name())
         self.display_box.setText(self.active_display.get_name())
         print("Activating display '{}'".format(self.active_display.get_name()))
         self.active_display.show()
+        self.release_idle_displays()
 
     def display_message(self, message: str):
-        self.display_list[self.MESSAGE_PAGE].set_message(message)
+        self.get_display(self.MESSAGE_PAGE).set_message(message)
         self.select_display(self.MESSAGE_PAGE)
 
     def select_previous_display(self):
         self.select_display(self.previous_display)
 
     def update_display(self):
+        """
+        Start a new frame. The drawing itself happens in slices from render().
+        """
         self.trigger_update_display = False
         # Switch to nearest page and alert if there is danger will
         if self.report_list.is_danger():
+            if self.alert_time == -1 and self.report_list.latency is not None:
+                self.report_list.latency.alerted(self.report_list.get_nearest(), self.report_list.own_state_changed)
             self.select_display(self.NEAREST_PAGE)
             self.start_alarm()
         if self.alert_time > -1:
@@ -97,7 +179,28 @@ class DisplayManager:
                 self.cancel_alarm()
                 # self.select_display(self.NEAREST_PAGE)
         if self.active_display:
-            self.active_display.update_display()
+            self.scheduler.begin_frame()
+            self.active_display.begin_render()
+            self.rendering = True
+
+    def render(self):
+        """
+        Render slices of the current frame until it is complete or the frame budget is spent.
+        Call this on every pass of the main loop.
+        """
+        if not self.rendering:
+            return
+        self.scheduler.begin_pass()
+        while True:
+            self.scheduler.begin_slice()
+            done = self.active_display.render_slice()
+            self.scheduler.end_slice()
+            if done:
+                self.rendering = False
+                self.scheduler.end_frame()
+                return
+            if not self.scheduler.has_budget():
+                return
 
     def button_a_was_pressed(self):
         """
@@ -139,6 +242,21 @@ class Display:
     def get_name(self):
         return ""
 
+    def begin_render(self):
+        """
+        Prepare a new frame. Displays that render in chunks collect what they are going to draw here.
+        """
+        pass
+
+    def render_slice(self) -> bool:
+        """
+        Draw the next chunk of the frame.
+
+        :return: True when the frame is complete
+        """
+        self.update_display()
+        return True
+
     def show(self):
         pass
 
@@ -162,6 +280,14 @@ class AltitudeProfilePage(Display):
         self.x_range = 2  # minutes
         self.y_range = 2000  # feet
         self.cleared = False
+        # Keys, not records: a record released between slices may already track another contact
+        self.pending_keys = []
+        self.render_index = 0
+        self.start_altitude = 0
+        # Contact and own-ship state of the profile on screen, an unchanged state is not drawn again. Only set once a
+        # frame has drawn its last contact, the state of the frame being drawn is frame_key.
+        self.drawn_key = None
+        self.frame_key = None
         self.x_scale_box = M5TextBox(290, 5 + SCREEN_HEIGHT // 2, "", lcd.FONT_Default, 0xffffff)
         self.y_scale_box = M5TextBox(7, HEADER_OFFSET, "", lcd.FONT_Default, 0xffffff)
         self.zoom_out_box = M5TextBox(223, 225, "Out", lcd.FONT_Default, lcd.GREEN, rotate=0)
@@ -181,49 +307,81 @@ class AltitudeProfilePage(Display):
         return int(x_offset * SCREEN_WIDTH)
 
     def update_display(self):
-        reports = self.report_list.get_selected_reports()
+        self.begin_render()
+        while not self.render_slice():
+            pass
+
+    def begin_render(self):
+        if self.frame_key is not None:
+            # The previous frame was abandoned half-drawn
+            self.drawn_key = None
+        self.render_index = 0
+        key = (self.report_list.get_state_key(), self.x_range)
+        if key == self.drawn_key:
+            instrumentation.count("profile_cached")
+            self.pending_keys = []
+            self.frame_key = None
+            return
+        self.pending_keys = [report.key for report in self.report_list.get_selected_reports()]
+        self.start_altitude = self.manager.situation_dictionary["OwnAltitude"]
         if not self.cleared:
             self.redraw()
-        if len(reports) == 0:
-            return
-        start_altitude = self.manager.situation_dictionary["OwnAltitude"]
-        for report in reports:  # type: PositionReport
-            self.cleared = False
-            altitude_difference = report.altitude - start_altitude
-            y = self.scale_y(altitude_difference)
-            crossing_time = report.get_altitude_crossing_time()
-            x = self.scale_x(crossing_time)
-            if crossing_time == 99:
-                # Crossing too far into the future, gives a horizontal line
-                crossing_altitude = y
-            else:
-                crossing_altitude = SCREEN_HEIGHT // 2
-            if x >= 0:
-                # Crossing time is in the future
-                x0 = 0
-                y0 = y
-                x1 = x
-                y1 = crossing_altitude
-            else:
-                # Crossing time was in the past
-                x0 = x
-                y0 = crossing_altitude
-                x1 = 0
-                y1 = y
-            x1, y1 = extend_line(x0, y0, x1, y1)
-            x0, y0, x1, y1 = clip_line(x0, y0, x1, y1)
-
-            if x0 is None:
-                continue
-            distance_fraction = 1 - min(report.get_distance() / 20, 1)  # Fraction of 20 nautical miles
+        instrumentation.count("profile_drawn")
+        self.drawn_key = None
+        self.frame_key = key
 
-            colour_grade = int(distance_fraction * 240) + 16
-            colour = colour_grade * 256 * 256 + colour_grade * 256 + colour_grade
-            text_width = lcd.textWidth(str(report.identifier))
-            text_x, text_y = centre_position_along_line(x0, y0, x1, y1, text_width)
-            lcd.line(x0, y0, x1, y1, color=colour)
-            lcd.font(lcd.FONT_DefaultSmall)
-            lcd.print("{}".format(report.identifier), text_x, text_y, colour)
+    def render_slice(self) -> bool:
+        """
+        Draws the profile line of one report per slice
+        """
+        if self.render_index >= len(self.pending_keys):
+            self.pending_keys = []
+            if self.frame_key is not None:
+                self.drawn_key = self.frame_key
+                self.frame_key = None
+            return True
+        report = self.report_list.reports.get(self.pending_keys[self.render_index])  # type: LatestReport
+        self.render_index += 1
+        if report is None:
+            # Expired since the frame began
+            return False
+        self.cleared = False
+        altitude_difference = report.altitude - self.start_altitude
+        y = self.scale_y(altitude_difference)
+        crossing_time = report.get_altitude_crossing_time()
+        x = self.scale_x(crossing_time)
+        if crossing_time == 99:
+            # Crossing too far into the future, gives a horizontal line
+            crossing_altitude = y
+        else:
+            crossing_altitude = SCREEN_HEIGHT // 2
+        if x >= 0:
+            # Crossing time is in the future
+            x0 = 0
+            y0 = y
+            x1 = x
+            y1 = crossing_altitude
+        else:
+            # Crossing time was in the past
+            x0 = x
+            y0 = crossing_altitude
+            x1 = 0
+            y1 = y
+        x1, y1 = extend_line(x0, y0, x1, y1)
+        x0, y0, x1, y1 = clip_line(x0, y0, x1, y1)
+
+        if x0 is None:
+            return False
+        distance_fraction = 1 - min(report.get_distance() / 20, 1)  # Fraction of 20 nautical miles
+
+        colour_grade = int(distance_fraction * 240) + 16
+        colour = colour_grade * 256 * 256 + colour_grade * 256 + colour_grade
+        text_width = lcd.textWidth(str(report.identifier))
+        text_x, text_y = centre_position_along_line(x0, y0, x1, y1, text_width)
+        lcd.line(x0, y0, x1, y1, color=colour)
+        lcd.font(lcd.FONT_DefaultSmall)
+        lcd.print("{}".format(report.identifier), text_x, text_y, colour)
+        return False
 
     def update_scale_boxes(self):
         self.x_scale_box.setText("{}m".format(self.x_range))
@@ -232,6 +390,7 @@ class AltitudeProfilePage(Display):
     def clear(self):
         lcd.rect(0, HEADER_OFFSET, SCREEN_WIDTH, SCREEN_HEIGHT - FOOTER_OFFSET, lcd.BLACK, lcd.BLACK)
         self.cleared = True
+        self.drawn_key = None
 
     def redraw(self):
         self.clear()
@@ -276,6 +435,185 @@ class AltitudeProfilePage(Display):
         self.update_zoom()
 
 
+class TrendPage(Display):
+    """
+    Altitude relative to our own (top) and estimated distance (bottom) of one contact over the last HISTORY_TIME
+    seconds, from the contact history of the report list. Follows the nearest contact until the left button picks
+    the next one in the ranking, the right button goes back to the nearest.
+    """
+    ALTITUDE_TOP = HEADER_OFFSET + 15
+    SPLIT = SCREEN_HEIGHT // 2 + 5
+    DISTANCE_BOTTOM = SCREEN_HEIGHT - FOOTER_OFFSET - 2
+
+    def __init__(self, report_list, manager):
+        self.report_list = report_list
+        self.manager = manager
+        # None follows the nearest contact
+        self.selected_key = None
+        self.samples = []
+        self.drawn_key = None
+        self.render_index = 0
+        self.title_box = M5TextBox(0, HEADER_OFFSET, "", lcd.FONT_Default, lcd.MAGENTA, rotate=0)
+        self.altitude_box = M5TextBox(230, HEADER_OFFSET, "", lcd.FONT_Default, 0xffffff, rotate=0)
+        self.distance_box = M5TextBox(230, self.SPLIT + 2, "", lcd.FONT_Default, 0xffffff, rotate=0)
+        self.next_box = M5TextBox(50, 225, "Next", lcd.FONT_Default, lcd.GREEN, rotate=0)
+        self.nearest_box = M5TextBox(223, 225, "Nearest", lcd.FONT_Default, lcd.GREEN, rotate=0)
+        self.hide()
+
+    def get_name(self):
+        return "Trend"
+
+    def show(self):
+        self.drawn_key = None
+        for box in (self.title_box, self.altitude_box, self.distance_box, self.next_box, self.nearest_box):
+            box.show()
+
+    def hide(self):
+        for box in (self.title_box, self.altitude_box, self.distance_box, self.next_box, self.nearest_box):
+            box.hide()
+        self.clear()
+
+    def clear(self):
+        lcd.rect(0, self.ALTITUDE_TOP, SCREEN_WIDTH, self.DISTANCE_BOTTOM - self.ALTITUDE_TOP + 1, lcd.BLACK,
+                 lcd.BLACK)
+
+    def get_report(self):
+        if self.selected_key is not None:
+            report = self.report_list.reports.get(self.selected_key)
+            if report is not None:
+                return report
+            self.selected_key = None
+        return self.report_list.get_nearest()
+
+    def update_display(self):
+        self.begin_render()
+        while not self.render_slice():
+            pass
+
+    def begin_render(self):
+        self.render_index = 0
+        report = self.get_report()
+        history = self.report_list.history
+        if history is None or report is None:
+            self.samples = []
+            key = (history is None, None)
+        else:
+            # The plot also slides along while the contact is not heard
+            key = (report.key, history.get_revision(report.key),
+                   self.manager.situation_dictionary["OwnAltitude"], time.time() // 30)
+        if key == self.drawn_key:
+            instrumentation.count("trend_cached")
+            self.render_index = 3
+            return
+        self.drawn_key = key
+        if history is None:
+            self.title_box.setText("History off")
+        elif report is None:
+            self.title_box.setText("No traffic")
+        else:
+            # Copied out of the history, the slices do not touch the record
+            self.samples = history.get(report.key)
+            self.title_box.setText("{}{}".format(report.identifier, "" if self.selected_key else " (nearest)"))
+
+    def scale_x(self, sample_time: int, now: int) -> int:
+        return int((SCREEN_WIDTH - 1) * (1 - (now - sample_time) / HISTORY_TIME))
+
+    def draw_line(self, points: list, colour):
+        for index in range(1, len(points)):
+            x0, y0 = points[index - 1]
+            x1, y1 = points[index]
+            if x1 >= 0:
+                lcd.line(max(x0, 0), y0, x1, y1, color=colour)
+
+    def render_slice(self) -> bool:
+        """
+        Axes in the first slice, the altitude trend in the second and the distance trend in the third
+        """
+        if self.render_index == 0:
+            self.clear()
+            middle = (self.ALTITUDE_TOP + self.SPLIT) // 2
+            lcd.line(0, middle, SCREEN_WIDTH, middle, lcd.WHITE)
+            lcd.line(0, self.SPLIT, SCREEN_WIDTH, self.SPLIT, lcd.WHITE)
+            lcd.line(0, self.DISTANCE_BOTTOM, SCREEN_WIDTH, self.DISTANCE_BOTTOM, lcd.WHITE)
+            for minute in range(0, HISTORY_TIME // 60 + 1, 2):
+                x = self.scale_x(-60 * minute, 0)
+                lcd.line(x, self.DISTANCE_BOTTOM - 3, x, self.DISTANCE_BOTTOM, lcd.WHITE)
+            self.altitude_box.setText("")
+            self.distance_box.setText("")
+        elif self.render_index == 1 and self.samples:
+            now = time.time()
+            own_altitude = self.manager.situation_dictionary["OwnAltitude"]
+            differences = [altitude - own_altitude for sample_time, altitude, distance in self.samples]
+            # Whole 500 ft steps, at least 500 ft either side
+            altitude_range = max(500, int(math.ceil(max(math.fabs(d) for d in differences) / 500)) * 500)
+            middle = (self.ALTITUDE_TOP + self.SPLIT) // 2
+            half_height = (self.SPLIT - self.ALTITUDE_TOP) // 2 - 1
+            self.draw_line([(self.scale_x(sample[0], now), int(middle - d * half_height / altitude_range))
+                            for sample, d in zip(self.samples, differences)], lcd.YELLOW)
+            self.altitude_box.setText("+-{}ft".format(altitude_range))
+        elif self.render_index == 2 and self.samples:
+            now = time.time()
+            distances = [distance / 1852 for sample_time, altitude, distance in self.samples]
+            distance_range = max(1, int(math.ceil(max(distances))))
+            height = self.DISTANCE_BOTTOM - self.SPLIT - 2
+            self.draw_line([(self.scale_x(sample[0], now), int(self.DISTANCE_BOTTOM - d * height / distance_range))
+                            for sample, d in zip(self.samples, distances)], lcd.GREEN)
+            self.distance_box.setText("{}nm".format(distance_range))
+        self.render_index += 1
+        return self.render_index > 2
+
+    def button_a_was_pressed(self):
+        ranking = self.report_list.get_list_sorted_score()
+        if not ranking:
+            return
+        report = self.get_report()
+        index = ranking.index(report) + 1 if report in ranking else 0
+        self.selected_key = ranking[index % len(ranking)].key
+        self.manager.trigger_update_display = True
+
+    def button_c_was_pressed(self):
+        self.selected_key = None
+        self.manager.trigger_update_display = True
+
+
+def get_settings(report_list) -> list:
+    """
+    :return: (name, setter, getter) of every setting on the settings page
+    """
+    return [
+        ("Include valid:", report_list.toggle_include_valid_positions, report_list.get_include_valid_positions),
+        ("Hide ground:", report_list.toggle_hide_ground, report_list.get_hide_ground)
+    ]
+
+
+def store_settings(settings: list):
+    print("Storing settings")
+    data = {}
+    for item in settings:
+        name, setter, getter = item
+        data[name] = getter()
+    with open("settings.json", "w") as o:
+        json.dump(data, o)
+
+
+def load_settings(settings: list):
+    print("Loading settings")
+    try:
+        with open("settings.json", "r") as o:
+            data = json.load(o)
+    except:
+        print("Failed loading file 'settings.json'")
+        return
+    for item in settings:
+        name, setter, getter = item
+        print("Checking setting {}".format(name))
+        try:
+            print("Setting {} to {}".format(name, data[name]))
+            setter(data[name])
+        except KeyError:
+            print("Setting failed")
+
+
 class SettingsPage(Display):
     ROW_SPACING = 25
 
@@ -283,16 +621,14 @@ class SettingsPage(Display):
         self.current_setting = -1
         self.report_list = report_list
         self.manager = manager
-        self.setting_boxes = [
-            (M5TextBox(0, 0 * self.ROW_SPACING + HEADER_OFFSET, "[ ]", lcd.FONT_Default, 0xffffff),
-             M5TextBox(30, 0 * self.ROW_SPACING + HEADER_OFFSET, "", lcd.FONT_Default, 0xffffff),
-             M5TextBox(223, 0 * self.ROW_SPACING + HEADER_OFFSET, "", lcd.FONT_Default, lcd.GREEN))
-        ]
-        self.settings = [
-            ("Include valid:", self.report_list.toggle_include_valid_positions,
-             self.report_list.get_include_valid_positions)
-        ]
-        self.load_settings()
+        # Loaded by the display manager at startup, before this page is first shown
+        self.settings = get_settings(report_list)
+        self.setting_boxes = []
+        for index in range(len(self.settings)):
+            self.setting_boxes.append(
+                (M5TextBox(0, index * self.ROW_SPACING + HEADER_OFFSET, "[ ]", lcd.FONT_Default, 0xffffff),
+                 M5TextBox(30, index * self.ROW_SPACING + HEADER_OFFSET, "", lcd.FONT_Default, 0xffffff),
+                 M5TextBox(223, index * self.ROW_SPACING + HEADER_OFFSET, "", lcd.FONT_Default, lcd.GREEN)))
         for index in range(len(self.setting_boxes)):
             self.setting_boxes[index][1].setText(self.settings[index][0])
             self.setting_boxes[index][2].setText("{}".format(self.settings[index][2]()))
@@ -322,7 +658,7 @@ class SettingsPage(Display):
             item[1].hide()
             item[2].hide()
         if store and self.toggled:
-            self.store_settings()
+            store_settings(self.settings)
 
     def button_a_was_pressed(self):
         self.current_setting += 1
@@ -337,32 +673,6 @@ class SettingsPage(Display):
         self.settings[self.current_setting][1]()
         self.setting_boxes[self.current_setting][2].setText("{}".format(self.settings[self.current_setting][2]()))
 
-    def store_settings(self):
-        print("Storing settings")
-        data = {}
-        for item in self.settings:
-            name, setter, getter = item
-            data[name] = getter()
-        with open("settings.json", "w") as o:
-            json.dump(data, o)
-
-    def load_settings(self):
-        print("Loading settings")
-        try:
-            with open("settings.json", "r") as o:
-                data = json.load(o)
-        except:
-            print("Failed loading file 'settings.json'")
-            return
-        for item in self.settings:
-            name, setter, getter = item
-            print("Checking setting {}".format(name))
-            try:
-                print("Setting {} to {}".format(name, data[name]))
-                setter(data[name])
-            except KeyError:
-                print("Setting failed")
-
 
 class AlertDisplay(Display):
     def __init__(self):
@@ -386,7 +696,6 @@ class NearestDisplay(Display):
     def __init__(self, reports: "ReportList", manager):
         self.reports_list = reports
         self.manager = manager
-        self.reports = []
         self.report = None
         self.visible = False
         self.font = lcd.FONT_DejaVu40
@@ -453,12 +762,11 @@ class NearestDisplay(Display):
         self.crossing_time.show()
 
     def update_display(self):
-        self.reports = self.reports_list.get_list_sorted_score()
-        if len(self.reports) == 0:
+        self.report = self.reports_list.get_nearest()
+        if self.report is None:
             self.hide()
             return
         self.show()
-        self.report = self.reports[0]
         self.identifier.setText("{: ^10}".format(self.report.identifier))
         if self.report.is_good_distance():
             self.distance.setText("{:>.0f}nm".format(self.report.get_distance()))
@@ -469,6 +777,8 @@ class NearestDisplay(Display):
         self.altitude_difference.setText(
             "{:.0f}".format(self.report.altitude - self.manager.situation_dictionary["OwnAltitude"]))
         self.crossing_time.setText("c{:.1f}m".format(self.report.get_altitude_crossing_time()))
+        if self.reports_list.latency is not None:
+            self.reports_list.latency.rendered(self.report)
 
     def button_a_was_pressed(self):
         if self.alerting:
@@ -486,7 +796,8 @@ class ListDisplay(Display):
     def __init__(self, reports: "ReportList", manager):
         self.manager = manager
         self.reports_list = reports
-        self.reports = []
+        # Keys of the rows of the frame being drawn, the records are looked up per slice
+        self.keys = []
         self.number_of_rows = 4
         self.font = lcd.FONT_DejaVu24
         self.background_colour = 0xFFFFFF
@@ -496,6 +807,7 @@ class ListDisplay(Display):
         self.number_of_pages = 0
         self.current_page = 0
         self.previous_report_list = []
+        self.render_index = 0
         for index in range(self.number_of_rows):
             self.rows.append((
                 M5TextBox(0, index * self.ROW_SPACING + HEADER_OFFSET, "", self.font, lcd.MAGENTA,
@@ -544,29 +856,131 @@ class ListDisplay(Display):
         self.rows[index][3].setText("c{:.1f}m".format(report.get_altitude_crossing_time()))
         self.rows[index][4].setText("s{:.1f}".format(report.get_distance_score()))
         self.rows[index][5].setText("{:>3.0f}s".format(report.get_age()))
+        if self.reports_list.latency is not None:
+            self.reports_list.latency.rendered(report)
 
     def clear_row(self, index: int):
         for box in range(6):
             self.rows[index][box].setText("")
 
     def update_display(self):
-        new_report_list = self.reports_list.get_list_sorted_score()
-        self.page_box.setText(
-            "{}/{}".format(self.current_page + 1, int(math.ceil(len(new_report_list) / self.number_of_rows))))
-        first_report_index = max(
-            min(self.current_page * self.number_of_rows, len(new_report_list) - self.number_of_rows), 0)
-        last_report_index = min(first_report_index + self.number_of_rows, len(new_report_list))
-        row_index = -1
-        for index in range(first_report_index, last_report_index):
-            print(index)
-            row_index = index - first_report_index
-            self.display_report(new_report_list[index], row_index)
-        for index in range(row_index + 1, self.number_of_rows):
+        self.begin_render()
+        while not self.render_slice():
+            pass
+
+    def begin_render(self):
+        # Only the contacts on the current page are ranked
+        self.keys = [report.key for report in self.reports_list.get_ranked_page(self.current_page,
+                                                                                self.number_of_rows)]
+        self.number_of_pages = int(math.ceil(len(self.reports_list.reports) / self.number_of_rows))
+        self.page_box.setText("{}/{}".format(self.current_page + 1, self.number_of_pages))
+        self.render_index = 0
+
+    def render_slice(self) -> bool:
+        """
+        Draws one row per slice, the unused rows are cleared in the final slice
+        """
+        if self.render_index < len(self.keys):
+            report = self.reports_list.reports.get(self.keys[self.render_index])
+            if report is None:
+                # Expired since the frame began
+                self.clear_row(self.render_index)
+            else:
+                self.display_report(report, self.render_index)
+            self.render_index += 1
+            return False
+        for index in range(len(self.keys), self.number_of_rows):
             self.clear_row(index)
-        self.reports = new_report_list
+        return True
 
     def button_a_was_pressed(self):
         self.current_page += 1
         if self.current_page >= self.number_of_pages:
             self.current_page = 0
         self.manager.trigger_update_display = True
+
+
+class DiagnosticsPage(Display):
+    """
+    Rates, p50/p99 latencies and heap statistics from the instrumentation module, and the p50/p95/max staleness of
+    the contacts on screen from the latency tracker. Left button toggles instrumentation, right button resets the
+    counters. Opening the page, toggling or resetting measures the largest free block again.
+    """
+    ROW_SPACING = 13
+    NUMBER_OF_ROWS = 15
+    TIMERS = ("parse", "store", "rank", "expire", "http", "render", "gc")
+    LATENCIES = ("render", "source", "alert")
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.rows = []
+        for index in range(self.NUMBER_OF_ROWS):
+            self.rows.append(M5TextBox(0, index * self.ROW_SPACING + HEADER_OFFSET + 5, "", lcd.FONT_Default,
+                                       0xffffff, rotate=0))
+        self.toggle_box = M5TextBox(50, 225, "ON/OFF", lcd.FONT_Default, lcd.GREEN, rotate=0)
+        self.reset_box = M5TextBox(223, 225, "RESET", lcd.FONT_Default, lcd.GREEN, rotate=0)
+        self.hide()
+
+    def get_name(self):
+        return "Diagnostics"
+
+    def show(self):
+        self.toggle_box.show()
+        self.reset_box.show()
+        for row in self.rows:
+            row.show()
+        self.request_probe()
+
+    def request_probe(self):
+        if self.manager.gc_policy is not None:
+            self.manager.gc_policy.request_probe()
+
+    def hide(self):
+        self.toggle_box.hide()
+        self.reset_box.hide()
+        for row in self.rows:
+            row.hide()
+
+    def get_lines(self):
+        if not instrumentation.enabled:
+            return ["Instrumentation off"] + self.get_latency_lines()
+        snapshot = instrumentation.snapshot()
+        lines = ["{:<8}{:>7} {:>7} {:>7}".format("", "/s", "p50us", "p99us")]
+        for name in self.TIMERS:
+            count, p50, p99, maximum = snapshot["us"].get(name, (0, 0, 0, 0))
+            lines.append("{:<8}{:>7.1f} {:>7} {:>7}".format(name, snapshot["rates"].get(name, 0), p50, p99))
+        heap = snapshot["heap"]
+        lines.append("heap free {} alloc {}".format(heap["free"], heap["alloc"]))
+        lines.append("largest block {} frag {}%".format(snapshot["gauges"].get("heap_largest", "-"),
+                                                        snapshot["gauges"].get("heap_fragmentation", "-")))
+        hits = snapshot["hits"]
+        lines.append("hits upd {}% rank {}% prof {}%".format(hits["update"], hits["rank"], hits["profile"]))
+        return lines + self.get_latency_lines()
+
+    def get_latency_lines(self):
+        latency = self.manager.report_list.latency
+        if latency is None:
+            return []
+        metrics = latency.get_metrics()
+        lines = ["{:<8}{:>7} {:>7} {:>7}".format("lag", "p50ms", "p95ms", "maxms")]
+        for name in self.LATENCIES:
+            lines.append("{:<8}{:>7} {:>7} {:>7}".format(name, metrics[name]["p50"], metrics[name]["p95"],
+                                                        metrics[name]["max"]))
+        return lines
+
+    def update_display(self):
+        lines = self.get_lines()
+        for index in range(self.NUMBER_OF_ROWS):
+            self.rows[index].setText(lines[index] if index < len(lines) else "")
+
+    def button_a_was_pressed(self):
+        instrumentation.enable(not instrumentation.enabled)
+        self.request_probe()
+        self.manager.trigger_update_display = True
+
+    def button_c_was_pressed(self):
+        instrumentation.reset()
+        if self.manager.report_list.latency is not None:
+            self.manager.report_list.latency.reset()
+        self.request_probe()
+        self.manager.trigger_update_display = True
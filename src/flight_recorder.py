@@ -0,0 +1,152 @@
+"""
+Flight recorder for raw traffic frames and own-ship samples.
+
+Records are appended to a page sized RAM buffer and written to a ring file on flash one page at a time, from
+service() in an idle slot of the main loop, so recording never waits for flash on the ingest path.
+
+File layout: the file is a ring of PAGE_SIZE pages. Every page starts with a page header
+    magic (4s) | sequence (I) | session start, seconds since epoch (I) | bytes used including header (H)
+followed by records that never span pages
+    type (B) | payload length (H) | milliseconds since session start (I) | payload
+The page with the highest sequence number is the newest, host/flight_log.py reads the pages back in order.
+
+With the ingest thread, traffic is recorded on the worker thread while the UI thread records own-ship samples and
+writes pages, so the page state is kept under a lock. Writing a completed page happens outside it, record() never
+touches a page waiting to be written. Only sync() writes the current page, and holds the lock while it does.
+"""
+import _thread
+import ustruct as struct
+import utime as time
+
+RECORD_TRAFFIC = const(1)
+RECORD_SITUATION = const(2)
+RECORD_STATUS = const(3)
+# Binary /traffic frames, see traffic_codec.py
+RECORD_TRAFFIC_BINARY = const(4)
+
+PAGE_SIZE = const(4096)
+PAGE_MAGIC = b"M5FR"
+PAGE_HEADER = "<4sIIH"
+PAGE_HEADER_SIZE = const(14)
+RECORD_HEADER = "<BHI"
+RECORD_HEADER_SIZE = const(7)
+DEFAULT_PAGES = const(64)
+
+
+class FlightRecorder:
+    def __init__(self, file_name: str, pages: int = DEFAULT_PAGES):
+        self.file_name = file_name
+        self.pages = pages
+        # Double buffering, one page is filled while the other waits for service() to write it
+        self.buffers = (bytearray(PAGE_SIZE), bytearray(PAGE_SIZE))
+        self.lock = _thread.allocate_lock()
+        self.active = 0
+        self.pending = -1
+        self.pending_sequence = 0
+        self.used = PAGE_HEADER_SIZE
+        self.session_start = time.time()
+        self.session_ticks = time.ticks_ms()
+        self.records = 0
+        self.dropped = 0
+        self.pages_written = 0
+        self.file = self.open_ring()
+        self.sequence = self.find_last_sequence() + 1
+
+    def open_ring(self):
+        size = self.pages * PAGE_SIZE
+        try:
+            ring = open(self.file_name, "r+b")
+            ring.seek(0, 2)
+            if ring.tell() == size:
+                return ring
+            ring.close()
+        except OSError:
+            pass
+        # Create the whole ring up front so later writes never grow the file
+        ring = open(self.file_name, "w+b")
+        blank = bytearray(PAGE_SIZE)
+        for _ in range(self.pages):
+            ring.write(blank)
+        ring.flush()
+        return ring
+
+    def find_last_sequence(self) -> int:
+        last_sequence = 0
+        for page in range(self.pages):
+            self.file.seek(page * PAGE_SIZE)
+            header = self.file.read(PAGE_HEADER_SIZE)
+            if len(header) == PAGE_HEADER_SIZE:
+                magic, sequence, session, used = struct.unpack(PAGE_HEADER, header)
+                if magic == PAGE_MAGIC and sequence > last_sequence:
+                    last_sequence = sequence
+        return last_sequence
+
+    def record(self, record_type: int, payload):
+        """
+        Append a record to the current page. Only copies into RAM.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        length = len(payload)
+        with self.lock:
+            if self.used + RECORD_HEADER_SIZE + length > PAGE_SIZE:
+                if PAGE_HEADER_SIZE + RECORD_HEADER_SIZE + length > PAGE_SIZE or self.pending >= 0:
+                    # Too large for any page, or the flash write of the previous page has not happened yet
+                    self.dropped += 1
+                    return
+                self.finish_page()
+            buffer = self.buffers[self.active]
+            timestamp = time.ticks_diff(time.ticks_ms(), self.session_ticks) & 0xFFFFFFFF
+            struct.pack_into(RECORD_HEADER, buffer, self.used, record_type, length, timestamp)
+            start = self.used + RECORD_HEADER_SIZE
+            buffer[start:start + length] = payload
+            self.used = start + length
+            self.records += 1
+
+    def finish_page(self):
+        struct.pack_into(PAGE_HEADER, self.buffers[self.active], 0, PAGE_MAGIC, self.sequence, self.session_start,
+                         self.used)
+        self.pending = self.active
+        self.pending_sequence = self.sequence
+        self.sequence += 1
+        self.active = 1 - self.active
+        self.used = PAGE_HEADER_SIZE
+
+    def write_page(self, buffer, sequence: int):
+        self.file.seek((sequence % self.pages) * PAGE_SIZE)
+        self.file.write(buffer)
+        self.file.flush()
+        self.pages_written += 1
+
+    def service(self) -> bool:
+        """
+        Write a completed page to flash. Call from an idle slot in the main loop.
+
+        :return: True if a page was written
+        """
+        with self.lock:
+            pending = self.pending
+            sequence = self.pending_sequence
+        if pending < 0:
+            return False
+        self.write_page(self.buffers[pending], sequence)
+        with self.lock:
+            self.pending = -1
+        return True
+
+    def sync(self):
+        """
+        Write the partially filled current page as well, it is written again under the same sequence number once
+        it fills up
+        """
+        self.service()
+        with self.lock:
+            if self.used == PAGE_HEADER_SIZE:
+                return
+            buffer = self.buffers[self.active]
+            struct.pack_into(PAGE_HEADER, buffer, 0, PAGE_MAGIC, self.sequence, self.session_start, self.used)
+            self.write_page(buffer, self.sequence)
+
+    def close(self):
+        self.sync()
+        self.file.close()
@@ -0,0 +1,79 @@
+import utime as time
+
+from histogram import Histogram
+
+
+class FrameScheduler:
+    """
+    Decides when a new frame is due and how long rendering may run before yielding back to the main loop.
+
+    A frame is rendered in slices (for example one list row per slice). Each call to DisplayManager.render() is a
+    pass that runs slices until the frame is done or the per-pass budget is spent, so a slow page never blocks
+    websocket ingest for more than roughly one budget.
+    """
+
+    def __init__(self, target_fps: float, frame_budget_ms: int):
+        self.frame_interval_ms = int(1000 / target_fps)
+        self.frame_budget_us = frame_budget_ms * 1000
+        # Render time actually spent drawing each frame, summed over all passes
+        self.frame_histogram = Histogram()
+        # Wall clock time from the start of a frame until its last slice, including ingest in between passes
+        self.frame_span_histogram = Histogram()
+        self.slice_histogram = Histogram()
+        self.frames = 0
+        self.aborted_frames = 0
+        self.split_frames = 0
+        self.in_frame = False
+        self.last_frame_start = time.ticks_ms() - self.frame_interval_ms
+        self.frame_start_us = 0
+        self.frame_render_us = 0
+        self.frame_passes = 0
+        self.pass_start_us = 0
+        self.slice_start_us = 0
+
+    def frame_due(self) -> bool:
+        return time.ticks_diff(time.ticks_ms(), self.last_frame_start) >= self.frame_interval_ms
+
+    def begin_frame(self):
+        if self.in_frame:
+            self.aborted_frames += 1
+        self.in_frame = True
+        self.last_frame_start = time.ticks_ms()
+        self.frame_start_us = time.ticks_us()
+        self.frame_render_us = 0
+        self.frame_passes = 0
+
+    def begin_pass(self):
+        self.pass_start_us = time.ticks_us()
+        self.frame_passes += 1
+
+    def has_budget(self) -> bool:
+        return time.ticks_diff(time.ticks_us(), self.pass_start_us) < self.frame_budget_us
+
+    def begin_slice(self):
+        self.slice_start_us = time.ticks_us()
+
+    def end_slice(self):
+        elapsed = time.ticks_diff(time.ticks_us(), self.slice_start_us)
+        self.slice_histogram.record(elapsed)
+        self.frame_render_us += elapsed
+
+    def end_frame(self):
+        if not self.in_frame:
+            return
+        self.in_frame = False
+        self.frames += 1
+        if self.frame_passes > 1:
+            self.split_frames += 1
+        self.frame_histogram.record(self.frame_render_us)
+        self.frame_span_histogram.record(time.ticks_diff(time.ticks_us(), self.frame_start_us))
+
+    def abort_frame(self):
+        if self.in_frame:
+            self.in_frame = False
+            self.aborted_frames += 1
+
+    def get_metrics(self) -> dict:
+        return {"frames": self.frames, "split": self.split_frames, "aborted": self.aborted_frames,
+                "render_us": self.frame_histogram.summary(), "span_us": self.frame_span_histogram.summary(),
+                "slice_us": self.slice_histogram.summary()}
@@ -0,0 +1,167 @@
+"""
+Garbage collection on the main loop's terms.
+
+The automatic collection threshold is raised so the allocator rarely collects on its own in the middle of ingest or
+an alert, and idle() collects explicitly in the idle slot after a frame has been rendered. Free heap is sampled over
+time. Finding the largest free block takes trial allocations, and a failed one collects, so it is only measured on
+request, from the Diagnostics page, in the next idle slot.
+"""
+import gc
+import utime as time
+from array import array
+
+import instrumentation
+from histogram import Histogram
+
+COLLECT_AFTER_BYTES = const(16384)
+AUTOMATIC_THRESHOLD_BYTES = const(49152)
+MAX_COLLECT_INTERVAL_MS = const(5000)
+SAMPLE_INTERVAL_MS = const(30000)
+PROBE_RESOLUTION = const(256)
+MAX_PROBE_TRIALS = const(8)
+HISTORY_LENGTH = const(32)
+
+
+class GCPolicy:
+    def __init__(self, collect_after_bytes: int = COLLECT_AFTER_BYTES,
+                 automatic_threshold_bytes: int = AUTOMATIC_THRESHOLD_BYTES,
+                 max_collect_interval_ms: int = MAX_COLLECT_INTERVAL_MS, sample_interval_ms: int = SAMPLE_INTERVAL_MS):
+        """
+        :param collect_after_bytes: Collect in the idle slot once this much has been allocated since the last
+        collection
+        :param automatic_threshold_bytes: Allocation amount that triggers a collection by the allocator itself, the
+        safety net when the loop does not get idle time
+        :param max_collect_interval_ms: Collect in the idle slot at least this often
+        :param sample_interval_ms: How often to sample the free heap
+        """
+        self.collect_after_bytes = collect_after_bytes
+        self.automatic_threshold_bytes = automatic_threshold_bytes
+        self.max_collect_interval_ms = max_collect_interval_ms
+        self.sample_interval_ms = sample_interval_ms
+        self.pause_histogram = Histogram()
+        self.collections = 0
+        self.free_history = array("L", [0] * HISTORY_LENGTH)
+        self.largest_history = array("L", [0] * HISTORY_LENGTH)
+        self.history_index = 0
+        self.free = 0
+        # 0 until the first probe
+        self.largest_free_block = 0
+        self.probe_requested = False
+        self.allocated_after_collect = 0
+        self.last_collect = time.ticks_ms()
+        self.last_sample = time.ticks_ms()
+        instrumentation.register_histogram("gc", self.pause_histogram)
+
+    def setup(self):
+        gc.threshold(self.automatic_threshold_bytes)
+        self.collect()
+        self.sample()
+
+    def collect(self):
+        start_ticks = time.ticks_us()
+        gc.collect()
+        self.pause_histogram.record(time.ticks_diff(time.ticks_us(), start_ticks))
+        self.collections += 1
+        self.last_collect = time.ticks_ms()
+        self.allocated_after_collect = gc.mem_alloc()
+        self.free = gc.mem_free()
+
+    def idle(self):
+        """
+        Call from the idle slot of the main loop, after rendering
+        """
+        now = time.ticks_ms()
+        if gc.mem_alloc() - self.allocated_after_collect > self.collect_after_bytes or \
+                time.ticks_diff(now, self.last_collect) > self.max_collect_interval_ms:
+            self.collect()
+        if self.probe_requested:
+            self.probe()
+        elif time.ticks_diff(now, self.last_sample) > self.sample_interval_ms:
+            self.sample()
+
+    def request_probe(self):
+        """
+        Measure the largest free block in the next idle slot
+        """
+        self.probe_requested = True
+
+    def try_allocate(self, size: int) -> bool:
+        try:
+            block = bytearray(size)
+            del block
+            return True
+        except MemoryError:
+            return False
+
+    def find_largest_free_block(self) -> int:
+        """
+        Binary search for the largest buffer that can be allocated, each try is freed straight away. The search
+        starts from the last result and stops after MAX_PROBE_TRIALS allocations.
+        """
+        low = 0
+        high = gc.mem_free()
+        trials = 0
+        last = self.largest_free_block
+        if 0 < last < high:
+            # Usually unchanged, which the bracket around the last result confirms in two trials
+            trials += 1
+            if not self.try_allocate(last):
+                high = last
+            else:
+                low = last
+                if last + PROBE_RESOLUTION < high:
+                    trials += 1
+                    if self.try_allocate(last + PROBE_RESOLUTION):
+                        low = last + PROBE_RESOLUTION
+                    else:
+                        high = last + PROBE_RESOLUTION
+        while high - low > PROBE_RESOLUTION and trials < MAX_PROBE_TRIALS:
+            size = (low + high) // 2
+            trials += 1
+            if self.try_allocate(size):
+                low = size
+            else:
+                high = size
+        return low
+
+    def probe(self):
+        self.probe_requested = False
+        self.largest_free_block = self.find_largest_free_block()
+        # The probe leaves nothing behind, but collect so the next probe starts from the same state
+        self.collect()
+        self.sample()
+        instrumentation.gauge("heap_largest", self.largest_free_block)
+        instrumentation.gauge("heap_fragmentation", self.get_fragmentation())
+
+    def sample(self):
+        """
+        Record the free heap with the largest free block last probed
+        """
+        self.last_sample = time.ticks_ms()
+        self.free = gc.mem_free()
+        self.free_history[self.history_index] = self.free
+        self.largest_history[self.history_index] = self.largest_free_block
+        self.history_index = (self.history_index + 1) % HISTORY_LENGTH
+
+    def get_fragmentation(self) -> int:
+        """
+        :return: Percentage of the free heap that is not part of the largest free block, 0 before the first probe
+        """
+        if self.free == 0 or self.largest_free_block == 0:
+            return 0
+        return max(0, 100 - 100 * self.largest_free_block // self.free)
+
+    def get_history(self) -> list:
+        """
+        :return: (free, largest free block) samples, oldest first
+        """
+        samples = []
+        for offset in range(HISTORY_LENGTH):
+            index = (self.history_index + offset) % HISTORY_LENGTH
+            if self.free_history[index]:
+                samples.append((self.free_history[index], self.largest_history[index]))
+        return samples
+
+    def get_metrics(self) -> dict:
+        return {"collections": self.collections, "pause_us": self.pause_histogram.summary(), "free": self.free,
+                "largest": self.largest_free_block, "fragmentation": self.get_fragmentation()}
@@ -0,0 +1,60 @@
+"""
+Fixed-bucket histograms for timing measurements.
+
+The buckets are allocated once, so recording a sample from the main loop never allocates.
+Percentiles are reported as the upper bound of the bucket that contains them.
+"""
+
+# Microsecond bucket bounds, roughly 1-2-5 steps from 100 us to 1 s
+TIME_BOUNDS_US = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+
+
+class Histogram:
+    def __init__(self, bounds=TIME_BOUNDS_US):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def record(self, value):
+        bounds = self.bounds
+        index = 0
+        number_of_bounds = len(bounds)
+        while index < number_of_bounds and value > bounds[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, fraction: float):
+        """
+        :param fraction: 0.5 for the median, 0.99 for p99
+        :return: Upper bound of the bucket holding the percentile, the maximum for the overflow bucket
+        """
+        if self.count == 0:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for index in range(len(self.bounds)):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.bounds[index], self.maximum)
+        return self.maximum
+
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0
+        return self.total / self.count
+
+    def reset(self):
+        for index in range(len(self.buckets)):
+            self.buckets[index] = 0
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def summary(self) -> dict:
+        return {"n": self.count, "p50": self.percentile(0.5), "p99": self.percentile(0.99), "max": self.maximum}
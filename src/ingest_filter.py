@@ -0,0 +1,168 @@
+"""
+Ingest-time filtering of /traffic frames.
+
+Frames are checked on the raw JSON text before read_response, so ground targets, contacts far outside the altitude
+band or beyond the maximum distance, and contacts excluded by the position policy never cost a full parse or a
+contact record. Only the few fields the filter needs are looked up with find(), whitespace around the colon is
+allowed. A frame with one of them missing or malformed is let through and left to the full parse. The altitude band
+is only applied while the GPS has a fix, before that our own altitude is a guess. The identity of a rejected frame is
+read the same way, so ReportList can release a tracked contact once its frames are rejected.
+"""
+import instrumentation
+
+METRES_PER_NM = 1852
+
+REJECT_GROUND = "ground"
+REJECT_ALTITUDE = "altitude"
+REJECT_DISTANCE = "distance"
+REJECT_POSITION = "position"
+
+FIELDS = ("OnGround", "Alt", "Distance", "DistanceEstimated", "Position_valid", "BearingDist_valid", "Tail", "Squawk",
+          "Icao_addr")
+
+
+class Tokens:
+    """
+    Search strings for one frame type, str from the websocket or bytes from a recording
+    """
+
+    def __init__(self, encode):
+        self.fields = {}
+        for name in FIELDS:
+            self.fields[name] = encode('"{}"'.format(name))
+        self.colon = encode(":")
+        self.comma = encode(",")
+        self.brace = encode("}")
+        self.true = encode("t")
+
+
+TEXT_TOKENS = Tokens(lambda text: text)
+BYTES_TOKENS = Tokens(lambda text: text.encode())
+
+
+def get_raw_value(response, name, tokens: Tokens = TEXT_TOKENS):
+    """
+    :param response: Compact JSON object
+    :param name: Field name
+    :return: The unparsed value of the field, None if it is missing
+    """
+    needle = tokens.fields[name]
+    start = response.find(needle)
+    if start < 0:
+        return None
+    start = response.find(tokens.colon, start + len(needle))
+    if start < 0:
+        return None
+    start += 1
+    end = response.find(tokens.comma, start)
+    if end < 0:
+        end = response.find(tokens.brace, start)
+        if end < 0:
+            # Truncated frame
+            end = len(response)
+    return response[start:end].strip()
+
+
+def get_number(response, name, tokens: Tokens = TEXT_TOKENS):
+    """
+    :return: The value of a numeric field, None if it is missing or not a number, such as null or a truncated frame
+    """
+    value = get_raw_value(response, name, tokens)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def get_identity(response):
+    """
+    :param response: Raw /traffic frame, str or bytes
+    :return: Tail, Squawk and Icao_addr as read_response gives them, None if one is missing or malformed
+    """
+    tokens = BYTES_TOKENS if isinstance(response, bytes) else TEXT_TOKENS
+    tail = get_raw_value(response, "Tail", tokens)
+    squawk = get_raw_value(response, "Squawk", tokens)
+    icao_addr = get_raw_value(response, "Icao_addr", tokens)
+    if tail is None or squawk is None or icao_addr is None:
+        return None
+    if isinstance(tail, bytes):
+        tail = tail.decode()
+    try:
+        return tail.strip('"'), int(squawk), int(icao_addr)
+    except ValueError:
+        return None
+
+
+class IngestFilter:
+    def __init__(self, situation_dictionary: dict, reject_on_ground: bool = False, altitude_band: float = 0,
+                 max_distance: float = 0, include_valid_positions: bool = True):
+        """
+        :param reject_on_ground: Drop contacts reporting OnGround
+        :param altitude_band: Drop contacts more than this many feet above or below us, 0 disables. Not applied
+            without a GPS fix.
+        :param max_distance: Drop contacts further away than this many nautical miles, 0 disables
+        :param include_valid_positions: Keep contacts with a valid position, the Include valid setting
+        """
+        self.situation_dictionary = situation_dictionary
+        self.reject_on_ground = reject_on_ground
+        self.altitude_band = altitude_band
+        self.max_distance = max_distance
+        self.include_valid_positions = include_valid_positions
+        self.passed = 0
+        self.rejected = {REJECT_GROUND: 0, REJECT_ALTITUDE: 0, REJECT_DISTANCE: 0, REJECT_POSITION: 0}
+
+    def is_enabled(self) -> bool:
+        return self.reject_on_ground or self.altitude_band > 0 or self.max_distance > 0 or \
+               not self.include_valid_positions
+
+    def accepts(self, response) -> bool:
+        """
+        Check a raw /traffic frame before it is parsed
+
+        :return: False if the frame should be dropped
+        """
+        if not self.is_enabled():
+            self.passed += 1
+            return True
+        reason = self.get_reject_reason(response, BYTES_TOKENS if isinstance(response, bytes) else TEXT_TOKENS)
+        if reason is None:
+            self.passed += 1
+            return True
+        self.rejected[reason] += 1
+        instrumentation.count("rejected_" + reason)
+        return False
+
+    def get_reject_reason(self, response, tokens: Tokens):
+        """
+        :return: One of the REJECT_ reasons, None if the frame passes
+        """
+        on_ground = get_raw_value(response, "OnGround", tokens)
+        if self.reject_on_ground and on_ground is not None and on_ground.startswith(tokens.true):
+            return REJECT_GROUND
+        position_valid = get_raw_value(response, "Position_valid", tokens)
+        position_valid = position_valid is not None and position_valid.startswith(tokens.true)
+        if not self.include_valid_positions and position_valid:
+            return REJECT_POSITION
+        if self.altitude_band > 0 and self.situation_dictionary.get("GPSHorizontalAccuracy", 999999) < 999:
+            altitude = get_number(response, "Alt", tokens)
+            # An unknown altitude is treated as our own altitude by the report list, never drop it
+            if altitude and abs(altitude - self.situation_dictionary.get("OwnAltitude", 0)) > self.altitude_band:
+                return REJECT_ALTITUDE
+        if self.max_distance > 0:
+            bearing_valid = get_raw_value(response, "BearingDist_valid", tokens)
+            if position_valid and bearing_valid is not None and bearing_valid.startswith(tokens.true) and \
+                    self.situation_dictionary.get("GPSHorizontalAccuracy", 999999) < 999:
+                distance = get_number(response, "Distance", tokens)
+            else:
+                distance = get_number(response, "DistanceEstimated", tokens)
+            # No distance estimate at all says nothing about the distance
+            if distance is not None and distance > self.max_distance * METRES_PER_NM:
+                return REJECT_DISTANCE
+        return None
+
+    def get_metrics(self) -> dict:
+        metrics = {"passed": self.passed}
+        metrics.update(self.rejected)
+        return metrics
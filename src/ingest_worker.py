@@ -0,0 +1,219 @@
+"""
+Optional websocket receive and parsing on a separate thread.
+
+The worker thread receives /traffic frames, parses them with read_response and pushes the resulting Message tuples
+into a RingQueue. The UI loop drains the queue into the ReportList between frames, so receive and parsing no longer
+wait for SPI drawing and the other way round. A frame the ingest filter rejects is queued as a Rejected with only the
+contact identity, the UI loop releases the contact if it is tracked.
+"""
+import _thread
+import utime as time
+
+import instrumentation
+from flight_recorder import RECORD_TRAFFIC, RECORD_TRAFFIC_BINARY
+from ingest_filter import get_identity
+from report import read_response
+from traffic_codec import decode_frame
+
+RECEIVE_TIMEOUT = 1
+RECONNECT_DELAY = const(2)
+
+
+class RingQueue:
+    """
+    Fixed size single-producer/single-consumer queue. Only the producer writes tail and only the consumer writes head,
+    so neither side needs a lock. One slot stays empty to tell a full queue from an empty one. Each item carries a
+    stamp, kept in a parallel list so queueing does not allocate a tuple per item.
+    """
+
+    def __init__(self, capacity: int):
+        self.size = capacity + 1
+        self.slots = [None] * self.size
+        self.stamps = [None] * self.size
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        # Stamp of the item last returned by get()
+        self.stamp = None
+
+    def put(self, item, stamp=None) -> bool:
+        """
+        Producer side. Drops the item when the queue is full.
+        """
+        next_tail = (self.tail + 1) % self.size
+        if next_tail == self.head:
+            self.dropped += 1
+            return False
+        self.slots[self.tail] = item
+        self.stamps[self.tail] = stamp
+        # Publish the slot only after it has been written
+        self.tail = next_tail
+        return True
+
+    def get(self):
+        """
+        Consumer side.
+
+        :return: The oldest item, None when the queue is empty
+        """
+        if self.head == self.tail:
+            return None
+        item = self.slots[self.head]
+        self.slots[self.head] = None
+        self.stamp = self.stamps[self.head]
+        self.head = (self.head + 1) % self.size
+        return item
+
+    def __len__(self):
+        return (self.tail - self.head) % self.size
+
+
+class Rejected:
+    """
+    A frame rejected by the ingest filter, see ReportList.release_rejected
+    """
+
+    def __init__(self, identity):
+        self.identity = identity
+
+
+class IngestWorker:
+    def __init__(self, connect, queue: RingQueue, error_timeout: int, recorder=None, ingest_filter=None,
+                 ping_interval_ms: int = 0, max_missed_pongs: int = 3, on_pong=None):
+        """
+        :param connect: Returns a connected websocket, called on the worker thread
+        :param queue: Parsed messages for the UI loop
+        :param error_timeout: Without pings, reconnect after this many seconds without a frame
+        :param recorder: Optional FlightRecorder for the raw frames
+        :param ingest_filter: Optional IngestFilter, rejected frames are not parsed
+        :param ping_interval_ms: Ping the Stratux this often, 0 falls back to the error timeout
+        :param max_missed_pongs: With pings, reconnect after this many pings in a row go unanswered
+        :param on_pong: Called with the round trip time in microseconds of every answered ping, on the worker thread
+        """
+        self.connect = connect
+        self.queue = queue
+        self.error_timeout = error_timeout
+        self.recorder = recorder
+        self.ingest_filter = ingest_filter
+        self.ping_interval_ms = ping_interval_ms
+        self.max_missed_pongs = max_missed_pongs
+        self.on_pong = on_pong
+        self.running = False
+        self.frames = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.last_frame = time.time()
+
+    def start(self):
+        self.running = True
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        self.running = False
+
+    def receive(self, websocket):
+        try:
+            resp = websocket.recv()
+        except OSError:
+            # Receive timeout, nothing arrived
+            return
+        if not resp:
+            return
+        self.last_frame = time.time()
+        received = time.ticks_ms()
+        if isinstance(resp, bytes):
+            self.receive_binary(resp, received)
+            return
+        if self.recorder:
+            self.recorder.record(RECORD_TRAFFIC, resp)
+        try:
+            if self.ingest_filter and not self.ingest_filter.accepts(resp):
+                # The report list belongs to the UI loop, it releases the contact if it is tracked
+                identity = get_identity(resp)
+                if identity is not None:
+                    self.queue.put(Rejected(identity), received)
+                return
+            message = read_response(resp)
+        except Exception:
+            # A bad frame is counted, the websocket itself is fine
+            self.errors += 1
+            return
+        self.frames += 1
+        self.queue.put(message, received)
+
+    def receive_binary(self, frame, received: int):
+        """
+        Records from a relay, see traffic_codec.py
+        """
+        if self.recorder:
+            self.recorder.record(RECORD_TRAFFIC_BINARY, frame)
+        try:
+            contacts = decode_frame(frame)
+        except ValueError:
+            self.errors += 1
+            return
+        for contact in contacts:
+            self.frames += 1
+            self.queue.put(contact, received)
+
+    def run(self):
+        websocket = None
+        while self.running:
+            if websocket is None:
+                try:
+                    websocket = self.connect()
+                    websocket.settimeout(RECEIVE_TIMEOUT)
+                    if self.ping_interval_ms:
+                        websocket.set_keepalive(self.ping_interval_ms, self.max_missed_pongs)
+                    websocket.on_pong = self.on_pong
+                    self.last_frame = time.time()
+                except Exception as e:
+                    print("Ingest worker failed connecting: {}".format(e))
+                    time.sleep(RECONNECT_DELAY)
+                    continue
+            try:
+                self.receive(websocket)
+            except Exception as e:
+                print("Ingest worker lost the websocket: {}".format(e))
+                self.last_frame = 0
+            if self.ping_interval_ms:
+                # last_frame is cleared by a receive error
+                alive = self.last_frame and websocket.keepalive()
+            else:
+                alive = time.time() - self.last_frame <= self.error_timeout
+            if not alive:
+                self.reconnects += 1
+                try:
+                    websocket.close()
+                except Exception:
+                    pass
+                websocket = None
+        if websocket is not None:
+            try:
+                websocket.close()
+            except Exception:
+                pass
+
+    def drain(self, reports_list, max_items: int = 32) -> int:
+        """
+        Store queued messages and release rejected contacts, called from the UI loop
+
+        :return: Number of queue items handled
+        """
+        stored = 0
+        while stored < max_items:
+            message = self.queue.get()
+            if message is None:
+                break
+            if isinstance(message, Rejected):
+                reports_list.release_rejected(message.identity)
+                stored += 1
+                continue
+            start_ticks = instrumentation.start()
+            try:
+                reports_list.store_report(message, self.queue.stamp)
+            except Exception as e:
+                print(e)
+            instrumentation.stop("store", start_ticks)
+            stored += 1
+        return stored
@@ -0,0 +1,121 @@
+"""
+Lightweight counters and microsecond timers for the hot paths.
+
+Usage:
+    start_ticks = instrumentation.start()
+    ...
+    instrumentation.stop("parse", start_ticks)
+
+Instrumentation is off unless enable() is called. When it is off, start() returns without reading the clock and
+count() and stop() return after a single flag check, so the calls can stay in the main loop.
+"""
+import gc
+import json
+import utime as time
+
+from histogram import Histogram
+
+# Lines on the serial console starting with this prefix carry a snapshot as compact JSON
+DUMP_PREFIX = "DIAG "
+
+enabled = False
+counters = {}
+timers = {}
+gauges = {}
+_reset_ticks = time.ticks_ms()
+
+
+def enable(value=True):
+    global enabled
+    enabled = value
+    reset()
+
+
+def count(name, amount=1):
+    if not enabled:
+        return
+    counters[name] = counters.get(name, 0) + amount
+
+
+def gauge(name, value):
+    if not enabled:
+        return
+    gauges[name] = value
+
+
+def start() -> int:
+    if not enabled:
+        return 0
+    return time.ticks_us()
+
+
+def stop(name, start_ticks: int):
+    if not enabled:
+        return
+    record(name, time.ticks_diff(time.ticks_us(), start_ticks))
+
+
+def record(name, value_us: int):
+    """
+    Add a duration measured elsewhere to a timer
+    """
+    if not enabled:
+        return
+    histogram = timers.get(name)
+    if histogram is None:
+        histogram = Histogram()
+        timers[name] = histogram
+    histogram.record(value_us)
+
+
+def register_histogram(name, histogram: Histogram):
+    """
+    Include a histogram owned by another component in the snapshots
+    """
+    timers[name] = histogram
+
+
+def reset():
+    global _reset_ticks
+    _reset_ticks = time.ticks_ms()
+    counters.clear()
+    gauges.clear()
+    for histogram in timers.values():
+        histogram.reset()
+
+
+def get_elapsed() -> float:
+    return max(time.ticks_diff(time.ticks_ms(), _reset_ticks), 1) / 1000
+
+
+def get_hit_rate(hits: int, misses: int) -> int:
+    """
+    :return: Percentage of hits
+    """
+    if hits + misses == 0:
+        return 0
+    return 100 * hits // (hits + misses)
+
+
+def snapshot() -> dict:
+    """
+    :return: Counts and rates per second since the last reset, timer percentiles in microseconds and heap stats
+    """
+    elapsed = get_elapsed()
+    rates = {}
+    for name, value in counters.items():
+        rates[name] = round(value / elapsed, 2)
+    latencies = {}
+    for name, histogram in timers.items():
+        rates[name] = round(histogram.count / elapsed, 2)
+        latencies[name] = (histogram.count, histogram.percentile(0.5), histogram.percentile(0.99), histogram.maximum)
+    # Unchanged contacts only touched, rankings served from the cache and profile redraws skipped
+    hits = {"update": get_hit_rate(counters.get("update_touch", 0), counters.get("update_full", 0)),
+            "rank": get_hit_rate(counters.get("rank_cached", 0), latencies.get("rank", (0,))[0]),
+            "profile": get_hit_rate(counters.get("profile_cached", 0), counters.get("profile_drawn", 0))}
+    return {"t": round(elapsed, 1), "counts": counters, "rates": rates, "us": latencies, "gauges": gauges,
+            "hits": hits, "heap": {"free": gc.mem_free(), "alloc": gc.mem_alloc()}}
+
+
+def dump():
+    print(DUMP_PREFIX + json.dumps(snapshot()))
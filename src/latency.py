@@ -0,0 +1,98 @@
+"""
+How stale the contacts on screen are.
+
+Every contact record is stamped with the ticks_ms of the frame it came in, taken right after websocket.recv() or,
+with the ingest thread, when the worker received it. The stamp travels with the record through store_report. When a
+list row or the nearest view draws the contact, the time since the stamp is recorded once per received frame:
+    render  receive to render
+    source  the Stratux Age of the contact on top of that, how old the data on screen is since it was last heard
+    alert   receive of the frame that last changed the nearest contact, or of the situation update that last changed
+            our own altitude, vertical speed or fix if that came later, to the start of the alert
+The Timestamp of a message is the Stratux's own clock, which the device clock is not synced to, so the Age field is
+used instead. Histograms have fixed millisecond buckets, percentiles are bucket bounds.
+"""
+import utime as time
+
+from histogram import Histogram
+
+# Millisecond bucket bounds
+LATENCY_BOUNDS_MS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000)
+# A frame interval of the display and the rendering after it
+RENDER_BUDGET_MS = const(5000)
+ALERT_BUDGET_MS = const(5000)
+
+
+class LatencyTracker:
+    def __init__(self, render_budget_ms: int = RENDER_BUDGET_MS, alert_budget_ms: int = ALERT_BUDGET_MS):
+        """
+        :param render_budget_ms: Limit of the p95 receive to render latency
+        :param alert_budget_ms: Limit of the longest receive to alert latency
+        """
+        self.render_budget_ms = render_budget_ms
+        self.alert_budget_ms = alert_budget_ms
+        self.render = Histogram(LATENCY_BOUNDS_MS)
+        self.source = Histogram(LATENCY_BOUNDS_MS)
+        self.alert = Histogram(LATENCY_BOUNDS_MS)
+
+    def received(self, report: "LatestReport", received_ticks, changed: bool):
+        """
+        Stamp a contact that was just stored
+
+        :param received_ticks: ticks_ms of the frame, None for now
+        :param changed: The frame changed the contact rather than only refreshing its age
+        """
+        if received_ticks is None:
+            received_ticks = time.ticks_ms()
+        report.received = received_ticks
+        report.render_pending = True
+        if changed:
+            report.changed = received_ticks
+
+    def rendered(self, report: "LatestReport"):
+        """
+        The contact was drawn, only the first draw after a frame counts
+        """
+        if not report.render_pending:
+            return
+        report.render_pending = False
+        latency = time.ticks_diff(time.ticks_ms(), report.received)
+        self.render.record(latency)
+        self.source.record(latency + int(report.age * 1000))
+
+    def alerted(self, report: "LatestReport", own_state_changed: int):
+        """
+        An alert started for this contact. Either its own update or ours may have made it dangerous, the later one
+        did.
+
+        :param own_state_changed: ticks_ms of the situation update behind the last change of our own state
+        """
+        cause = report.changed
+        if time.ticks_diff(own_state_changed, cause) > 0:
+            cause = own_state_changed
+        self.alert.record(time.ticks_diff(time.ticks_ms(), cause))
+
+    def get_over_budget(self) -> list:
+        """
+        :return: Names of the latencies over their budget
+        """
+        over = []
+        if self.render.percentile(0.95) > self.render_budget_ms:
+            over.append("render")
+        if self.alert.maximum > self.alert_budget_ms:
+            over.append("alert")
+        return over
+
+    def reset(self):
+        self.render.reset()
+        self.source.reset()
+        self.alert.reset()
+
+    def get_metrics(self) -> dict:
+        """
+        :return: Count, p50, p95 and maximum in milliseconds per latency, and which are over budget
+        """
+        metrics = {"over": self.get_over_budget()}
+        for name, histogram in (("render", self.render), ("source", self.source), ("alert", self.alert)):
+            metrics[name] = {"n": histogram.count, "p50": histogram.percentile(0.5),
+                             "p95": histogram.percentile(0.95), "max": histogram.maximum}
+        return metrics
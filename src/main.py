@@ -6,6 +6,19 @@ import uwebsockets.client
 import gc
 import utime as time
 
+import instrumentation
+from profiler import Profiler
+from gc_policy import GCPolicy
+from ingest_worker import IngestWorker, RingQueue
+from flight_recorder import FlightRecorder, RECORD_TRAFFIC, RECORD_TRAFFIC_BINARY, RECORD_SITUATION, RECORD_STATUS
+from poll_scheduler import *
+from situation_stream import SituationStream
+from connection_manager import ConnectionManager, WebsocketConnector
+from traffic_codec import store_frame
+from contact_history import ContactHistoryStore
+from latency import LatencyTracker
+from power_manager import PowerManager, IDLE_WAIT_MS, WAKE_DATA
+
 from display_manager import *
 from report import *
 
@@ -14,49 +27,73 @@ STRATUX_SSID = "stratux"
 INITIAL_ALT = 700
 
 key_map = {}
+gps_status = ""
 status_dictionary = {}
-situation_dictionary = {}
+# Until the first situation arrives, the contacts are scored against the initial altitude without a GPS fix
+situation_dictionary = {"OwnAltitude": INITIAL_ALT, "OwnVerticalVelocity": 0, "GPSHorizontalAccuracy": 99999}
 
 SCREEN_UPDATE_TIME = const(4)
 WEBSOCKET_ERROR_TIMEOUT = const(30)
+# The Stratux is pinged this often and counts as lost after this many pings in a row go unanswered
+PING_INTERVAL = const(1000)
+MISSED_PONGS = const(2)
 SOCKET_TIMEOUT = 0.1
+REPORT_CAPACITY = const(64)
+# Traffic dropped before parsing, distances in nm and altitudes in ft relative to our own, 0 disables
+FILTER_ON_GROUND = True
+FILTER_ALTITUDE_BAND = const(10000)
+FILTER_MAX_DISTANCE = const(0)
+# Receive and parse traffic on a second thread, the UI loop only stores and draws
+INGEST_THREAD = False
+INGEST_QUEUE_SIZE = const(32)
+INGEST_IDLE_MS = const(10)
+# Take our own state from the /situation websocket, /getSituation is polled while it is not available
+SITUATION_STREAM = True
+INSTRUMENTATION = False
+PROFILE = False
+RECORD_FLIGHT = False
+RECORDER_FILE = "flight.rec"
+RECORDER_SYNC_TIME = const(30)
+DIAGNOSTICS_DUMP_TIME = const(10)
+# Altitude and distance history of the contacts for the trend page, bytes of samples at most
+CONTACT_HISTORY = True
+HISTORY_MAX_BYTES = const(8192)
+# Receive to render and alert latency of the contacts on screen, see latency.py
+LATENCY_TRACKING = True
+# Slow the display down and wait on the websocket when no traffic arrives and no button is pressed for a while
+LOW_POWER = True
 
 
-def _get(url: str):
+def _get(url: str, record_type: int = 0):
     r = urequests.get(url)
     try:
+        if recorder and record_type:
+            recorder.record(record_type, r.content)
         return r.json()
     except:
         return {}
 
 
-def get_situation():
-    global situation_dictionary
-    data = _get("http://{}/getSituation".format(STRATUX_ADDRESS))
-    situation_dictionary.update(data)
-
-
 def get_my_altitude():
     global situation_dictionary
-    previous_altitude = situation_dictionary.get("OwnAltitude", INITIAL_ALT)
-    previous_vertical_velocity = situation_dictionary.get("OwnVerticalVelocity", 0)
-    get_situation()
-    if situation_dictionary["GPSHorizontalAccuracy"] > 999:
-        situation_dictionary["OwnAltitude"] = previous_altitude
-        situation_dictionary["OwnVerticalVelocity"] = previous_vertical_velocity
-    else:
-        situation_dictionary["OwnAltitude"] = situation_dictionary.get("GPSAltitudeMSL", previous_altitude)
-        situation_dictionary["OwnVerticalVelocity"] = situation_dictionary.get("GPSVerticalSpeed",
-                                                                               previous_vertical_velocity)
+    data = _get("http://{}/getSituation".format(STRATUX_ADDRESS), RECORD_SITUATION)
+    update_situation(situation_dictionary, data, INITIAL_ALT)
 
 
-def get_status(display_manager):
-    global status_dictionary
-    status = _get("http://{}/getStatus".format(STRATUX_ADDRESS))
-    display_manager.updated_gps_status(
-        "{} {}/{} {}m".format("GPS" if status["GPS_connected"] else "NO GPS", status["GPS_satellites_locked"],
-                              status["GPS_satellites_tracked"], status["GPS_position_accuracy"]))
+def get_status(display_manager) -> bool:
+    """
+    :return: True if the GPS status shown on screen changed
+    """
+    global status_dictionary, gps_status
+    status = _get("http://{}/getStatus".format(STRATUX_ADDRESS), RECORD_STATUS)
+    text = "{} {}/{} {:.0f}m".format("GPS" if status["GPS_connected"] else "NO GPS", status["GPS_satellites_locked"],
+                                     status["GPS_satellites_tracked"], status["GPS_position_accuracy"])
     status_dictionary.update(status)
+    if text == gps_status:
+        return False
+    gps_status = text
+    display_manager.updated_gps_status(text)
+    return True
 
 
 def create_websocket():
@@ -65,63 +102,198 @@ def create_websocket():
     return websocket
 
 
-reports_list = ReportList(status_dictionary, situation_dictionary)
+recorder = None
+if RECORD_FLIGHT:
+    recorder = FlightRecorder(RECORDER_FILE)
+
+profiler = None
+if PROFILE:
+    profiler = Profiler()
+    read_response = profiler.wrap(read_response, "read_response")
+    profiler.wrap_method(ReportList, "store_report")
+    profiler.wrap_method(ReportList, "flush_old_reports")
+    profiler.wrap_method(DisplayManager, "render")
+    for display_class in (ListDisplay, NearestDisplay, AltitudeProfilePage, TrendPage, SettingsPage,
+                          DiagnosticsPage):
+        profiler.wrap_method(display_class, "render_slice")
+        profiler.wrap_method(display_class, "update_display")
+
+reports_list = ReportList(status_dictionary, situation_dictionary, REPORT_CAPACITY)
+# Configured before the settings page loads the stored settings, which take precedence
+ingest_filter = reports_list.ingest_filter
+ingest_filter.reject_on_ground = FILTER_ON_GROUND
+ingest_filter.altitude_band = FILTER_ALTITUDE_BAND
+ingest_filter.max_distance = FILTER_MAX_DISTANCE
+if CONTACT_HISTORY:
+    reports_list.history = ContactHistoryStore(HISTORY_MAX_BYTES)
+if LATENCY_TRACKING:
+    reports_list.latency = LatencyTracker()
 display_manager = DisplayManager(reports_list, status_dictionary, situation_dictionary)
 
-btnA.wasPressed(display_manager.button_a_was_pressed)
-btnB.wasPressed(display_manager.button_b_was_pressed)
-btnC.wasPressed(display_manager.button_c_was_pressed)
+instrumentation.enable(INSTRUMENTATION)
+gc_policy = GCPolicy()
+gc_policy.setup()
+display_manager.gc_policy = gc_policy
+situation_poll = AdaptivePoll("situation", SITUATION_MIN_INTERVAL_MS, SITUATION_MAX_INTERVAL_MS)
+status_poll = AdaptivePoll("status", STATUS_MIN_INTERVAL_MS, STATUS_MAX_INTERVAL_MS)
+
+power = None
+if LOW_POWER:
+    power = PowerManager(display_manager.scheduler)
+    btnA.wasPressed(power.button(display_manager.button_a_was_pressed))
+    btnB.wasPressed(power.button(display_manager.button_b_was_pressed))
+    btnC.wasPressed(power.button(display_manager.button_c_was_pressed))
+else:
+    btnA.wasPressed(display_manager.button_a_was_pressed)
+    btnB.wasPressed(display_manager.button_b_was_pressed)
+    btnC.wasPressed(display_manager.button_c_was_pressed)
 
 gps_fix = False
-while not wifiCfg.wlan_sta.isconnected():
-    wifiCfg.doConnect(STRATUX_SSID, '')
-display_manager.update_connection_status('Stratux connected')
-websocket = create_websocket()
+# Wi-Fi, the TCP connection and the websocket handshake are made in steps from the main loop
+connection = ConnectionManager(wifiCfg.wlan_sta, STRATUX_SSID, '', "ws://{}/traffic".format(STRATUX_ADDRESS),
+                               WEBSOCKET_ERROR_TIMEOUT * 1000, SOCKET_TIMEOUT, PING_INTERVAL, MISSED_PONGS)
+connection_status = ""
+ingest_worker = None
+if INGEST_THREAD:
+    ingest_worker = IngestWorker(create_websocket, RingQueue(INGEST_QUEUE_SIZE), WEBSOCKET_ERROR_TIMEOUT, recorder,
+                                 ingest_filter, PING_INTERVAL, MISSED_PONGS, connection.pong)
+    ingest_worker.start()
+situation_stream = None
+if SITUATION_STREAM:
+    situation_connector = WebsocketConnector("ws://{}/situation".format(STRATUX_ADDRESS))
+    situation_stream = SituationStream(situation_connector.step, situation_dictionary, INITIAL_ALT, recorder)
 display_manager.select_display(display_manager.AIRCRAFT_LIST)
 
 start_time = time.time()
 last_time = 0
-last_report = 0
+last_dump = 0
+last_sync = 0
 while True:
     # Main loop. Everything should happen here.
-    try:
-        resp = websocket.recv()
-        last_report = time.time()
-        message = read_response(resp)
-        # print(message)
-        try:
-            report = reports_list.store_report(message)
-            print(report)
-        except Exception as e:
-            print(e)
-    except Exception as e:
-        pass
-    if time.time() - last_report > WEBSOCKET_ERROR_TIMEOUT:
-        try:
-            websocket.close()
-        except:
-            pass
-        websocket = create_websocket()
-        last_report = time.time()
+    if ingest_worker:
+        # The worker connects on its own thread, only the Wi-Fi join happens here
+        connection.wifi.step()
+        if ingest_worker.drain(reports_list):
+            if power:
+                power.activity(WAKE_DATA)
+        elif power and power.idle:
+            power.wait(IDLE_WAIT_MS, ingest_worker.queue)
+        else:
+            # Nothing queued, leave the interpreter to the worker thread for a moment
+            time.sleep_ms(INGEST_IDLE_MS)
+    else:
+        websocket = connection.step()
+        if connection.status != connection_status:
+            connection_status = connection.status
+            display_manager.update_connection_status(connection_status)
+        if power:
+            power.watch(websocket.sock if websocket else None)
+        # While idle, only read once the Stratux has sent something
+        readable = not power or power.wait(IDLE_WAIT_MS) or not power.idle
+        if websocket and readable:
+            try:
+                resp = websocket.recv()
+                received = time.ticks_ms()
+                if resp:
+                    connection.received()
+                    if power:
+                        power.activity(WAKE_DATA)
+                # A relay may send binary records instead of Stratux JSON, see traffic_codec.py
+                binary = isinstance(resp, bytes)
+                if recorder and resp:
+                    recorder.record(RECORD_TRAFFIC_BINARY if binary else RECORD_TRAFFIC, resp)
+                if binary:
+                    start_ticks = instrumentation.start()
+                    store_frame(reports_list, resp, received)
+                    instrumentation.stop("decode", start_ticks)
+                elif reports_list.accepts(resp):
+                    start_ticks = instrumentation.start()
+                    message = read_response(resp)
+                    instrumentation.stop("parse", start_ticks)
+                    # print(message)
+                    try:
+                        start_ticks = instrumentation.start()
+                        report = reports_list.store_report(message, received)
+                        instrumentation.stop("store", start_ticks)
+                        print(report)
+                    except Exception as e:
+                        print(e)
+            except Exception as e:
+                pass
+            if not websocket.open:
+                connection.lost()
 
     now = time.time()
-    if now - last_time > SCREEN_UPDATE_TIME:
-        last_time = now
+    # HTTP requests block, only make them while the Stratux answers
+    online = wifiCfg.wlan_sta.isconnected() if ingest_worker else connection.is_connected()
+    if online and status_poll.due():
+        status_poll.polled()
+        start_ticks = instrumentation.start()
         try:
-            get_status(display_manager)
+            changed = get_status(display_manager)
         except Exception as e:
             print("Failed getting status: {}".format(e))
+            changed = True
+        instrumentation.stop("http", start_ticks)
+        status_poll.set_interval(get_status_interval(status_poll.interval_ms, changed))
+    if online and situation_stream:
+        situation_stream.service()
+    if online and situation_poll.due() and not (situation_stream and situation_stream.is_live()):
+        situation_poll.polled()
+        start_ticks = instrumentation.start()
         try:
             get_my_altitude()
         except Exception as e:
             print("Failed getting situation: {}".format(e))
+        instrumentation.stop("http", start_ticks)
+        nearest = reports_list.get_nearest()
+        situation_poll.set_interval(get_situation_interval(situation_dictionary.get("OwnVerticalVelocity", 0),
+                                                           nearest.get_distance_score() if nearest else None))
+    if now - last_time > SCREEN_UPDATE_TIME:
+        last_time = now
         print("OwnAlt: {}".format(situation_dictionary["OwnAltitude"]))
         print("Acc: {}".format(situation_dictionary["GPSHorizontalAccuracy"]))
+        print("Polling: situation {} status {}".format(situation_poll.get_metrics(), status_poll.get_metrics()))
+        if not ingest_worker:
+            print("Connection: {}".format(connection.get_metrics()))
+        if situation_stream:
+            print("Situation stream: {}".format(situation_stream.get_metrics()))
 
+        start_ticks = instrumentation.start()
         reports_list.flush_old_reports()
-        display_manager.update_display()
+        instrumentation.stop("expire", start_ticks)
         print("Free memory: {} B".format(gc.mem_free()))
+        print("Frames: {}".format(display_manager.scheduler.get_metrics()))
+        print("Pages: {}".format(display_manager.get_metrics()))
+        print("Contacts: {}".format(reports_list.pool.get_metrics()))
+        if reports_list.history:
+            print("History: {}".format(reports_list.history.get_metrics()))
+        if reports_list.latency:
+            print("Latency: {}".format(reports_list.latency.get_metrics()))
+        print("Filter: {}".format(ingest_filter.get_metrics()))
+        print("GC: {}".format(gc_policy.get_metrics()))
+        if power:
+            print("Power: {}".format(power.get_metrics()))
+    if power:
+        power.update(display_manager.alert_time > -1 or reports_list.is_danger())
     if display_manager.trigger_select_display > -1:
         display_manager.actually_change_display()
-    if display_manager.trigger_update_display:
+    if not display_manager.rendering and (display_manager.trigger_update_display or
+                                          display_manager.scheduler.frame_due()):
+        # A frame still being drawn in slices is finished first
         display_manager.update_display()
+    display_manager.render()
+    if not display_manager.rendering:
+        gc_policy.idle()
+    if recorder:
+        # Flash writes only happen here, after rendering, never on the ingest path
+        recorder.service()
+        if now - last_sync > RECORDER_SYNC_TIME:
+            last_sync = now
+            recorder.sync()
+    if (instrumentation.enabled or profiler) and now - last_dump > DIAGNOSTICS_DUMP_TIME:
+        last_dump = now
+        if instrumentation.enabled:
+            instrumentation.dump()
+        if profiler:
+            profiler.dump()
@@ -0,0 +1,66 @@
+"""
+Adaptive polling of the Stratux HTTP endpoints.
+
+/getSituation is polled faster while we climb or descend, so our own altitude stays fresh enough for the crossing
+times, and while a threat is near. /getStatus backs off while the GPS status stays the same and goes back to the
+fastest rate as soon as it changes. Intervals are bounded and published as instrumentation gauges.
+"""
+import utime as time
+
+import instrumentation
+
+SITUATION_MIN_INTERVAL_MS = const(1000)
+SITUATION_MAX_INTERVAL_MS = const(4000)
+STATUS_MIN_INTERVAL_MS = const(4000)
+STATUS_MAX_INTERVAL_MS = const(32000)
+# Poll often enough that our own altitude moves at most this many feet between polls
+ALTITUDE_STEP = const(50)
+# Poll at the fastest rate while the nearest contact scores below this
+NEAR_THREAT_SCORE = const(20)
+
+
+class AdaptivePoll:
+    def __init__(self, name: str, min_interval_ms: int, max_interval_ms: int):
+        self.name = name
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.interval_ms = min_interval_ms
+        self.last_poll = None
+        self.polls = 0
+
+    def due(self) -> bool:
+        return self.last_poll is None or time.ticks_diff(time.ticks_ms(), self.last_poll) >= self.interval_ms
+
+    def polled(self):
+        self.last_poll = time.ticks_ms()
+        self.polls += 1
+        instrumentation.count("poll_" + self.name)
+
+    def set_interval(self, interval_ms: int):
+        self.interval_ms = int(min(max(interval_ms, self.min_interval_ms), self.max_interval_ms))
+        instrumentation.gauge(self.name + "_interval", self.interval_ms)
+
+    def get_metrics(self) -> dict:
+        return {"interval": self.interval_ms, "polls": self.polls}
+
+
+def get_situation_interval(vertical_velocity: float, nearest_score) -> int:
+    """
+    :param vertical_velocity: Our own, fpm
+    :param nearest_score: Distance score of the nearest contact, None without contacts
+    :return: Interval in ms before clamping
+    """
+    if nearest_score is not None and nearest_score < NEAR_THREAT_SCORE:
+        return SITUATION_MIN_INTERVAL_MS
+    if vertical_velocity == 0:
+        return SITUATION_MAX_INTERVAL_MS
+    return int(60000 * ALTITUDE_STEP / abs(vertical_velocity))
+
+
+def get_status_interval(interval_ms: int, changed: bool) -> int:
+    """
+    :return: Twice the interval while nothing changes, the fastest rate after a change
+    """
+    if changed:
+        return STATUS_MIN_INTERVAL_MS
+    return interval_ms * 2
@@ -0,0 +1,162 @@
+"""
+Low-power idle mode for the main loop.
+
+While traffic arrives, a button is pressed or an alert is on, the loop runs as before. After idle_after_ms without
+any of these the manager goes idle: the display renders every idle_frame_interval_ms instead of every few seconds and
+the loop waits in wait() for the traffic websocket to become readable instead of spinning on the socket timeout. The
+wait is cut into slices of wake_check_ms, a button callback only sets a flag, so a press ends the wait within one
+slice. Data ends it at once. Time spent in wait() is accounted as idle, the rest of the loop as active.
+"""
+import uselect as select
+import utime as time
+
+import instrumentation
+
+IDLE_AFTER_MS = const(30000)
+IDLE_FRAME_INTERVAL_MS = const(16000)
+# Longest wait per pass of the main loop, pings and polls are serviced in between
+IDLE_WAIT_MS = const(1000)
+WAKE_CHECK_MS = const(50)
+
+WAKE_DATA = "data"
+WAKE_BUTTON = "button"
+WAKE_ALERT = "alert"
+
+
+class PowerManager:
+    def __init__(self, scheduler: "FrameScheduler", idle_after_ms: int = IDLE_AFTER_MS,
+                 idle_frame_interval_ms: int = IDLE_FRAME_INTERVAL_MS, wake_check_ms: int = WAKE_CHECK_MS):
+        """
+        :param scheduler: Frame scheduler of the display manager, its frame interval is stretched while idle
+        :param idle_after_ms: Go idle after this long without traffic, button presses or alerts
+        :param idle_frame_interval_ms: Frame interval while idle
+        :param wake_check_ms: Slice of a wait, the longest a button press waits to be noticed
+        """
+        self.scheduler = scheduler
+        self.idle_after_ms = idle_after_ms
+        self.idle_frame_interval_ms = idle_frame_interval_ms
+        self.active_frame_interval_ms = scheduler.frame_interval_ms
+        self.wake_check_ms = wake_check_ms
+        self.idle = False
+        self.button_pressed = False
+        self.poller = None
+        self.watched = None
+        self.last_activity = time.ticks_ms()
+        self.last_update = time.ticks_us()
+        # Accounting, in microseconds
+        self.elapsed_us = 0
+        self.waited_us = 0
+        self.idle_mode_us = 0
+        self.idle_periods = 0
+        self.wakeups = {WAKE_DATA: 0, WAKE_BUTTON: 0, WAKE_ALERT: 0}
+
+    def watch(self, sock):
+        """
+        Wait on this socket while idle, None for none. Call whenever the connection may have changed.
+        """
+        if sock is self.watched:
+            return
+        if self.watched is not None:
+            try:
+                self.poller.unregister(self.watched)
+            except Exception:
+                pass
+        self.watched = sock
+        self.poller = None
+        if sock is not None:
+            self.poller = select.poll()
+            self.poller.register(sock, select.POLLIN)
+
+    def button(self, callback):
+        """
+        :return: Button callback that wakes the loop before calling callback
+        """
+
+        def pressed():
+            self.button_pressed = True
+            self.activity(WAKE_BUTTON)
+            callback()
+
+        return pressed
+
+    def activity(self, reason: str):
+        """
+        Traffic was received, a button was pressed or an alert is on
+        """
+        self.last_activity = time.ticks_ms()
+        if self.idle:
+            self.wake(reason)
+
+    def wake(self, reason: str):
+        self.idle = False
+        self.scheduler.frame_interval_ms = self.active_frame_interval_ms
+        # Draw straight away, an alert must not wait for the rest of a slow idle frame interval
+        self.scheduler.last_frame_start = time.ticks_add(time.ticks_ms(), -self.active_frame_interval_ms)
+        self.wakeups[reason] += 1
+        instrumentation.count("wake_" + reason)
+
+    def update(self, alert: bool = False):
+        """
+        Call once per pass of the main loop
+
+        :param alert: An alert is on, keeps the loop active
+        """
+        now = time.ticks_us()
+        # Accounted per pass, ticks_us wraps within minutes
+        elapsed = time.ticks_diff(now, self.last_update)
+        self.last_update = now
+        self.elapsed_us += elapsed
+        if self.idle:
+            self.idle_mode_us += elapsed
+        if alert:
+            self.activity(WAKE_ALERT)
+        elif not self.idle and time.ticks_diff(time.ticks_ms(), self.last_activity) >= self.idle_after_ms:
+            self.idle = True
+            self.idle_periods += 1
+            self.scheduler.frame_interval_ms = self.idle_frame_interval_ms
+            instrumentation.count("idle")
+        instrumentation.gauge("duty_cycle", self.get_duty_cycle())
+
+    def wait(self, timeout_ms: int = IDLE_WAIT_MS, pending=None) -> bool:
+        """
+        Wait while idle, returns at once when active
+
+        :param pending: Optional queue, the wait ends when it is not empty
+        :return: True if the watched socket is readable or the queue has items
+        """
+        if not self.idle:
+            return False
+        start = time.ticks_us()
+        ready = False
+        remaining = timeout_ms
+        self.button_pressed = False
+        while remaining > 0 and not self.button_pressed:
+            if pending is not None and len(pending):
+                ready = True
+                break
+            step = min(self.wake_check_ms, remaining)
+            if self.poller is not None:
+                if self.poller.poll(step):
+                    ready = True
+                    break
+            else:
+                time.sleep_ms(step)
+            remaining -= step
+        waited = time.ticks_diff(time.ticks_us(), start)
+        self.waited_us += waited
+        instrumentation.record("idle_wait", waited)
+        return ready
+
+    def get_duty_cycle(self) -> int:
+        """
+        :return: Percentage of the time the loop was not waiting
+        """
+        if self.elapsed_us == 0:
+            return 100
+        return max(0, 100 - 100 * self.waited_us // self.elapsed_us)
+
+    def get_metrics(self) -> dict:
+        return {"idle": self.idle, "duty": self.get_duty_cycle(),
+                "active_ms": (self.elapsed_us - self.waited_us) // 1000, "waited_ms": self.waited_us // 1000,
+                "idle_mode_ms": self.idle_mode_us // 1000,
+                "idle_periods": self.idle_periods, "wakeups": self.wakeups}
@@ -0,0 +1,116 @@
+"""
+Opt-in tracing profiler for MicroPython, where cProfile and sys.setprofile are not available.
+
+Functions are wrapped explicitly. Each call records count, inclusive time and bytes allocated (gc.mem_alloc deltas)
+against its call stack in tables that are allocated when the profiler is created. The dump is turned into a sorted
+report or folded stacks for flame graphs by host/profile_report.py.
+"""
+import gc
+import json
+import utime as time
+from array import array
+
+DUMP_PREFIX = "PROF "
+MAX_DEPTH = const(16)
+MAX_FUNCTIONS = const(64)
+
+
+class Profiler:
+    def __init__(self, capacity: int = 48):
+        """
+        :param capacity: Number of distinct call stacks that can be tracked, calls on further stacks are counted
+        as overflow
+        """
+        self.capacity = capacity
+        self.enabled = True
+        self.names = []
+        self.path_index = {}
+        self.path_count = 0
+        self.parents = array("h", [-1] * capacity)
+        self.functions = array("h", [0] * capacity)
+        self.calls = array("L", [0] * capacity)
+        self.time_us = array("q", [0] * capacity)
+        self.allocated = array("q", [0] * capacity)
+        self.stack = array("h", [-1] * MAX_DEPTH)
+        self.depth = 0
+        self.overflow = 0
+
+    def register(self, name: str) -> int:
+        if len(self.names) >= MAX_FUNCTIONS:
+            raise ValueError("Too many profiled functions")
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def enter(self, function_id: int) -> int:
+        parent = self.stack[min(self.depth, MAX_DEPTH) - 1] if self.depth > 0 else -1
+        key = (parent + 1) * MAX_FUNCTIONS + function_id
+        path = self.path_index.get(key, -1)
+        if path < 0:
+            if self.path_count < self.capacity:
+                path = self.path_count
+                self.path_count += 1
+                self.parents[path] = parent
+                self.functions[path] = function_id
+                self.path_index[key] = path
+            else:
+                self.overflow += 1
+        if self.depth < MAX_DEPTH:
+            self.stack[self.depth] = path
+        self.depth += 1
+        return path
+
+    def exit(self, path: int, start_ticks: int, start_alloc: int):
+        elapsed = time.ticks_diff(time.ticks_us(), start_ticks)
+        allocated = gc.mem_alloc() - start_alloc
+        self.depth -= 1
+        if path < 0:
+            return
+        self.calls[path] += 1
+        self.time_us[path] += elapsed
+        # A collection during the call makes the delta negative, the allocation is unknown then
+        if allocated > 0:
+            self.allocated[path] += allocated
+
+    def wrap(self, function, name: str = None):
+        function_id = self.register(name or function.__name__)
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            path = profiler.enter(function_id)
+            start_alloc = gc.mem_alloc()
+            start_ticks = time.ticks_us()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.exit(path, start_ticks, start_alloc)
+
+        return wrapper
+
+    def wrap_method(self, cls, attribute: str, name: str = None):
+        setattr(cls, attribute, self.wrap(getattr(cls, attribute), name or "{}.{}".format(cls.__name__, attribute)))
+
+    def reset(self):
+        for path in range(self.path_count):
+            self.calls[path] = 0
+            self.time_us[path] = 0
+            self.allocated[path] = 0
+        self.overflow = 0
+
+    def get_table(self) -> dict:
+        paths = []
+        for path in range(self.path_count):
+            paths.append((self.parents[path], self.functions[path], self.calls[path], self.time_us[path],
+                          self.allocated[path]))
+        return {"names": self.names, "paths": paths, "overflow": self.overflow}
+
+    def dump(self, file_name: str = None):
+        """
+        Print the table on the serial console, or write it to a file on flash
+        """
+        if file_name:
+            with open(file_name, "w") as output:
+                json.dump(self.get_table(), output)
+        else:
+            print(DUMP_PREFIX + json.dumps(self.get_table()))
@@ -1,8 +1,12 @@
 import json
 import math
+import uheapq as heapq
 import utime as time
 from collections import namedtuple
 
+import instrumentation
+from ingest_filter import IngestFilter, get_identity
+
 message_keys = ['Addr_type', 'Age', 'AgeLastAlt', 'Alt', 'AltIsGNSS', 'Bearing', 'BearingDist_valid', 'Distance',
                 'DistanceEstimated', 'DistanceEstimatedLastTs', 'Emitter_category', 'ExtrapolatedPosition',
                 'GnssDiffFromBaroAlt', 'Icao_addr', 'Last_GnssDiff', 'Last_GnssDiffAlt', 'Last_alt', 'Last_seen',
@@ -11,6 +15,16 @@ message_keys = ['Addr_type', 'Age', 'AgeLastAlt', 'Alt', 'AltIsGNSS', 'Bearing',
                 'Timestamp', 'Track', 'Vvel']
 Message = namedtuple("message", message_keys)
 
+DEFAULT_CAPACITY = const(64)
+# Altitude band index, bands within NEARBY_BANDS of our own are always scored, bands further away only when a
+# contact there could score below DANGER_SCORE, or below the nearest contact when looking for it
+BAND_HEIGHT = const(500)
+NEARBY_BANDS = const(4)
+# Approximately one minute until altitude crossing and 5 miles away
+DANGER_SCORE = 5
+# Seconds, how far the altitude timestamp may move before a repeated altitude counts as a new sample
+ALTITUDE_TIMESTAMP_TOLERANCE = 0.5
+
 
 def distance_to_nm(distance: float) -> float:
     return distance / (1000 * 1.852)
@@ -37,7 +51,31 @@ class LatestReport:
     CLIMBING = 1
     LEVEL = 2
 
-    def __init__(self, key, incoming_message: Message, report_list: "ReportList"):
+    def __init__(self, report_list: "ReportList"):
+        self.key = None
+        self.identifier = ""
+        self.last_updated = 0
+        self.age = 0
+        self.altitude = 0
+        self.altitude_change = self.LEVEL
+        self.vertical_velocity = 0
+        self.message = None
+        self.report_list = report_list
+        self.altitudes = []
+        # Altitude band the report list filed this contact under
+        self.band = None
+        self.indexed = False
+        self.score = 0
+        self.score_epoch = -1
+        # ticks_ms of the last frame and of the last frame that changed the contact, see latency.py
+        self.received = 0
+        self.changed = 0
+        self.render_pending = False
+
+    def reset(self, key, incoming_message: Message):
+        """
+        Start tracking a new contact with this record
+        """
         self.key = key
         self.identifier = ""
         self.last_updated = time.time()
@@ -46,11 +84,47 @@ class LatestReport:
         self.altitude_change = self.LEVEL
         self.vertical_velocity = 0
         self.message = incoming_message
-        self.report_list = report_list
-        self.altitudes = []
-        self.update_report(incoming_message)
-
-    def update_report(self, incoming_message: Message):
+        self.render_pending = False
+        del self.altitudes[:]
+        self.apply_update(incoming_message)
+
+    def update_report(self, incoming_message: Message) -> bool:
+        """
+        Update the contact from a new message. Stratux repeats contacts with identical data, in that case only the
+        age is refreshed.
+
+        :return: True if the contact changed
+        """
+        if self.is_unchanged(incoming_message):
+            self.age = incoming_message.Age
+            self.last_updated = time.time()
+            instrumentation.count("update_touch")
+            return False
+        instrumentation.count("update_full")
+        self.apply_update(incoming_message)
+        return True
+
+    def is_unchanged(self, incoming_message: Message) -> bool:
+        """
+        Fingerprint check of the fields behind the identifier, the altitude history, the vertical rate and the score
+        """
+        message = self.message
+        if message.Alt != incoming_message.Alt or message.Vvel != incoming_message.Vvel or \
+                message.Distance != incoming_message.Distance or \
+                message.DistanceEstimated != incoming_message.DistanceEstimated or \
+                message.Position_valid != incoming_message.Position_valid or \
+                message.BearingDist_valid != incoming_message.BearingDist_valid or \
+                message.OnGround != incoming_message.OnGround or message.Tail != incoming_message.Tail or \
+                message.Squawk != incoming_message.Squawk:
+            return False
+        if incoming_message.Vvel == 0 and len(self.altitudes) > 0:
+            # The vertical rate comes from the altitude history, so a new sample of the same altitude still counts
+            return math.fabs(time.time() - incoming_message.AgeLastAlt - self.altitudes[-1][1]) < \
+                   ALTITUDE_TIMESTAMP_TOLERANCE
+        return True
+
+    def apply_update(self, incoming_message: Message):
+        self.score_epoch = -1
         self.identifier = get_identifier(incoming_message)
         self.age = incoming_message.Age
         self.last_updated = time.time()
@@ -78,95 +152,452 @@ class LatestReport:
                                        self.altitude, self.vertical_velocity)
 
     def get_distance_score(self) -> float:
+        """
+        Kept until the contact or our own state changes, see ReportList.get_state_key
+        """
+        if self.score_epoch == self.report_list.score_epoch:
+            return self.score
         minutes_until_altitude_crossing = self.get_altitude_crossing_time()
         if minutes_until_altitude_crossing < 0.5:
             minutes_until_altitude_crossing = 10
         score = math.fabs(minutes_until_altitude_crossing) * self.get_distance()
+        self.score = score
+        self.score_epoch = self.report_list.score_epoch
         return score
 
     def is_dangerous(self) -> bool:
-        return self.get_distance_score() < 5  # Approximately one minute until altitude crossing and 5 miles away
+        return self.get_distance_score() < DANGER_SCORE
 
     def get_distance(self) -> float:
         if self.is_good_distance():
             return distance_to_nm(self.message.Distance)
         return distance_to_nm(self.message.DistanceEstimated)
 
+    def get_closest_distance(self) -> float:
+        """
+        :return: nm, no more than get_distance whatever the GPS accuracy
+        """
+        distance = self.message.DistanceEstimated
+        if self.message.BearingDist_valid and self.message.Position_valid:
+            distance = min(distance, self.message.Distance)
+        return distance_to_nm(distance)
+
     def is_good_distance(self) -> bool:
         return self.message.BearingDist_valid and self.message.Position_valid and self.report_list.situation_dictionary[
             "GPSHorizontalAccuracy"] < 999
 
     def get_age(self) -> float:
-        return self.message.Age + time.time() - self.last_updated
+        return self.age + time.time() - self.last_updated
 
     def __str__(self):
         return "{}: {}s".format(self.identifier, self.get_age())
 
 
+class ReportPool:
+    """
+    Preallocated contact records. Records are acquired for new contacts and released when they expire, so contact
+    churn does not allocate and fragment the heap.
+    """
+    EVICT_LOWEST_THREAT = 0
+    DROP_NEW = 1
+
+    def __init__(self, report_list: "ReportList", capacity: int, overflow_policy: int = EVICT_LOWEST_THREAT):
+        """
+        :param capacity: Number of contacts that can be tracked at once
+        :param overflow_policy: What happens to a new contact when all records are in use
+        """
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.free = [LatestReport(report_list) for _ in range(capacity)]
+        # Scratch record used to score a new contact against the tracked ones when the pool is exhausted
+        self.spare = LatestReport(report_list)
+        self.allocations = capacity + 1
+        self.acquired = 0
+        self.released = 0
+        self.evicted = 0
+        self.dropped = 0
+
+    def acquire(self):
+        """
+        :return: A free record, None when the pool is exhausted
+        """
+        if not self.free:
+            return None
+        self.acquired += 1
+        return self.free.pop()
+
+    def release(self, report: LatestReport):
+        report.message = None
+        self.released += 1
+        self.free.append(report)
+
+    def get_metrics(self) -> dict:
+        return {"capacity": self.capacity, "free": len(self.free), "allocations": self.allocations,
+                "acquired": self.acquired, "released": self.released, "evicted": self.evicted,
+                "dropped": self.dropped}
+
+
 class ReportList:
-    def __init__(self, status_dictionary, situation_dictionary):
+    def __init__(self, status_dictionary, situation_dictionary, capacity: int = DEFAULT_CAPACITY,
+                 overflow_policy: int = ReportPool.EVICT_LOWEST_THREAT):
         self.reports = {}
+        self.pool = ReportPool(self, capacity, overflow_policy)
         self.ship_count = 0
         self.key_map = {}
         self.status_dictionary = status_dictionary
         self.situation_dictionary = situation_dictionary
-        self.include_valid_positions = True
+        # Decides which frames are stored at all, main.py configures it
+        self.ingest_filter = IngestFilter(situation_dictionary)
+        # Changes whenever a contact is added, removed or materially updated
+        self.revision = 0
+        self.sorted_cache = []
+        self.sorted_cache_key = None
+        self.top_cache = []
+        self.top_cache_key = None
+        # Contact scores are kept within an epoch, a new one starts when our own state changes
+        self.own_state = None
+        self.score_epoch = 0
+        # ticks_ms of the situation update behind the last change of our own state, see update_situation
+        self.own_state_changed = time.ticks_ms()
+        # Altitude band to the contacts in it, and an upper bound of their vertical speed
+        self.bands = {}
+        self.band_climb = {}
+        self.band_distance = {}
+        self.nearest = None
+        self.nearest_key = None
+        # Optional contact_history.ContactHistoryStore, sampled as contacts are stored
+        self.history = None
+        # Optional latency.LatencyTracker, stamps contacts with the receive time of their frame
+        self.latency = None
 
     def is_danger(self) -> bool:
-        if len(self.reports) > 0:
-            return self.get_list_sorted_score()[0].is_dangerous()
-        return False
+        nearest = self.get_nearest()
+        return nearest is not None and nearest.is_dangerous()
+
+    def get_band(self, altitude: float):
+        """
+        Bands are absolute, a change of our own altitude only changes which bands are scored.
+        An unknown altitude gets the None band, which is always scored.
+        """
+        if altitude == 0:
+            return None
+        return int(altitude // BAND_HEIGHT)
+
+    def index_report(self, report: LatestReport):
+        """
+        File a new or updated contact under its altitude band
+        """
+        band = self.get_band(report.altitude)
+        if report.indexed:
+            if band == report.band:
+                self.band_climb[band] = max(self.band_climb[band], math.fabs(report.vertical_velocity))
+                self.band_distance[band] = min(self.band_distance[band], report.get_closest_distance())
+                return
+            self.unindex_report(report)
+        if band not in self.bands:
+            self.bands[band] = []
+            self.band_climb[band] = 0
+            self.band_distance[band] = report.get_closest_distance()
+        self.bands[band].append(report)
+        self.band_climb[band] = max(self.band_climb[band], math.fabs(report.vertical_velocity))
+        self.band_distance[band] = min(self.band_distance[band], report.get_closest_distance())
+        report.band = band
+        report.indexed = True
+
+    def unindex_report(self, report: LatestReport):
+        if not report.indexed:
+            return
+        report.indexed = False
+        contacts = self.bands[report.band]
+        contacts.remove(report)
+        if not contacts:
+            del self.bands[report.band]
+            del self.band_climb[report.band]
+            del self.band_distance[report.band]
+
+    def get_score_bound(self, band, separation: float, own_climb: float) -> float:
+        """
+        Lower bound of the distance scores in a band: no contact there crosses our altitude sooner than the
+        separation at the fastest vertical speeds, or is closer than the closest of them
+
+        :param separation: ft between the band and our own
+        """
+        closing = self.band_climb[band] + own_climb
+        minutes = min(separation / closing, 99) if closing > 0 else 99
+        return minutes * self.band_distance[band]
+
+    def get_threat_candidates(self, limit: float = DANGER_SCORE, floor: float = None) -> list:
+        """
+        :param limit: Bands further than NEARBY_BANDS from our own are left out when no contact there can score
+            below this
+        :param floor: Only the further bands that could score between floor and limit, for widening an earlier call
+            that used floor as its limit
+        :return: Contacts in the bands around our own altitude, and in further bands where a contact could score below
+            the limit
+        """
+        own_band = self.get_band(self.situation_dictionary["OwnAltitude"])
+        own_climb = math.fabs(self.situation_dictionary["OwnVerticalVelocity"])
+        candidates = []
+        for band, contacts in self.bands.items():
+            if band is not None and own_band is not None and abs(band - own_band) > NEARBY_BANDS:
+                separation = (abs(band - own_band) - 1) * BAND_HEIGHT
+                bound = self.get_score_bound(band, separation, own_climb)
+                if bound >= limit:
+                    continue
+                # The bounds only loosen between checks, tighten them before scoring the band
+                self.band_climb[band] = max(math.fabs(report.vertical_velocity) for report in contacts)
+                self.band_distance[band] = min(report.get_closest_distance() for report in contacts)
+                bound = self.get_score_bound(band, separation, own_climb)
+                if bound >= limit or (floor is not None and bound < floor):
+                    continue
+            elif floor is not None:
+                continue
+            candidates.extend(contacts)
+        return candidates
+
+    def get_nearest(self):
+        """
+        The contact with the lowest distance score. Bands that cannot hold a dangerous contact are skipped, and
+        only scored when no dangerous contact was found and they could still beat the nearest one. Cached like the
+        ranking.
+
+        :return: None when no contacts are tracked
+        """
+        cache_key = self.get_state_key()
+        if cache_key == self.nearest_key:
+            return self.nearest
+        start_ticks = instrumentation.start()
+        candidates = self.get_threat_candidates()
+        if not candidates:
+            candidates = self.reports.values()
+        nearest = min(candidates, key=lambda k: k.get_distance_score()) if self.reports else None
+        if nearest is not None and not nearest.is_dangerous() and len(candidates) < len(self.reports):
+            for report in self.get_threat_candidates(nearest.get_distance_score(), DANGER_SCORE):
+                if report.get_distance_score() < nearest.get_distance_score():
+                    nearest = report
+        self.nearest = nearest
+        self.nearest_key = cache_key
+        instrumentation.stop("nearest", start_ticks)
+        return self.nearest
 
     def toggle_include_valid_positions(self, value=None):
         if value is not None:
-            self.include_valid_positions = value
+            self.ingest_filter.include_valid_positions = value
         else:
-            self.include_valid_positions = not self.include_valid_positions
-        if self.include_valid_positions:
+            self.ingest_filter.include_valid_positions = not self.ingest_filter.include_valid_positions
+        self.revision += 1
+        if self.ingest_filter.include_valid_positions:
             print("Including valid positions")
         else:
             print("Not including valid positions")
+            # The filter keeps them out from now on, drop the ones already tracked
+            for report in [item for item in self.reports.values() if item.message.Position_valid]:
+                self.release_report(report)
 
     def get_include_valid_positions(self):
-        return self.include_valid_positions
+        return self.ingest_filter.include_valid_positions
 
-    def get_selected_reports(self):
-        if not self.get_include_valid_positions():
-            return [item for item in self.reports.values() if not item.message.Position_valid]
+    def toggle_hide_ground(self, value=None):
+        if value is not None:
+            self.ingest_filter.reject_on_ground = value
         else:
-            return list(self.reports.values())
+            self.ingest_filter.reject_on_ground = not self.ingest_filter.reject_on_ground
+        if self.ingest_filter.reject_on_ground:
+            for report in [item for item in self.reports.values() if item.message.OnGround]:
+                self.release_report(report)
+
+    def get_hide_ground(self):
+        return self.ingest_filter.reject_on_ground
+
+    def get_selected_reports(self):
+        """
+        Contacts excluded by the position policy are rejected by the ingest filter, so this is every tracked contact
+        """
+        return list(self.reports.values())
+
+    def get_state_key(self) -> tuple:
+        """
+        Call before scoring contacts, a change of our own state starts a new score epoch.
+
+        :return: Changes whenever the scores of the contacts may have changed, for caching derived results
+        """
+        own_state = (self.situation_dictionary.get("OwnAltitude"),
+                     self.situation_dictionary.get("OwnVerticalVelocity"),
+                     self.situation_dictionary.get("GPSHorizontalAccuracy", 999) < 999)
+        if own_state != self.own_state:
+            self.own_state = own_state
+            self.score_epoch += 1
+            self.own_state_changed = self.situation_dictionary.get("OwnReceived", self.own_state_changed)
+        return self.revision, self.score_epoch
 
     def get_list_sorted_score(self):
-        return sorted(self.get_selected_reports(), key=lambda k: k.get_distance_score())
+        """
+        The ranking is cached until a contact or the own-ship state changes. Do not modify the returned list.
+        """
+        cache_key = self.get_state_key()
+        if cache_key == self.sorted_cache_key:
+            instrumentation.count("rank_cached")
+            return self.sorted_cache
+        start_ticks = instrumentation.start()
+        self.sorted_cache = sorted(self.get_selected_reports(), key=lambda k: k.get_distance_score())
+        self.sorted_cache_key = cache_key
+        instrumentation.stop("rank", start_ticks)
+        return self.sorted_cache
+
+    def get_top(self, count: int) -> list:
+        """
+        The best count contacts by distance score, best first, in the same order as get_list_sorted_score. Only a
+        heap of count contacts is kept, O(n log count) instead of sorting everything. Do not modify the returned list.
+        """
+        state_key = self.get_state_key()
+        if state_key == self.sorted_cache_key:
+            instrumentation.count("rank_cached")
+            return self.sorted_cache[:count]
+        if (state_key, count) == self.top_cache_key:
+            instrumentation.count("rank_cached")
+            return self.top_cache
+        start_ticks = instrumentation.start()
+        # Max-heap of the best contacts so far through negated scores, the sequence keeps ties in insertion order
+        heap = []
+        sequence = 0
+        for report in self.reports.values():
+            score = report.get_distance_score()
+            if len(heap) < count:
+                heapq.heappush(heap, (-score, -sequence, report))
+            elif -heap[0][0] > score:
+                heapq.heappop(heap)
+                heapq.heappush(heap, (-score, -sequence, report))
+            sequence += 1
+        top = []
+        while heap:
+            top.append(heapq.heappop(heap)[2])
+        top.reverse()
+        self.top_cache = top
+        self.top_cache_key = (state_key, count)
+        instrumentation.stop("rank", start_ticks)
+        return top
+
+    def get_ranked_page(self, page: int, page_size: int) -> list:
+        """
+        :return: The contacts on one page of the ranking, the last page is filled up from the one before
+        """
+        first = max(min(page * page_size, len(self.reports) - page_size), 0)
+        return self.get_top(first + page_size)[first:]
 
     def flush_old_reports(self):
-        for key in self.reports.keys():
+        for key in list(self.reports.keys()):
             if self.reports[key].get_age() > 60:
-                del self.reports[key]
+                self.release_report(self.reports[key])
+
+    def acquire_report(self, key, message: Message):
+        """
+        Take a record from the pool for a new contact. When the pool is exhausted the overflow policy either drops
+        the new contact, or evicts the tracked contact with the highest distance score if the new contact scores
+        lower.
+
+        :return: The record, reset to the new contact, or None if the contact was dropped
+        """
+        report = self.pool.acquire()
+        if report is not None:
+            instrumentation.count("contact_new")
+            report.reset(key, message)
+            return report
+        if self.pool.overflow_policy == ReportPool.EVICT_LOWEST_THREAT and self.reports:
+            self.get_state_key()
+            candidate = self.pool.spare
+            candidate.reset(key, message)
+            victim = max(self.reports.values(), key=lambda k: k.get_distance_score())
+            if candidate.get_distance_score() < victim.get_distance_score():
+                self.unindex_report(victim)
+                del self.reports[victim.key]
+                if self.history is not None:
+                    self.history.forget(victim.key)
+                self.revision += 1
+                victim.message = None
+                self.pool.spare = victim
+                self.pool.evicted += 1
+                instrumentation.count("contact_evicted")
+                return candidate
+        self.pool.dropped += 1
+        instrumentation.count("contact_dropped")
+        return None
+
+    def release_report(self, report: LatestReport):
+        self.unindex_report(report)
+        del self.reports[report.key]
+        if self.history is not None:
+            self.history.forget(report.key)
+        self.revision += 1
+        self.pool.release(report)
+
+    def find_key(self, tail: str, squawk: int, icao_addr: int):
+        """
+        :return: The key of a contact seen before, None for a new one
+        """
+        key = self.key_map.get(tail)
+        if not key:
+            key = self.key_map.get(squawk)
+            if not key:
+                key = self.key_map.get("{:X}".format(icao_addr))
+        return key
 
     def map_to_key(self, message: Message):
-        key = self.key_map.get(message.Tail)
+        key = self.find_key(message.Tail, message.Squawk, message.Icao_addr)
         if not key:
-            key = self.key_map.get(message.Squawk)
-            if not key:
-                key = self.key_map.get("{:X}".format(message.Icao_addr))
-                if not key:
-                    # Create new key
-                    self.ship_count += 1
-                    key = self.ship_count
-                    self.key_map[get_identifier(message)] = key
+            # Create new key
+            self.ship_count += 1
+            key = self.ship_count
+            self.key_map[get_identifier(message)] = key
         return key
 
-    def store_report(self, message: Message) -> LatestReport:
+    def accepts(self, response) -> bool:
+        """
+        Check a raw /traffic frame with the ingest filter. A tracked contact whose frame is rejected, because it
+        landed, left the altitude band or the distance limit or gained a valid position, is released at once.
+
+        :return: False if the frame should be dropped
+        """
+        if self.ingest_filter.accepts(response):
+            return True
+        self.release_rejected(get_identity(response))
+        return False
+
+    def release_rejected(self, identity):
+        """
+        :param identity: get_identity of a frame the ingest filter rejected, may be None
+        """
+        if identity is None or not self.reports:
+            return
+        report = self.reports.get(self.find_key(*identity))
+        if report is not None:
+            self.release_report(report)
+
+    def store_report(self, message: Message, received=None) -> LatestReport:
+        """
+        :param received: ticks_ms when the frame was received, None for now
+        :return: The updated report, None if the contact was dropped because the pool is full
+        """
         k = self.map_to_key(message)
         latest_report = self.reports.get(k)
+        changed = True
         if not latest_report:
             # print("Did not find report for key: {}".format(k))
-            latest_report = LatestReport(k, message, self)
+            latest_report = self.acquire_report(k, message)
+            if latest_report is None:
+                return None
+            self.index_report(latest_report)
             self.reports[k] = latest_report
-        # else:
-        # print("Found existing report for key: {}".format(k))
-        latest_report.update_report(message)
+            self.revision += 1
+        elif latest_report.update_report(message):
+            # print("Found existing report for key: {}".format(k))
+            self.index_report(latest_report)
+            self.revision += 1
+        else:
+            changed = False
+        if self.latency is not None:
+            self.latency.received(latest_report, received, changed)
+        if self.history is not None:
+            self.history.record(k, latest_report.altitude, latest_report.message.DistanceEstimated)
         return latest_report
 
 
@@ -175,6 +606,25 @@ def read_response(response):
     return Message(*[data[key] for key in sorted(data.keys())])
 
 
+def update_situation(situation_dictionary: dict, data: dict, initial_altitude: float):
+    """
+    Merge a /getSituation sample into the situation dictionary and derive OwnAltitude and OwnVerticalVelocity.
+    The previous own-ship values are kept while the GPS accuracy is unusable. OwnReceived is the ticks_ms of the
+    sample.
+    """
+    situation_dictionary["OwnReceived"] = time.ticks_ms()
+    previous_altitude = situation_dictionary.get("OwnAltitude", initial_altitude)
+    previous_vertical_velocity = situation_dictionary.get("OwnVerticalVelocity", 0)
+    situation_dictionary.update(data)
+    if situation_dictionary["GPSHorizontalAccuracy"] > 999:
+        situation_dictionary["OwnAltitude"] = previous_altitude
+        situation_dictionary["OwnVerticalVelocity"] = previous_vertical_velocity
+    else:
+        situation_dictionary["OwnAltitude"] = situation_dictionary.get("GPSAltitudeMSL", previous_altitude)
+        situation_dictionary["OwnVerticalVelocity"] = situation_dictionary.get("GPSVerticalSpeed",
+                                                                               previous_vertical_velocity)
+
+
 def get_identifiers(message: Message):
     return message.Addr_type, message.Icao_addr, message.Squawk, message.Tail
 
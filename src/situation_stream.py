@@ -0,0 +1,127 @@
+"""
+Own-ship state from the Stratux /situation websocket.
+
+Stratux pushes the same JSON as /getSituation on /situation whenever it changes. The stream is read from the main
+loop next to /traffic, a poll with a zero timeout tells whether a frame is waiting, so the loop never waits on it.
+While the stream delivers, the HTTP poll of /getSituation is skipped. When it cannot be opened, or goes quiet, the
+main loop falls back to polling and the stream is tried again later.
+"""
+import json
+import uselect as select
+import utime as time
+
+import instrumentation
+from flight_recorder import RECORD_SITUATION
+from report import update_situation
+
+SOCKET_TIMEOUT = 0.05
+# The stream counts as live while updates arrive at least this often
+STALE_TIME_MS = const(3000)
+RETRY_TIME_MS = const(30000)
+# Frames read per call to service(), the latest one counts
+MAX_FRAMES = const(4)
+
+
+class SituationStream:
+    def __init__(self, connect, situation_dictionary: dict, initial_altitude: float, recorder=None):
+        """
+        :param connect: Returns a connected websocket to /situation, or None while connecting takes more calls.
+        Raises when connecting fails.
+        :param situation_dictionary: Updated in place like by the HTTP poll
+        :param recorder: Optional FlightRecorder, updates are recorded like polled situations
+        """
+        self.connect = connect
+        self.situation_dictionary = situation_dictionary
+        self.initial_altitude = initial_altitude
+        self.recorder = recorder
+        self.websocket = None
+        self.poller = None
+        self.last_attempt = None
+        self.connecting = False
+        self.last_update = None
+        self.updates = 0
+        self.failures = 0
+
+    def is_live(self) -> bool:
+        return self.websocket is not None and self.last_update is not None and \
+               time.ticks_diff(time.ticks_ms(), self.last_update) < STALE_TIME_MS
+
+    def open(self):
+        if not self.connecting:
+            self.last_attempt = time.ticks_ms()
+            self.connecting = True
+        try:
+            websocket = self.connect()
+        except Exception as e:
+            print("Situation stream not available: {}".format(e))
+            self.failures += 1
+            self.connecting = False
+            return
+        if websocket is None:
+            # Connecting in steps, see connection_manager.WebsocketConnector
+            return
+        self.connecting = False
+        self.websocket = websocket
+        self.websocket.settimeout(SOCKET_TIMEOUT)
+        self.poller = select.poll()
+        self.poller.register(self.websocket.sock, select.POLLIN)
+        self.last_update = None
+
+    def close(self):
+        if self.websocket is not None:
+            try:
+                self.poller.unregister(self.websocket.sock)
+                self.websocket.close()
+            except Exception:
+                pass
+        self.websocket = None
+        self.poller = None
+
+    def service(self) -> bool:
+        """
+        Call on every pass of the main loop
+
+        :return: True if our own state was updated
+        """
+        if self.websocket is None:
+            if self.connecting or self.last_attempt is None or \
+                    time.ticks_diff(time.ticks_ms(), self.last_attempt) >= RETRY_TIME_MS:
+                self.open()
+            return False
+        data = None
+        for _ in range(MAX_FRAMES):
+            if not self.poller.poll(0):
+                break
+            try:
+                frame = self.websocket.recv()
+            except OSError:
+                break
+            except Exception as e:
+                print("Situation stream lost: {}".format(e))
+                frame = None
+            if frame is None:
+                # Closed by Stratux
+                self.close()
+                return False
+            if frame:
+                data = frame
+        if data is None:
+            # The first update is given the stale time as well, counted from the connection attempt
+            last_update = self.last_update if self.last_update is not None else self.last_attempt
+            if time.ticks_diff(time.ticks_ms(), last_update) >= STALE_TIME_MS:
+                print("Situation stream went quiet, polling instead")
+                self.close()
+            return False
+        if self.recorder:
+            self.recorder.record(RECORD_SITUATION, data)
+        try:
+            update_situation(self.situation_dictionary, json.loads(data), self.initial_altitude)
+        except (ValueError, KeyError):
+            return False
+        self.last_update = time.ticks_ms()
+        self.updates += 1
+        instrumentation.count("situation_stream")
+        return True
+
+    def get_metrics(self) -> dict:
+        return {"live": self.is_live(), "updates": self.updates, "failures": self.failures}
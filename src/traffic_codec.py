@@ -0,0 +1,112 @@
+"""
+Compact binary traffic records for OP_BYTES websocket frames.
+
+Parsing the JSON of a /traffic message is the most expensive thing the device decodes. A relay can send the same
+contacts as fixed-size binary records instead, several per frame. A frame is a header followed by the records,
+packed big endian:
+    header  B version, B number of records
+    record  I Icao_addr, H Squawk, i Alt (ft), h Vvel (fpm), f Distance (m), f DistanceEstimated (m),
+            H Age (0.1 s), H AgeLastAlt (0.1 s), B Addr_type, B flags, 8s Tail (NUL padded)
+A record is 34 bytes, a JSON message from the Stratux several hundred. Records decode straight into Contact
+tuples, which carry the fields of report.Message the report list reads.
+"""
+import ustruct as struct
+from ucollections import namedtuple
+
+VERSION = const(1)
+HEADER_FORMAT = "!BB"
+RECORD_FORMAT = "!IHihffHHBB8s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+MAX_RECORDS = const(255)
+TAIL_SIZE = const(8)
+
+FLAG_POSITION_VALID = const(0x01)
+FLAG_BEARING_DISTANCE_VALID = const(0x02)
+FLAG_ON_GROUND = const(0x04)
+
+contact_keys = ['Addr_type', 'Age', 'AgeLastAlt', 'Alt', 'BearingDist_valid', 'Distance', 'DistanceEstimated',
+                'Icao_addr', 'OnGround', 'Position_valid', 'Squawk', 'Tail', 'Vvel']
+Contact = namedtuple("contact", contact_keys)
+
+
+def _clamp(value, low: int, high: int) -> int:
+    return min(max(int(round(value)), low), high)
+
+
+def encode_message(message: dict) -> bytes:
+    """
+    Pack a /traffic message as decoded from the Stratux JSON, for host tools and relays
+
+    :return: One record
+    """
+    flags = 0
+    if message["Position_valid"]:
+        flags |= FLAG_POSITION_VALID
+    if message["BearingDist_valid"]:
+        flags |= FLAG_BEARING_DISTANCE_VALID
+    if message["OnGround"]:
+        flags |= FLAG_ON_GROUND
+    return struct.pack(RECORD_FORMAT, message["Icao_addr"], _clamp(message["Squawk"], 0, 0xffff),
+                       _clamp(message["Alt"], -0x80000000, 0x7fffffff), _clamp(message["Vvel"], -0x8000, 0x7fff),
+                       message["Distance"], message["DistanceEstimated"], _clamp(message["Age"] * 10, 0, 0xffff),
+                       _clamp(message["AgeLastAlt"] * 10, 0, 0xffff), message["Addr_type"], flags,
+                       message["Tail"].encode()[:TAIL_SIZE])
+
+
+def encode_frame(messages: list) -> bytes:
+    """
+    :param messages: At most MAX_RECORDS /traffic messages
+    :return: The payload of one OP_BYTES frame
+    """
+    if len(messages) > MAX_RECORDS:
+        raise ValueError("{} records do not fit in a frame".format(len(messages)))
+    return struct.pack(HEADER_FORMAT, VERSION, len(messages)) + b"".join(encode_message(message)
+                                                                         for message in messages)
+
+
+def get_record_count(frame) -> int:
+    """
+    :raises ValueError: Not a frame of this version, or cut short
+    """
+    if len(frame) < HEADER_SIZE:
+        raise ValueError("Frame too short")
+    version, count = struct.unpack_from(HEADER_FORMAT, frame, 0)
+    if version != VERSION:
+        raise ValueError("Unknown record version {}".format(version))
+    if len(frame) < HEADER_SIZE + count * RECORD_SIZE:
+        raise ValueError("Frame too short")
+    return count
+
+
+def decode_record(frame, index: int) -> Contact:
+    icao, squawk, altitude, vertical_velocity, distance, distance_estimated, age, age_last_altitude, address_type, \
+        flags, tail = struct.unpack_from(RECORD_FORMAT, frame, HEADER_SIZE + index * RECORD_SIZE)
+    end = tail.find(b"\0")
+    if end >= 0:
+        tail = tail[:end]
+    return Contact(address_type, age / 10, age_last_altitude / 10, altitude,
+                   bool(flags & FLAG_BEARING_DISTANCE_VALID), distance, distance_estimated, icao,
+                   bool(flags & FLAG_ON_GROUND), bool(flags & FLAG_POSITION_VALID), squawk, tail.decode(),
+                   vertical_velocity)
+
+
+def decode_frame(frame) -> list:
+    """
+    :return: The Contact of every record in the frame
+    """
+    return [decode_record(frame, index) for index in range(get_record_count(frame))]
+
+
+def store_frame(reports_list, frame, received=None) -> int:
+    """
+    Decode the records of a frame straight into the report list
+
+    :param received: ticks_ms when the frame was received, None for now
+    :return: Number of contacts stored
+    """
+    stored = 0
+    for index in range(get_record_count(frame)):
+        if reports_list.store_report(decode_record(frame, index), received) is not None:
+            stored += 1
+    return stored
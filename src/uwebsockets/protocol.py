@@ -6,6 +6,7 @@ import ure as re
 import ustruct as struct
 import urandom as random
 import usocket as socket
+import utime as time
 from ucollections import namedtuple
 
 
@@ -70,6 +71,17 @@ class Websocket:
     def __init__(self, sock):
         self.sock = sock
         self.open = True
+        # Liveness, see keepalive()
+        self.ping_interval_ms = 0
+        self.max_missed_pongs = 3
+        self.ping_sequence = 0
+        self.ping_sent_ms = None
+        self.ping_sent_us = 0
+        self.awaiting_pong = False
+        self.missed_pongs = 0
+        self.rtt_us = None
+        # Called with the round-trip time in microseconds for every answered ping
+        self.on_pong = None
 
     def __enter__(self):
         return self
@@ -80,6 +92,39 @@ class Websocket:
     def settimeout(self, timeout):
         self.sock.settimeout(timeout)
 
+    def set_keepalive(self, interval_ms, max_missed_pongs=3):
+        """
+        Ping the peer every interval_ms, 0 turns pings off.
+        The link counts as dead after max_missed_pongs pings in a row go unanswered.
+        """
+        self.ping_interval_ms = interval_ms
+        self.max_missed_pongs = max_missed_pongs
+
+    def keepalive(self):
+        """
+        Send a ping when one is due. Call often; pongs are taken in by recv().
+
+        :return: False once the link is dead
+        """
+        if not self.ping_interval_ms:
+            return self.open
+        now = time.ticks_ms()
+        if self.ping_sent_ms is not None and time.ticks_diff(now, self.ping_sent_ms) < self.ping_interval_ms:
+            return True
+        if self.awaiting_pong:
+            self.missed_pongs += 1
+            if self.missed_pongs >= self.max_missed_pongs:
+                return False
+        self.ping_sequence = (self.ping_sequence + 1) & 0xffff
+        try:
+            self.write_frame(OP_PING, struct.pack('!H', self.ping_sequence))
+        except OSError:
+            return False
+        self.ping_sent_ms = now
+        self.ping_sent_us = time.ticks_us()
+        self.awaiting_pong = True
+        return True
+
     def read_frame(self, max_size=None):
         """
         Read a frame from the socket.
@@ -188,6 +233,9 @@ class Websocket:
                 self._close()
                 raise ConnectionClosed()
 
+            # Anything from the peer shows the link is alive
+            self.missed_pongs = 0
+
             if not fin:
                 raise NotImplementedError()
 
@@ -199,7 +247,12 @@ class Websocket:
                 self._close()
                 return
             elif opcode == OP_PONG:
-                # Ignore this frame, keep waiting for a data frame
+                if self.awaiting_pong and data == struct.pack('!H', self.ping_sequence):
+                    self.awaiting_pong = False
+                    self.rtt_us = time.ticks_diff(time.ticks_us(), self.ping_sent_us)
+                    if self.on_pong:
+                        self.on_pong(self.rtt_us)
+                # Keep waiting for a data frame
                 continue
             elif opcode == OP_PING:
                 # We need to send a pong frame